@@ -27,5 +27,6 @@ setup(
         "numpy>=1.24.0",
         "pydantic>=2.0.0",
         "requests>=2.31.0",
+        "httpx>=0.24.0",
     ],
 )
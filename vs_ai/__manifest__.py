@@ -25,14 +25,21 @@
     "author": "VerbalStream",
     "website": "https://verbalstream.com",
     "category": "Productivity/Artificial Intelligence",
-    "version": "16.0.1.0.0",
+    "version": "16.0.1.1.0",
     "depends": ["mail", "web"],
+    "external_dependencies": {
+        "python": ["httpx", "numpy"],
+    },
     'data': [
         'security/vs_ai_security.xml',
         'security/ir.model.access.csv',
+        'data/ir_cron_data.xml',
         'views/vs_ai_menu_views.xml',
         'views/vs_ai_provider_views.xml',
         'views/vs_ai_model_views.xml',
+        'views/vs_ai_job_views.xml',
+        'views/vs_ai_routing_group_views.xml',
+        'views/vs_ai_usage_views.xml',
         'wizards/vs_ai_setup_wizard_views.xml',
     ],
     "demo": [
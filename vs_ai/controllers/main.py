@@ -1,6 +1,30 @@
 from odoo import http
 from odoo.http import request, Response
+from odoo.tools import config
+import base64
+import hmac
 import json
+import logging
+
+import numpy as np
+
+from ..tools.metrics import metrics
+from ..tools.rate_limiter import RateLimitExceeded
+
+_logger = logging.getLogger(__name__)
+
+# Seconds a request may queue for the rate limits before failing, per route;
+# overridable with the 'vs_ai.rate_limit_wait.<route>' system parameters
+RATE_LIMIT_WAITS = {
+    'chat': 10,
+    'stream': 5,
+    'embed': 10,
+    # The calls of a batch queue behind each other for the concurrency slots
+    'batch': 60,
+}
+
+# Most conversations accepted by a batch request
+BATCH_MAX_ITEMS = 1000
 
 
 class VSAIController(http.Controller):
@@ -19,6 +43,26 @@ class VSAIController(http.Controller):
             content_type='application/json'
         )
     
+    @http.route('/vs_ai/metrics', type='http', auth='none', csrf=False)
+    def prometheus_metrics(self):
+        """
+        Metrics of every worker in the Prometheus text exposition format
+        
+        Scrapers must send the 'vs_ai_metrics_token' server option as a
+        bearer token. Without that option the endpoint is disabled: behind a
+        reverse proxy, the remote address cannot tell local requests apart.
+        """
+        token = config.get('vs_ai_metrics_token')
+        if not token:
+            return Response("Not Found", status=404)
+        authorization = request.httprequest.headers.get('Authorization', '')
+        if not hmac.compare_digest(authorization, f"Bearer {token}"):
+            return Response("Forbidden", status=403)
+        return Response(
+            metrics.render(),
+            content_type='text/plain; version=0.0.4; charset=utf-8',
+        )
+    
     @http.route('/vs_ai/providers', type='http', auth='user')
     def list_providers(self):
         """List available AI providers for the current user"""
@@ -69,68 +113,390 @@ class VSAIController(http.Controller):
             content_type='application/json'
         )
     
+    def _get_model(self, model_id=None, provider_id=None, model_type='chat', route=None,
+                   requirements=None):
+        """
+        Find the model to use for a request
+        
+        Args:
+            route: Key of RATE_LIMIT_WAITS giving how long the request may
+                queue for the rate limits (0 fails fast)
+            requirements: Arguments of ``vs.ai.model.route_model``; when given
+                and no model or provider is, the router picks the chat model
+        
+        Returns:
+            tuple: (vs.ai.model record or None, error message or None)
+        """
+        if route:
+            wait = request.env['ir.config_parameter'].sudo().get_param(
+                f'vs_ai.rate_limit_wait.{route}', RATE_LIMIT_WAITS[route])
+            Model = request.env['vs.ai.model'].with_context(vs_ai_rate_limit_wait=float(wait))
+        else:
+            Model = request.env['vs.ai.model']
+        
+        if model_id:
+            model = Model.browse(int(model_id))
+            if not model.exists() or not model.active:
+                return None, "Model not found or inactive"
+            return model, None
+        
+        if provider_id:
+            provider = request.env['vs.ai.provider'].browse(int(provider_id))
+            if not provider.exists() or not provider.active:
+                return None, "Provider not found or inactive"
+        
+        if requirements is not None and not provider_id:
+            model = Model.route_model(**requirements)
+            if not model:
+                return None, "No model meets the requirements"
+            return model, None
+        
+        model = Model.resolve_model(provider_id and int(provider_id), model_type)
+        if not model:
+            if model_type == 'embedding':
+                return None, "No suitable embedding model found"
+            return None, "No suitable model found"
+        return model, None
+    
     @http.route('/vs_ai/chat', type='json', auth='user', csrf=False)
-    def generate_chat_completion(self, messages, model_id=None, provider_id=None, stream=False, **kwargs):
+    def generate_chat_completion(self, messages, model_id=None, provider_id=None, stream=False,
+                                 routing_group_id=None, requirements=None, **kwargs):
         """
         Generate a chat completion
         
+        JSON-RPC responses can only be sent once complete: use
+        ``/vs_ai/chat/stream`` to receive tokens as they are generated. On a
+        cache miss, the request transaction ends before the provider call,
+        which runs on the worker's AI event loop.
+        
         Args:
             messages: List of message dictionaries with 'role' and 'content'
             model_id: Specific model ID to use
             provider_id: Provider ID to use (if model_id not specified)
-            stream: Whether to stream the response
+            stream: Ignored, kept for backward compatibility
+            routing_group_id: Routing group to use instead of a single model,
+                with hedging and failover across its models
+            requirements: Without model_id and provider_id, optional routing
+                requirements: 'max_latency' (p95 seconds), 'max_cost' (per
+                call), 'supports_tools', 'supports_vision' and 'min_tokens'
+                (tools, images and max_tokens of the request are detected)
             **kwargs: Additional parameters for the completion
         """
         if not messages:
             return {"error": "No messages provided"}
         
-        # Get the model to use
-        model = None
-        if model_id:
-            model = request.env['vs.ai.model'].browse(int(model_id))
-            if not model.exists() or not model.active:
-                return {"error": "Model not found or inactive"}
-        elif provider_id:
-            provider = request.env['vs.ai.provider'].browse(int(provider_id))
-            if not provider.exists() or not provider.active:
-                return {"error": "Provider not found or inactive"}
-            
-            # Find default chat model for this provider
-            model = request.env['vs.ai.model'].search([
-                ('provider_id', '=', provider.id),
-                ('model_type', '=', 'chat'),
-                ('is_default', '=', True),
-                ('active', '=', True),
-            ], limit=1)
-            
-            if not model:
-                # Fallback to any chat model from this provider
-                model = request.env['vs.ai.model'].search([
-                    ('provider_id', '=', provider.id),
-                    ('model_type', '=', 'chat'),
-                    ('active', '=', True),
-                ], limit=1)
+        if routing_group_id:
+            return self._generate_routed_chat_completion(messages, int(routing_group_id), kwargs)
         
-        if not model:
-            # Fallback to any default chat model
-            model = request.env['vs.ai.model'].search([
-                ('model_type', '=', 'chat'),
-                ('is_default', '=', True),
-                ('active', '=', True),
-            ], limit=1)
-            
-            if not model:
-                return {"error": "No suitable model found"}
+        model, error = self._get_model(
+            model_id, provider_id, route='chat',
+            requirements=self._get_requirements(messages, kwargs, requirements))
+        if error:
+            return {"error": error}
         
         try:
-            # Generate the completion
-            response = model.generate_chat_completion(messages, stream=stream, **kwargs)
+            response, run = model._prepare_chat_completion(messages, kwargs)
+            if run:
+                # End the request transaction before the provider call, so no
+                # snapshot or lock is held during the LLM round-trip. Nothing
+                # was sent to the provider yet, and the results are written in
+                # a new transaction: a retry of the request on a serialization
+                # failure can never replay a call that was already made.
+                request.env.cr.commit()
+                response = run()
             return {"response": response}
+        except RateLimitExceeded as e:
+            return {"error": str(e), "retry_after": e.retry_after}
+        except Exception as e:
+            return {"error": str(e)}
+    
+    @staticmethod
+    def _get_requirements(messages, kwargs, requirements):
+        """Merge the requirements implied by a chat request with the caller's ones"""
+        result = request.env['vs.ai.model']._get_chat_requirements(messages, kwargs)
+        for key in ('supports_tools', 'supports_vision', 'min_tokens', 'max_latency', 'max_cost'):
+            if (requirements or {}).get(key):
+                result[key] = requirements[key]
+        return result
+    
+    def _generate_routed_chat_completion(self, messages, routing_group_id, kwargs):
+        """Generate a chat completion with the models of a routing group"""
+        wait = request.env['ir.config_parameter'].sudo().get_param(
+            'vs_ai.rate_limit_wait.chat', RATE_LIMIT_WAITS['chat'])
+        group = request.env['vs.ai.routing.group'].with_context(
+            vs_ai_rate_limit_wait=float(wait)).browse(routing_group_id)
+        if not group.exists() or not group.active:
+            return {"error": "Routing group not found or inactive"}
+        try:
+            return {"response": group.generate_chat_completion(messages, **kwargs)}
+        except RateLimitExceeded as e:
+            return {"error": str(e), "retry_after": e.retry_after}
+        except Exception as e:
+            return {"error": str(e)}
+    
+    @staticmethod
+    def _sse_frame(data, event=None):
+        """Encode a Server-Sent Events frame"""
+        frame = f"event: {event}\n" if event else ""
+        return (frame + f"data: {json.dumps(data)}\n\n").encode()
+    
+    def _sse_response(self, events):
+        """Relay stream events as a chunked Server-Sent Events response"""
+        def generate():
+            try:
+                for event in events:
+                    if 'delta' in event:
+                        yield self._sse_frame({"delta": event['delta']})
+                    elif 'error' in event:
+                        yield self._sse_frame(event, event='error')
+                    else:
+                        yield self._sse_frame(event, event='done')
+            except GeneratorExit:
+                # Client disconnected: closing the events iterator aborts the
+                # upstream provider request
+                _logger.debug("Chat stream cancelled by the client")
+                raise
+            except Exception as e:
+                yield self._sse_frame({"error": str(e)}, event='error')
+            finally:
+                close = getattr(events, 'close', None)
+                if close:
+                    close()
+        
+        return Response(
+            generate(),
+            status=200,
+            headers=[
+                ('Content-Type', 'text/event-stream'),
+                ('Cache-Control', 'no-cache'),
+                ('X-Accel-Buffering', 'no'),
+            ],
+            direct_passthrough=True,
+        )
+    
+    @http.route('/vs_ai/chat/stream', type='http', auth='user', methods=['POST'], csrf=False)
+    def stream_chat_completion(self, **params):
+        """
+        Stream a chat completion as Server-Sent Events
+        
+        Expects a JSON body with the same parameters as ``/vs_ai/chat``. Each
+        token is sent as a ``data: {"delta": ...}`` frame as soon as the provider
+        produces it, followed by a final ``done`` event carrying the usage.
+        Models that do not support streaming answer with a single delta frame.
+        """
+        try:
+            params.update(json.loads(request.httprequest.get_data() or b'{}'))
+        except ValueError:
+            return self._sse_response(iter([{"error": "Invalid JSON body"}]))
+        messages = params.pop('messages', None)
+        params.pop('stream', None)
+        params.pop('routing_group_id', None)
+        model_id = params.pop('model_id', None)
+        provider_id = params.pop('provider_id', None)
+        if not messages:
+            return self._sse_response(iter([{"error": "No messages provided"}]))
+        
+        model, error = self._get_model(
+            model_id, provider_id, route='stream',
+            requirements=self._get_requirements(messages, params, params.pop('requirements', None)))
+        if error:
+            return self._sse_response(iter([{"error": error}]))
+        
+        try:
+            events = model.stream_chat_completion(messages, **params)
+        except Exception as e:
+            return self._sse_response(iter([{"error": str(e)}]))
+        return self._sse_response(events)
+    
+    def _start_chat_batch(self, items, model_id=None, provider_id=None, params=None):
+        """
+        Resolve the models of the items of a batch request and prepare their calls
+        
+        Each distinct model_id/provider_id pair is resolved once; invalid
+        items get their own error. The calls are prepared before returning,
+        so the results can be consumed after the request transaction ended.
+        
+        Returns:
+            tuple: (iterator of (index, result) pairs as the results complete,
+            where results are {"response": ...} or {"error": ...}; error
+            message of the whole request or None)
+        """
+        if not items or not isinstance(items, list):
+            return None, "No items provided"
+        if len(items) > BATCH_MAX_ITEMS:
+            return None, f"Too many items (at most {BATCH_MAX_ITEMS})"
+        
+        models, errors, requests, indexes = {}, [], [], []
+        for index, item in enumerate(items):
+            if not isinstance(item, dict) or not item.get('messages') or not isinstance(item['messages'], list):
+                errors.append((index, {"error": "No messages provided"}))
+                continue
+            if not isinstance(item.get('params') or {}, dict):
+                errors.append((index, {"error": "Invalid params"}))
+                continue
+            try:
+                key = tuple(int(value) if value else None for value in (
+                    item.get('model_id') or model_id, item.get('provider_id') or provider_id))
+            except (TypeError, ValueError):
+                errors.append((index, {"error": "Invalid model_id or provider_id"}))
+                continue
+            if key not in models:
+                models[key] = self._get_model(*key, route='batch')
+            model, error = models[key]
+            if error:
+                errors.append((index, {"error": error}))
+                continue
+            requests.append((model, item['messages'], dict(params or {}, **(item.get('params') or {}))))
+            indexes.append(index)
+        
+        completions = request.env['vs.ai.model'].generate_chat_completion_batch(requests)
+        
+        def results():
+            yield from errors
+            try:
+                for position, response, error in completions:
+                    yield indexes[position], {"error": error} if error else {"response": response}
+            finally:
+                completions.close()
+        
+        return results(), None
+    
+    @http.route('/vs_ai/chat/batch', type='json', auth='user', csrf=False)
+    def generate_chat_completion_batch(self, items, model_id=None, provider_id=None, params=None):
+        """
+        Generate the chat completions of many conversations in one request
+        
+        The items run concurrently, within the concurrency and rate limits
+        of their providers. Use ``/vs_ai/chat/batch/stream`` to receive each
+        result as soon as it completes.
+        
+        Args:
+            items: List of dictionaries with 'messages', and optionally
+                'model_id', 'provider_id' and 'params' (additional parameters
+                for the completion)
+            model_id: Model ID of the items that do not specify one
+            provider_id: Provider ID of the items that specify no model or
+                provider
+            params: Parameters of every item, updated with the item ones
+        
+        Returns:
+            dict: "results", in the order of the items, each one with the
+            "response" or the "error" of the item
+        """
+        try:
+            results, error = self._start_chat_batch(items, model_id, provider_id, params)
+            if error:
+                return {"error": error}
+            ordered = [None] * len(items)
+            for index, result in results:
+                ordered[index] = result
+            return {"results": ordered}
         except Exception as e:
             return {"error": str(e)}
     
+    @http.route('/vs_ai/chat/batch/stream', type='http', auth='user', methods=['POST'], csrf=False)
+    def stream_chat_completion_batch(self, **params):
+        """
+        Generate the chat completions of many conversations as NDJSON
+        
+        Expects a JSON body with the same parameters as ``/vs_ai/chat/batch``.
+        Each result is sent as a ``{"index": ..., "response": ...}`` or
+        ``{"index": ..., "error": ...}`` line as soon as it completes, so in
+        completion order; "index" is the position of the item in the request.
+        A line with an "error" and no "index" ends a stream that failed.
+        """
+        try:
+            params.update(json.loads(request.httprequest.get_data() or b'{}'))
+        except ValueError:
+            return self._json_error("Invalid JSON body")
+        try:
+            results, error = self._start_chat_batch(
+                params.get('items'), params.get('model_id'), params.get('provider_id'), params.get('params'))
+        except Exception as e:
+            return self._json_error(str(e), status=500)
+        if error:
+            return self._json_error(error)
+        
+        def generate():
+            try:
+                for index, result in results:
+                    yield (json.dumps(dict(result, index=index)) + "\n").encode()
+            except GeneratorExit:
+                # Client disconnected: the calls that did not start are dropped
+                _logger.debug("Chat batch stream cancelled by the client")
+                raise
+            except Exception as e:
+                yield (json.dumps({"error": str(e)}) + "\n").encode()
+            finally:
+                results.close()
+        
+        return Response(
+            generate(),
+            status=200,
+            headers=[
+                ('Content-Type', 'application/x-ndjson'),
+                ('Cache-Control', 'no-cache'),
+                ('X-Accel-Buffering', 'no'),
+            ],
+            direct_passthrough=True,
+        )
+    
+    @http.route('/vs_ai/chat/false_hit', type='json', auth='user', csrf=False)
+    def report_semantic_cache_false_hit(self, model_id, semantic_cache_id):
+        """
+        Report a semantic cache answer that did not match the question
+        
+        Args:
+            model_id: The chat model that returned the cached answer
+            semantic_cache_id: The 'semantic_cache_id' of the response
+        """
+        model = request.env['vs.ai.model'].browse(int(model_id))
+        if not model.exists():
+            return {"error": "Model not found"}
+        model.report_semantic_cache_false_hit(semantic_cache_id)
+        return {"status": "ok"}
+    
+    @http.route('/vs_ai/search', type='json', auth='user', csrf=False)
+    def search_similar(self, query, k=10, domain=None, model_id=None, provider_id=None):
+        """
+        Search the embedding store for the chunks most similar to a query
+        
+        Args:
+            query: Query text
+            k: Number of results
+            domain: Optional domain on vs.ai.embedding (e.g. on res_model)
+            model_id: Specific embedding model ID to use
+            provider_id: Provider ID to use (if model_id not specified)
+        """
+        if not query:
+            return {"error": "No query provided"}
+        
+        model, error = self._get_model(model_id, provider_id, 'embedding')
+        if error:
+            return {"error": error}
+        
+        try:
+            results = request.env['vs.ai.embedding'].search_similar(
+                query, k=min(int(k), 1000), domain=domain, model=model)
+            return {"results": results}
+        except Exception as e:
+            return {"error": str(e)}
+    
+    @staticmethod
+    def _pack_embeddings(embeddings):
+        """
+        Pack embeddings as one contiguous little-endian float32 buffer
+        
+        Returns:
+            tuple: (bytes, shape)
+        """
+        matrix = np.ascontiguousarray(embeddings, dtype='<f4')
+        if matrix.ndim != 2:
+            raise ValueError("Embeddings must all have the same number of dimensions")
+        return matrix.tobytes(), list(matrix.shape)
+    
     @http.route('/vs_ai/embed', type='json', auth='user', csrf=False)
-    def generate_embeddings(self, texts, model_id=None, provider_id=None, **kwargs):
+    def generate_embeddings(self, texts, model_id=None, provider_id=None, format=None, **kwargs):
         """
         Generate embeddings for the given texts
         
@@ -138,52 +504,86 @@ class VSAIController(http.Controller):
             texts: List of text strings to embed
             model_id: Specific model ID to use
             provider_id: Provider ID to use (if model_id not specified)
+            format: 'f32_base64' to receive the embeddings as a base64 encoded,
+                row-major little-endian float32 buffer with its shape instead
+                of nested float lists (about 4x smaller and much cheaper to
+                serialize)
             **kwargs: Additional parameters for the embedding generation
         """
         if not texts:
             return {"error": "No texts provided"}
+        if format not in (None, 'json', 'f32_base64'):
+            return {"error": "Unsupported format"}
         
-        # Get the model to use
-        model = None
-        if model_id:
-            model = request.env['vs.ai.model'].browse(int(model_id))
-            if not model.exists() or not model.active:
-                return {"error": "Model not found or inactive"}
-        elif provider_id:
-            provider = request.env['vs.ai.provider'].browse(int(provider_id))
-            if not provider.exists() or not provider.active:
-                return {"error": "Provider not found or inactive"}
-            
-            # Find default embedding model for this provider
-            model = request.env['vs.ai.model'].search([
-                ('provider_id', '=', provider.id),
-                ('model_type', '=', 'embedding'),
-                ('is_default', '=', True),
-                ('active', '=', True),
-            ], limit=1)
-            
-            if not model:
-                # Fallback to any embedding model from this provider
-                model = request.env['vs.ai.model'].search([
-                    ('provider_id', '=', provider.id),
-                    ('model_type', '=', 'embedding'),
-                    ('active', '=', True),
-                ], limit=1)
-        
-        if not model:
-            # Fallback to any default embedding model
-            model = request.env['vs.ai.model'].search([
-                ('model_type', '=', 'embedding'),
-                ('is_default', '=', True),
-                ('active', '=', True),
-            ], limit=1)
-            
-            if not model:
-                return {"error": "No suitable embedding model found"}
+        model, error = self._get_model(model_id, provider_id, 'embedding', route='embed')
+        if error:
+            return {"error": error}
         
         try:
             # Generate the embeddings
             embeddings = model.generate_embeddings(texts, **kwargs)
+            if format == 'f32_base64':
+                data, shape = self._pack_embeddings(embeddings)
+                return {
+                    "embeddings": base64.b64encode(data).decode(),
+                    "format": "f32_base64",
+                    "dtype": "float32",
+                    "byteorder": "little",
+                    "shape": shape,
+                }
             return {"embeddings": embeddings}
+        except RateLimitExceeded as e:
+            return {"error": str(e), "retry_after": e.retry_after}
         except Exception as e:
             return {"error": str(e)}
+    
+    @http.route('/vs_ai/embed/raw', type='http', auth='user', methods=['POST'], csrf=False)
+    def generate_embeddings_raw(self, **params):
+        """
+        Generate embeddings returned as raw bytes
+        
+        Expects a JSON body with the same parameters as ``/vs_ai/embed``. The
+        response body is a row-major little-endian float32 buffer
+        (``application/octet-stream``); its shape is given by the
+        ``X-Embedding-Shape`` header as "rows,dimensions".
+        """
+        try:
+            params.update(json.loads(request.httprequest.get_data() or b'{}'))
+        except ValueError:
+            return self._json_error("Invalid JSON body")
+        texts = params.pop('texts', None)
+        model_id = params.pop('model_id', None)
+        provider_id = params.pop('provider_id', None)
+        params.pop('format', None)
+        if not texts:
+            return self._json_error("No texts provided")
+        
+        model, error = self._get_model(model_id, provider_id, 'embedding', route='embed')
+        if error:
+            return self._json_error(error, status=404)
+        
+        try:
+            data, shape = self._pack_embeddings(model.generate_embeddings(texts, **params))
+        except RateLimitExceeded as e:
+            response = self._json_error(str(e), status=429)
+            response.headers['Retry-After'] = str(int(e.retry_after or 1) + 1)
+            return response
+        except Exception as e:
+            return self._json_error(str(e), status=500)
+        return Response(
+            data,
+            status=200,
+            headers=[
+                ('Content-Type', 'application/octet-stream'),
+                ('X-Embedding-Shape', ",".join(map(str, shape))),
+                ('X-Embedding-Dtype', '<f4'),
+            ],
+        )
+    
+    @staticmethod
+    def _json_error(message, status=400):
+        return Response(
+            json.dumps({"error": message}),
+            status=status,
+            content_type='application/json'
+        )
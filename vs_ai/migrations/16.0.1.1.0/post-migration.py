@@ -0,0 +1,15 @@
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+def migrate(cr, version):
+    """
+    Forget the former default context size of the models
+
+    max_tokens defaulted to 4096 for every model, which is now the context
+    size conversations are fitted into: models that kept the default get
+    0 (unknown) so that their prompts are sent unchanged.
+    """
+    cr.execute("UPDATE vs_ai_model SET max_tokens = 0 WHERE max_tokens = 4096")
+    _logger.info("Reset the unknown context size of %d AI models", cr.rowcount)
@@ -1,2 +1,9 @@
 from . import vs_ai_provider
 from . import vs_ai_model
+from . import vs_ai_embedding_cache
+from . import vs_ai_response_cache
+from . import vs_ai_semantic_cache
+from . import vs_ai_embedding
+from . import vs_ai_job
+from . import vs_ai_routing_group
+from . import vs_ai_usage
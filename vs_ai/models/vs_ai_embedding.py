@@ -0,0 +1,298 @@
+import csv
+import io
+import logging
+
+from odoo import api, fields, models, _
+from odoo.exceptions import UserError
+from odoo.tools import sql
+
+_logger = logging.getLogger(__name__)
+
+# pgvector cannot build HNSW/IVFFlat indexes on `vector` columns above 2000
+# dimensions: larger embeddings are indexed (and searched) as half precision
+MAX_VECTOR_INDEX_DIMENSIONS = 2000
+MAX_HALFVEC_INDEX_DIMENSIONS = 4000
+# Candidates fetched per requested result, to make up for the chunks of
+# records the user cannot read
+SEARCH_OVERFETCH = 4
+
+
+def format_vector(vector):
+    """Return the pgvector text representation of a vector"""
+    return "[" + ",".join(repr(float(value)) for value in vector) + "]"
+
+
+class VSAIEmbedding(models.Model):
+    """
+    Embedding Store
+
+    Stores embeddings of record chunks in a pgvector column so they can be
+    searched by similarity. Models of different dimensions share the table:
+    each dimension gets its own partial HNSW (or IVFFlat) index on the column
+    cast to that dimension. Indexes are built at module update and by a cron
+    triggered by the first embeddings of a new dimension, never while
+    inserting: concurrent inserters would deadlock on the table lock.
+    """
+    _name = "vs.ai.embedding"
+    _description = "AI Embedding"
+    _order = "res_model, res_id, chunk_index"
+
+    res_model = fields.Char(
+        string="Resource Model",
+        required=True,
+        index=True,
+        help="Model of the record this chunk belongs to"
+    )
+
+    res_id = fields.Many2oneReference(
+        string="Resource ID",
+        model_field='res_model',
+        required=True,
+        index=True,
+        help="ID of the record this chunk belongs to"
+    )
+
+    chunk_index = fields.Integer(
+        string="Chunk",
+        default=0,
+        help="Position of the chunk in the record"
+    )
+
+    content = fields.Text(
+        string="Content",
+        help="Text of the chunk"
+    )
+
+    model_id = fields.Many2one(
+        'vs.ai.model',
+        string="Embedding Model",
+        required=True,
+        index=True,
+        ondelete='cascade',
+    )
+
+    dimensions = fields.Integer(
+        string="Dimensions",
+        required=True,
+        readonly=True,
+    )
+
+    company_id = fields.Many2one(
+        'res.company',
+        string="Company",
+        default=lambda self: self.env.company,
+        index=True,
+    )
+
+    def init(self):
+        cr = self.env.cr
+        try:
+            with cr.savepoint():
+                cr.execute("CREATE EXTENSION IF NOT EXISTS vector")
+        except Exception:
+            _logger.warning(
+                "The pgvector extension could not be created; ask a database "
+                "superuser to run 'CREATE EXTENSION vector' to use the embedding store."
+            )
+            return
+        cr.execute(f"ALTER TABLE {self._table} ADD COLUMN IF NOT EXISTS embedding vector")
+        self._ensure_vector_indexes()
+
+    @api.model
+    def _cron_ensure_vector_indexes(self):
+        """Create the similarity indexes of the dimensions stored since the last run"""
+        self._ensure_vector_indexes()
+
+    @api.model
+    def _ensure_vector_indexes(self):
+        self.env.cr.execute(f"""
+            SELECT DISTINCT dimensions FROM {self._table} WHERE dimensions IS NOT NULL
+        """)
+        for (dimensions,) in self.env.cr.fetchall():
+            if not sql.index_exists(self.env.cr, self._vector_index_name(dimensions)):
+                self._ensure_vector_index(dimensions)
+
+    @staticmethod
+    def _vector_expression(dimensions, value="embedding"):
+        """SQL expression of a vector cast to the indexable type of the dimension"""
+        vector_type = 'vector' if dimensions <= MAX_VECTOR_INDEX_DIMENSIONS else 'halfvec'
+        return f"({value}::{vector_type}({int(dimensions)}))", f"{vector_type}_cosine_ops"
+
+    @api.model
+    def _get_index_method(self):
+        return self.env['ir.config_parameter'].sudo().get_param('vs_ai.embedding_index_method', 'hnsw')
+
+    @api.model
+    def _vector_index_name(self, dimensions):
+        return f"{self._table}_{self._get_index_method()}_{int(dimensions)}_idx"
+
+    @api.model
+    def _ensure_vector_index(self, dimensions):
+        """Create the partial similarity index of the given dimension"""
+        if dimensions > MAX_HALFVEC_INDEX_DIMENSIONS:
+            _logger.warning("Embeddings of %d dimensions cannot be indexed", dimensions)
+            return
+        method = self._get_index_method()
+        expression, opclass = self._vector_expression(dimensions)
+        index_name = self._vector_index_name(dimensions)
+        _logger.info("Creating the similarity index of %d-dimension embeddings", dimensions)
+        options = " WITH (lists = 100)" if method == 'ivfflat' else ""
+        self.env.cr.execute(f"""
+            CREATE INDEX IF NOT EXISTS {index_name}
+                ON {self._table} USING {method} ({expression} {opclass}){options}
+             WHERE dimensions = {int(dimensions)}
+        """)
+
+    @api.model
+    def add_embeddings(self, model, items):
+        """
+        Bulk insert embeddings with COPY
+
+        Args:
+            model (vs.ai.model): The embedding model that produced the vectors
+            items (list): Dictionaries with 'res_model', 'res_id', 'embedding'
+                and optionally 'chunk_index' and 'content'
+
+        Returns:
+            int: Number of inserted embeddings
+        """
+        if not items:
+            return 0
+        self.check_access_rights('create')
+        company_id = model.company_id.id or self.env.company.id
+        now = fields.Datetime.to_string(fields.Datetime.now())
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        dimensions_seen = set()
+        for item in items:
+            dimensions = len(item['embedding'])
+            dimensions_seen.add(dimensions)
+            writer.writerow([
+                item['res_model'], item['res_id'], item.get('chunk_index', 0),
+                item.get('content') or "", model.id, dimensions, company_id,
+                format_vector(item['embedding']), self.env.uid, now, self.env.uid, now,
+            ])
+        buffer.seek(0)
+
+        self.flush_model()
+        self.env.cr.copy_expert(f"""
+            COPY {self._table} (res_model, res_id, chunk_index, content, model_id, dimensions,
+                                company_id, embedding, create_uid, create_date, write_uid, write_date)
+            FROM STDIN WITH (FORMAT csv)
+        """, buffer)
+        # Checking the catalog takes no lock on the table
+        if any(dimensions <= MAX_HALFVEC_INDEX_DIMENSIONS
+               and not sql.index_exists(self.env.cr, self._vector_index_name(dimensions))
+               for dimensions in dimensions_seen):
+            self.env.ref('vs_ai.ir_cron_vs_ai_embedding_index')._trigger()
+        self.invalidate_model()
+        return len(items)
+
+    @api.model
+    def index_texts(self, items, model=None, replace=True, batch_size=256):
+        """
+        Embed texts and store them
+
+        Args:
+            items (list): Dictionaries with 'res_model', 'res_id', 'content'
+                and optionally 'chunk_index'
+            model (vs.ai.model): Embedding model, or None for the default one
+            replace (bool): Remove the existing embeddings of the records first
+            batch_size (int): Number of texts embedded per provider request
+
+        Returns:
+            int: Number of stored embeddings
+        """
+        model = model or self.env['vs.ai.model'].resolve_model(model_type='embedding')
+        if not model:
+            raise UserError(_("No embedding model configured"))
+        if replace:
+            by_model = {}
+            for item in items:
+                by_model.setdefault(item['res_model'], set()).add(item['res_id'])
+            for res_model, res_ids in by_model.items():
+                self.search([
+                    ('res_model', '=', res_model),
+                    ('res_id', 'in', list(res_ids)),
+                    ('model_id', '=', model.id),
+                ]).unlink()
+
+        count = 0
+        for index in range(0, len(items), batch_size):
+            batch = items[index:index + batch_size]
+            vectors = model.generate_embeddings([item['content'] for item in batch])
+            count += self.add_embeddings(model, [
+                dict(item, embedding=vector) for item, vector in zip(batch, vectors)
+            ])
+        return count
+
+    @api.model
+    def search_similar(self, query, k=10, domain=None, model=None):
+        """
+        Find the chunks most similar to a query
+
+        Args:
+            query (str|list): Query text, or query embedding vector
+            k (int): Number of results
+            domain (list): Additional domain on vs.ai.embedding
+            model (vs.ai.model): Embedding model, or None for the default one
+
+        Returns:
+            list: Dictionaries with 'id', 'res_model', 'res_id', 'chunk_index',
+            'content' and cosine 'score', most similar first; only chunks of
+            records the user can read are returned
+        """
+        model = model or self.env['vs.ai.model'].resolve_model(model_type='embedding')
+        if not model:
+            raise UserError(_("No embedding model configured"))
+        vector = model.generate_embeddings([query])[0] if isinstance(query, str) else query
+        dimensions = len(vector)
+
+        self.flush_model()
+        where_query = self._where_calc(list(domain or []) + [
+            ('model_id', '=', model.id),
+            ('dimensions', '=', dimensions),
+        ])
+        self._apply_ir_rules(where_query, 'read')
+        from_clause, where_clause, where_params = where_query.get_sql()
+        column, _opclass = self._vector_expression(dimensions, f'"{self._table}".embedding')
+        value, _opclass = self._vector_expression(dimensions, "%s")
+        self.env.cr.execute(f"""
+            SELECT "{self._table}".id, 1 - ({column} <=> {value}) AS score
+              FROM {from_clause}
+             WHERE {where_clause}
+          ORDER BY {column} <=> {value}
+             LIMIT %s
+        """, [format_vector(vector)] + where_params + [format_vector(vector), int(k) * SEARCH_OVERFETCH])
+        scores = dict(self.env.cr.fetchall())
+        records = {record.id: record for record in self.browse(list(scores))}
+        readable = self._get_readable_targets(records.values())
+        scores = dict([
+            (record_id, score) for record_id, score in scores.items()
+            if (records[record_id].res_model, records[record_id].res_id) in readable
+        ][:int(k)])
+        return [{
+            'id': record_id,
+            'res_model': records[record_id].res_model,
+            'res_id': records[record_id].res_id,
+            'chunk_index': records[record_id].chunk_index,
+            'content': records[record_id].content,
+            'score': score,
+        } for record_id, score in scores.items()]
+
+    @api.model
+    def _get_readable_targets(self, embeddings):
+        """Return the (res_model, res_id) pairs of the embeddings the user can read"""
+        by_model = {}
+        for embedding in embeddings:
+            by_model.setdefault(embedding.res_model, set()).add(embedding.res_id)
+        readable = set()
+        for res_model, res_ids in by_model.items():
+            if res_model not in self.env:
+                continue
+            Records = self.env[res_model]
+            if not Records.check_access_rights('read', raise_exception=False):
+                continue
+            targets = Records.browse(res_ids).exists()._filter_access_rules('read')
+            readable.update((res_model, res_id) for res_id in targets.ids)
+        return readable
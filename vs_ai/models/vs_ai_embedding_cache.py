@@ -0,0 +1,160 @@
+import hashlib
+import logging
+import unicodedata
+
+import numpy as np
+from psycopg2.extras import execute_values
+
+from odoo import api, fields, models
+
+from ..tools.counter_buffer import counter_buffer
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_TTL_DAYS = 30
+DEFAULT_MAX_ENTRIES = 100000
+
+
+def normalize_text(text):
+    """Normalize a text so that trivially different inputs share a cache entry"""
+    return " ".join(unicodedata.normalize('NFC', text or "").split())
+
+
+def pack_vector(vector):
+    """Pack an embedding as little-endian float32 bytes"""
+    return np.asarray(vector, dtype='<f4').tobytes()
+
+
+def unpack_vector(data):
+    """Unpack little-endian float32 bytes into a list of floats"""
+    return np.frombuffer(bytes(data), dtype='<f4').tolist()
+
+
+class VSAIEmbeddingCache(models.Model):
+    """
+    Embedding Cache
+
+    Content-addressed store of embeddings already computed by a model. Entries
+    are keyed by sha256(model id + normalized text) and keep the vector as
+    compact float32 bytes in a ``bytea`` column that is only accessed in SQL.
+    """
+    _name = "vs.ai.embedding.cache"
+    _description = "AI Embedding Cache"
+    _order = "last_used desc"
+    _log_access = False
+
+    key = fields.Char(
+        string="Key",
+        required=True,
+        readonly=True,
+        help="sha256 of the model id and the normalized text"
+    )
+
+    model_id = fields.Many2one(
+        'vs.ai.model',
+        string="Model",
+        required=True,
+        readonly=True,
+        index=True,
+        ondelete='cascade',
+    )
+
+    company_id = fields.Many2one(
+        'res.company',
+        string="Company",
+        readonly=True,
+        index=True,
+    )
+
+    dimensions = fields.Integer(string="Dimensions", readonly=True)
+
+    hit_count = fields.Integer(string="Hits", readonly=True, default=0)
+
+    create_date = fields.Datetime(string="Created On", readonly=True, default=fields.Datetime.now)
+
+    last_used = fields.Datetime(string="Last Used", readonly=True, index=True, default=fields.Datetime.now)
+
+    _sql_constraints = [
+        ('key_uniq', 'unique(key)', "An embedding is already cached for this text and model."),
+    ]
+
+    def init(self):
+        self.env.cr.execute(f"ALTER TABLE {self._table} ADD COLUMN IF NOT EXISTS vector bytea")
+
+    @staticmethod
+    def _make_key(model, text):
+        return hashlib.sha256(f"{model.id}\0{normalize_text(text)}".encode()).hexdigest()
+
+    @api.model
+    def _lookup(self, model, texts):
+        """
+        Fetch cached embeddings
+
+        Args:
+            model (vs.ai.model): The embedding model
+            texts (list): Texts to look up
+
+        Returns:
+            list: The cached vector of each text, or None when not cached
+        """
+        keys = [self._make_key(model, text) for text in texts]
+        if not keys:
+            return []
+        self.env.cr.execute(f"""
+            SELECT key, vector FROM {self._table} WHERE key IN %s
+        """, [tuple(set(keys))])
+        cached = {key: unpack_vector(vector) for key, vector in self.env.cr.fetchall()}
+        # Hits are counted out of the request transaction (see tools.counter_buffer)
+        for key in cached:
+            counter_buffer.add(self.env.cr.dbname, self._table, key, {'hit_count': 1},
+                               key_column='key', touch='last_used')
+        return [cached.get(key) for key in keys]
+
+    @api.model
+    def _store(self, model, texts, vectors):
+        """Insert freshly computed embeddings, ignoring concurrent duplicates"""
+        company_id = model.company_id.id or self.env.company.id
+        rows = {
+            self._make_key(model, text): (
+                self._make_key(model, text), model.id, company_id, len(vector), pack_vector(vector),
+            )
+            for text, vector in zip(texts, vectors)
+        }
+        if not rows:
+            return
+        execute_values(self.env.cr._obj, f"""
+            INSERT INTO {self._table} (key, model_id, company_id, dimensions, vector,
+                                       hit_count, create_date, last_used)
+            VALUES %s
+            ON CONFLICT (key) DO NOTHING
+        """, list(rows.values()),
+            template="(%s, %s, %s, %s, %s, 0, now() at time zone 'UTC', now() at time zone 'UTC')")
+
+    @api.model
+    def _cron_evict(self):
+        """Evict expired entries, then the least recently used ones above the per-company cap"""
+        params = self.env['ir.config_parameter'].sudo()
+        ttl_days = int(params.get_param('vs_ai.embedding_cache_ttl_days', DEFAULT_TTL_DAYS))
+        max_entries = int(params.get_param('vs_ai.embedding_cache_max_entries', DEFAULT_MAX_ENTRIES))
+
+        cr = self.env.cr
+        if ttl_days > 0:
+            cr.execute(f"""
+                DELETE FROM {self._table}
+                 WHERE last_used < (now() at time zone 'UTC') - make_interval(days => %s)
+            """, [ttl_days])
+            _logger.info("Evicted %d expired cached embeddings", cr.rowcount)
+        if max_entries > 0:
+            cr.execute(f"""
+                DELETE FROM {self._table}
+                 WHERE id IN (
+                    SELECT id FROM (
+                        SELECT id, row_number() OVER (
+                            PARTITION BY company_id ORDER BY last_used DESC, id DESC
+                        ) AS rank
+                          FROM {self._table}
+                    ) ranked
+                     WHERE rank > %s
+                 )
+            """, [max_entries])
+            _logger.info("Evicted %d least recently used cached embeddings", cr.rowcount)
@@ -0,0 +1,842 @@
+import logging
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from psycopg2.extras import execute_values
+
+from odoo import api, fields, models, _
+from odoo.exceptions import UserError, ValidationError
+
+from ..tools import provider_api
+from ..tools.rate_limiter import rate_limiter
+
+_logger = logging.getLogger(__name__)
+
+CLAIM_BATCH_SIZE = 200
+EMBEDDING_CHUNK_SIZE = 128
+LEASE_SECONDS = 600
+RETRY_BASE_DELAY = 30
+RETRY_MAX_DELAY = 3600
+DEFAULT_TIME_BUDGET = 50
+# Expected seconds of a provider call of a model without latency statistics
+DEFAULT_CALL_SECONDS = 20
+JOB_RATE_LIMIT_WAIT = 300
+# Batch API: most requests submitted in one batch, and results written per commit
+BATCH_MAX_REQUESTS = 10000
+BATCH_RESULT_CHUNK_SIZE = 500
+# Job runner: results written per commit, and most seconds they wait for it
+RESULT_FLUSH_SIZE = 100
+RESULT_FLUSH_INTERVAL = 5
+# Field types that can receive the answers of chat items
+RESULT_FIELD_TYPES = ('char', 'text', 'html')
+# Models whose records never receive answers: users, access rights, settings
+PROTECTED_RESULT_MODELS = ('res.users', 'res.groups', 'res.company')
+PROTECTED_RESULT_FIELDS = ('login', 'password', 'new_password')
+
+
+class VSAIJob(models.Model):
+    """
+    AI Job
+
+    A bulk AI workload (summarizing tickets, classifying leads, embedding a
+    catalog, ...) split into items processed in the background by the job
+    runner cron. Items are claimed with ``FOR UPDATE SKIP LOCKED``, so several
+    runner crons can share the queue, and running items whose lease expired
+    (e.g. after a worker restart) are picked up again.
+
+    Chat jobs of OpenAI and Anthropic models can instead go through the
+    provider Batch API: the batch cron submits their items as provider
+    batches (vs.ai.job.batch), polls them, and writes back the results of
+    the ended ones.
+    """
+    _name = "vs.ai.job"
+    _inherit = ["mail.thread"]
+    _description = "AI Job"
+    _order = "id desc"
+
+    name = fields.Char(
+        string="Name",
+        required=True,
+        tracking=True,
+    )
+
+    job_type = fields.Selection(
+        selection=[
+            ('chat', 'Chat Completion'),
+            ('embedding', 'Embedding'),
+        ],
+        string="Job Type",
+        required=True,
+        default='chat',
+        help="Chat jobs send each item as a user message; embedding jobs store "
+             "the item embeddings in the embedding store"
+    )
+
+    model_id = fields.Many2one(
+        'vs.ai.model',
+        string="Model",
+        required=True,
+        ondelete='restrict',
+    )
+
+    provider_id = fields.Many2one(
+        related="model_id.provider_id",
+        string="Provider",
+        store=True,
+    )
+
+    state = fields.Selection(
+        selection=[
+            ('draft', 'Draft'),
+            ('running', 'Running'),
+            ('done', 'Done'),
+            ('cancelled', 'Cancelled'),
+        ],
+        string="Status",
+        default='running',
+        required=True,
+        tracking=True,
+    )
+
+    system_prompt = fields.Text(
+        string="System Prompt",
+        help="System message sent before each item of a chat job"
+    )
+
+    params = fields.Json(
+        string="Parameters",
+        default={},
+        help="Additional parameters for the provider (temperature, max_tokens, ...)"
+    )
+
+    res_model = fields.Char(
+        string="Resource Model",
+        help="Model of the records the items belong to"
+    )
+
+    result_field = fields.Char(
+        string="Result Field",
+        help="Field of the records that receives the answer of chat items"
+    )
+
+    max_attempts = fields.Integer(
+        string="Max Attempts",
+        default=3,
+        help="Number of attempts before an item is marked as failed"
+    )
+
+    company_id = fields.Many2one(
+        'res.company',
+        string="Company",
+        default=lambda self: self.env.company,
+    )
+
+    user_id = fields.Many2one(
+        'res.users',
+        string="Requested By",
+        default=lambda self: self.env.user,
+    )
+
+    item_ids = fields.One2many(
+        'vs.ai.job.item',
+        'job_id',
+        string="Items",
+    )
+
+    use_batch_api = fields.Boolean(
+        string="Use Batch API",
+        help="Submit the items to the provider Batch API: results come within "
+             "24 hours, at a reduced price"
+    )
+
+    batch_ids = fields.One2many(
+        'vs.ai.job.batch',
+        'job_id',
+        string="Provider Batches",
+    )
+
+    item_count = fields.Integer(string="Items", compute="_compute_progress")
+    done_count = fields.Integer(string="Done", compute="_compute_progress")
+    failed_count = fields.Integer(string="Failed", compute="_compute_progress")
+    progress = fields.Float(string="Progress (%)", compute="_compute_progress")
+
+    def _compute_progress(self):
+        """Compute the item counters from the database"""
+        counts = {}
+        if self.ids:
+            groups = self.env['vs.ai.job.item'].read_group(
+                [('job_id', 'in', self.ids)], ['job_id', 'state'], ['job_id', 'state'], lazy=False)
+            for group in groups:
+                counts.setdefault(group['job_id'][0], {})[group['state']] = group['__count']
+        for job in self:
+            job_counts = counts.get(job.id, {})
+            job.item_count = sum(job_counts.values())
+            job.done_count = job_counts.get('done', 0)
+            job.failed_count = job_counts.get('failed', 0)
+            finished = job.done_count + job.failed_count
+            job.progress = 100.0 * finished / job.item_count if job.item_count else 0.0
+
+    @api.constrains('use_batch_api', 'job_type', 'model_id')
+    def _check_batch_api(self):
+        for job in self.filtered('use_batch_api'):
+            if job.job_type != 'chat':
+                raise ValidationError(_("Only chat jobs can use the Batch API"))
+            if job.provider_id.provider_type not in provider_api.BATCH_PROVIDERS:
+                raise ValidationError(_("%s does not support the Batch API", job.provider_id.name))
+
+    @api.constrains('res_model', 'result_field', 'user_id')
+    def _check_result_field(self):
+        for job in self.filtered('result_field'):
+            error = job._get_result_field_error()
+            if error:
+                raise ValidationError(error)
+
+    def _get_result_field_error(self):
+        """
+        Return why the result field of the job cannot receive answers, or None
+
+        Answers are written as the requesting user, in plain editable text
+        fields only, and never on users, groups or companies.
+        """
+        self.ensure_one()
+        if not self.res_model or self.res_model not in self.env:
+            return _("Invalid result field %s", self.result_field)
+        Records = self.env[self.res_model]
+        field = Records._fields.get(self.result_field)
+        if field is None:
+            return _("Invalid result field %s", self.result_field)
+        if field.type not in RESULT_FIELD_TYPES or field.readonly or field.compute or field.related \
+                or field.groups or field.name in PROTECTED_RESULT_FIELDS \
+                or self.res_model in PROTECTED_RESULT_MODELS or self.res_model.startswith('ir.'):
+            return _("Field %s of %s cannot receive AI results", self.result_field, self.res_model)
+        if not self.user_id or not Records.with_user(self.user_id).check_access_rights(
+                'write', raise_exception=False):
+            return _("The requesting user cannot write on %s", self.res_model)
+        return None
+
+    @api.model
+    def enqueue(self, model, items, job_type='chat', name=None, res_model=None,
+                result_field=None, system_prompt=None, params=None, max_attempts=3,
+                use_batch_api=False):
+        """
+        Create a job and queue its items for background processing
+
+        Args:
+            model (vs.ai.model): Model used to process the items
+            items (list): Dictionaries with 'input' (prompt or text) and
+                optionally 'res_id' and 'chunk_index'
+            job_type (str): 'chat' or 'embedding'
+            name (str): Name of the job
+            res_model (str): Model of the records the items belong to
+            result_field (str): Field receiving the answers of chat items
+            system_prompt (str): System message of chat items
+            params (dict): Additional provider parameters
+            max_attempts (int): Attempts before an item fails
+            use_batch_api (bool): Process the items through the provider
+                Batch API
+
+        Returns:
+            vs.ai.job: The created job
+        """
+        if job_type == 'chat' and model.model_type not in ('chat', 'multimodal'):
+            raise UserError(_("This model does not support chat completion"))
+        if job_type == 'embedding' and model.model_type != 'embedding':
+            raise UserError(_("This model does not support embedding generation"))
+
+        job = self.create({
+            'name': name or _("%s job (%d items)", model.name, len(items)),
+            'job_type': job_type,
+            'model_id': model.id,
+            'res_model': res_model,
+            'result_field': result_field,
+            'system_prompt': system_prompt,
+            'params': params or {},
+            'max_attempts': max_attempts,
+            'use_batch_api': use_batch_api,
+        })
+        self.env['vs.ai.job.item']._bulk_insert(job, items)
+        job._trigger_runner()
+        return job
+
+    def _trigger_runner(self):
+        if any(not job.use_batch_api for job in self):
+            self.env.ref('vs_ai.ir_cron_vs_ai_job_runner')._trigger()
+        if any(job.use_batch_api for job in self):
+            self.env.ref('vs_ai.ir_cron_vs_ai_job_batch')._trigger()
+
+    def action_start(self):
+        self.write({'state': 'running'})
+        self._trigger_runner()
+
+    def action_cancel(self):
+        self.write({'state': 'cancelled'})
+        # Ended requests of cancelled batches are still collected
+        self.batch_ids.filtered(lambda batch: batch.state == 'submitted')._cancel()
+
+    def action_retry_failed(self):
+        """Queue the failed items again"""
+        self.env['vs.ai.job.item'].search([
+            ('job_id', 'in', self.ids), ('state', '=', 'failed'),
+        ]).write({'state': 'pending', 'attempts': 0, 'next_attempt_at': False, 'error': False})
+        self.action_start()
+
+    def action_view_items(self):
+        self.ensure_one()
+        return {
+            'name': _('Job Items'),
+            'type': 'ir.actions.act_window',
+            'res_model': 'vs.ai.job.item',
+            'view_mode': 'tree,form',
+            'domain': [('job_id', '=', self.id)],
+        }
+
+    # Job runner
+    @api.model
+    def _cron_process(self, time_budget=None):
+        """
+        Process queued items until the queue is empty or the time budget is spent
+
+        Additional runner crons calling this method can be added to increase
+        throughput: each one claims its own items.
+        """
+        if time_budget is None:
+            time_budget = int(self.env['ir.config_parameter'].sudo().get_param(
+                'vs_ai.job_time_budget', DEFAULT_TIME_BUDGET))
+        deadline = time.monotonic() + time_budget
+        Item = self.env['vs.ai.job.item']
+        Item._release_expired_leases()
+        self.env.cr.commit()
+
+        # Each round claims of every job what its calls can process within
+        # the remaining budget, so no claimed item outlives its lease
+        claimed = True
+        while claimed and time.monotonic() < deadline:
+            claimed = False
+            for job in self.search([('state', '=', 'running'), ('use_batch_api', '=', False)]):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                items = Item._claim(job._get_claim_size(remaining), job=job)
+                # Commit the claim right away: the lease protects the items from
+                # other runners while the provider calls are in flight
+                self.env.cr.commit()
+                if items:
+                    claimed = True
+                    job._process_items(items)
+        self.search([('state', '=', 'running')])._check_done()
+        self.env.cr.commit()
+
+    def _get_claim_size(self, remaining):
+        """Number of items the runner can process within the remaining seconds"""
+        self.ensure_one()
+        workers = max(self.provider_id.job_concurrency, 1)
+        call_seconds = self.model_id.p95_latency or self.model_id.avg_latency or DEFAULT_CALL_SECONDS
+        rounds = max(int(remaining // call_seconds), 1)
+        items_per_call = EMBEDDING_CHUNK_SIZE if self.job_type == 'embedding' else 1
+        return min(workers * rounds * items_per_call, CLAIM_BATCH_SIZE)
+
+    def _process_items(self, items):
+        """
+        Run the provider calls of claimed items in a bounded thread pool
+
+        Results are stored as they arrive, in grouped writes committed every
+        ``RESULT_FLUSH_SIZE`` items or ``RESULT_FLUSH_INTERVAL`` seconds, so
+        the items of a slow claim are never left running past their lease.
+        """
+        self.ensure_one()
+        provider = self.model_id.provider_id
+        ctx = provider._get_api_context()
+        model_name = self.model_id.model_id or self.model_id.name
+        params = dict(self.params or {})
+        workers = max(provider.job_concurrency, 1)
+        registry, limits = self.pool, provider._get_rate_limits(self.model_id)
+        concurrency = provider._get_concurrency_limit()
+        new_tracker = provider._get_call_tracker_factory(self.model_id, 'job')
+        # Background jobs can afford to queue for their share of the limits
+        max_wait = float(self.env['ir.config_parameter'].sudo().get_param(
+            'vs_ai.rate_limit_wait.job', JOB_RATE_LIMIT_WAIT))
+
+        if self.job_type == 'embedding':
+            chunks = [items[i:i + EMBEDDING_CHUNK_SIZE] for i in range(0, len(items), EMBEDDING_CHUNK_SIZE)]
+            calls = [
+                (chunk, provider._estimate_tokens(chunk.mapped('input'), provider.provider_type, model_name),
+                 lambda texts=chunk.mapped('input'): provider_api.embeddings(
+                     ctx, model_name, texts, **params))
+                for chunk in chunks
+            ]
+        else:
+            prefix = [{'role': 'system', 'content': self.system_prompt}] if self.system_prompt else []
+            calls = [
+                (item, provider._estimate_chat_tokens(prefix + [{'content': item.input}], params, model_name),
+                 lambda text=item.input: provider_api.chat_completion(
+                     ctx, model_name, prefix + [{'role': 'user', 'content': text}], **params))
+                for item in items
+            ]
+
+        def run(call):
+            _target, tokens, function = call
+            try:
+                if limits:
+                    rate_limiter.acquire(registry, limits, 1, tokens, max_wait)
+                tracker = new_tracker()
+                with concurrency.acquire(max_wait, observer=tracker):
+                    result = function()
+                    tracker.set_usage(result.get('usage') if isinstance(result, dict)
+                                      else {'prompt_tokens': tokens})
+                return result, None
+            except Exception as e:
+                return None, e
+
+        done, failed = [], []
+
+        def flush():
+            items._mark_failed(failed, self.max_attempts)
+            self._write_results(done)
+            self.env.cr.commit()
+            done.clear()
+            failed.clear()
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='vs_ai.job') as executor:
+            futures = {executor.submit(run, call): call[0] for call in calls}
+            flushed_at = time.monotonic()
+            for future in as_completed(futures):
+                target = futures[future]
+                result, error = future.result()
+                if error is not None:
+                    failed.extend((item, str(error)) for item in target)
+                elif self.job_type == 'embedding':
+                    done.extend(zip(target, result))
+                else:
+                    done.append((target, result))
+                if len(done) + len(failed) >= RESULT_FLUSH_SIZE \
+                        or time.monotonic() - flushed_at >= RESULT_FLUSH_INTERVAL:
+                    flush()
+                    flushed_at = time.monotonic()
+        flush()
+
+    # Batch API
+    @api.model
+    def _cron_process_batches(self):
+        """Submit the queued items of Batch API jobs, and collect the ended batches"""
+        max_requests = int(self.env['ir.config_parameter'].sudo().get_param(
+            'vs_ai.batch_max_requests', BATCH_MAX_REQUESTS))
+        Item = self.env['vs.ai.job.item']
+        while True:
+            items = Item._claim(max_requests, batch_api=True)
+            self.env.cr.commit()
+            if not items:
+                break
+            for job, job_items in items._grouped_by_job():
+                job._submit_batch(job_items)
+                self.env.cr.commit()
+
+        for batch in self.env['vs.ai.job.batch'].search([('state', '=', 'submitted')]):
+            batch._poll()
+            self.env.cr.commit()
+        self.search([('state', '=', 'running'), ('use_batch_api', '=', True)])._check_done()
+        self.env.cr.commit()
+
+    def _submit_batch(self, items):
+        """Submit claimed items to the provider Batch API as one batch"""
+        self.ensure_one()
+        prefix = [{'role': 'system', 'content': self.system_prompt}] if self.system_prompt else []
+        params = dict(self.params or {})
+        try:
+            external_id = self.provider_id.submit_chat_batch((
+                (f"item-{item.id}", prefix + [{'role': 'user', 'content': item.input}], params)
+                for item in items
+            ), model=self.model_id)
+        except Exception as e:
+            _logger.warning("Could not submit a batch of %d items of AI job %s: %s", len(items), self.id, e)
+            items._mark_failed([(item, str(e)) for item in items], self.max_attempts)
+            return
+        batch = self.env['vs.ai.job.batch'].create({
+            'job_id': self.id,
+            'external_id': external_id,
+            'item_count': len(items),
+        })
+        items.write({'batch_id': batch.id})
+
+    def _write_results(self, done):
+        """Store results in bulk and write them back onto the source records"""
+        self.ensure_one()
+        if not done:
+            return
+        Item = self.env['vs.ai.job.item']
+        if self.job_type == 'embedding':
+            Item._mark_done([(item, False) for item, _vector in done])
+            if self.res_model:
+                self.env['vs.ai.embedding'].sudo().add_embeddings(self.model_id, [{
+                    'res_model': self.res_model,
+                    'res_id': item.res_id,
+                    'chunk_index': item.chunk_index,
+                    'content': item.input,
+                    'embedding': vector,
+                } for item, vector in done])
+            return
+
+        Item._mark_done([(item, response.get('content') or "") for item, response in done])
+        if self.res_model and self.result_field:
+            failures = self._write_back([(item, response.get('content') or "") for item, response in done])
+            # The answer was paid for and stays on the item: do not retry
+            Item._mark_failed(failures, max_attempts=0)
+
+    def _write_back(self, results):
+        """
+        Write results onto the source records, one write per distinct value
+
+        Values are written as the user who requested the job, with their
+        access rights and record rules. Records deleted since the items were
+        queued are skipped. A write that fails is retried record by record in
+        savepoints, to isolate the records that cannot take their result.
+
+        Args:
+            results (list): (item, value) pairs
+
+        Returns:
+            list: (item, error message) pairs of the results not written
+        """
+        self.ensure_one()
+        error = self._get_result_field_error()
+        if error:
+            return [(item, error) for item, _value in results]
+        Records = self.env[self.res_model].with_user(self.user_id).with_context(tracking_disable=True)
+        existing = set(Records.browse({item.res_id for item, _value in results if item.res_id}).exists().ids)
+        by_value = defaultdict(list)
+        for item, value in results:
+            if item.res_id in existing:
+                by_value[value].append(item)
+
+        failures = []
+        for value, items in by_value.items():
+            try:
+                with self.env.cr.savepoint():
+                    Records.browse([item.res_id for item in items]).write({self.result_field: value})
+                    Records.flush_model([self.result_field])
+                continue
+            except Exception as e:
+                if len(items) == 1:
+                    failures.append((items[0], str(e)))
+                    continue
+            for item in items:
+                try:
+                    with self.env.cr.savepoint():
+                        Records.browse(item.res_id).write({self.result_field: value})
+                        Records.flush_model([self.result_field])
+                except Exception as e:
+                    failures.append((item, str(e)))
+        if failures:
+            _logger.warning("Could not write %d results of AI job %s back onto their records",
+                            len(failures), self.id)
+        return failures
+
+    def _check_done(self):
+        """Close the jobs that have no item left to process"""
+        if not self:
+            return
+        self.env.cr.execute("""
+            SELECT DISTINCT job_id FROM vs_ai_job_item
+             WHERE job_id IN %s AND state IN ('pending', 'running')
+        """, [tuple(self.ids)])
+        busy = {row[0] for row in self.env.cr.fetchall()}
+        finished = self.filtered(lambda job: job.id not in busy)
+        if finished:
+            finished.write({'state': 'done'})
+
+
+class VSAIJobItem(models.Model):
+    """
+    AI Job Item
+
+    A single prompt or text of an AI job, with its processing state.
+    """
+    _name = "vs.ai.job.item"
+    _description = "AI Job Item"
+    _order = "id"
+
+    job_id = fields.Many2one(
+        'vs.ai.job',
+        string="Job",
+        required=True,
+        index=True,
+        ondelete='cascade',
+    )
+
+    res_model = fields.Char(related="job_id.res_model", string="Resource Model")
+
+    res_id = fields.Many2oneReference(
+        string="Resource ID",
+        model_field='res_model',
+        help="ID of the record this item belongs to"
+    )
+
+    chunk_index = fields.Integer(string="Chunk", default=0)
+
+    input = fields.Text(string="Input", required=True)
+
+    result = fields.Text(string="Result", readonly=True)
+
+    state = fields.Selection(
+        selection=[
+            ('pending', 'Pending'),
+            ('running', 'Running'),
+            ('done', 'Done'),
+            ('failed', 'Failed'),
+        ],
+        string="Status",
+        default='pending',
+        required=True,
+        index=True,
+    )
+
+    attempts = fields.Integer(string="Attempts", default=0, readonly=True)
+
+    next_attempt_at = fields.Datetime(string="Next Attempt", readonly=True)
+
+    claimed_at = fields.Datetime(string="Claimed At", readonly=True)
+
+    error = fields.Text(string="Error", readonly=True)
+
+    batch_id = fields.Many2one(
+        'vs.ai.job.batch',
+        string="Provider Batch",
+        index=True,
+        readonly=True,
+        ondelete='set null',
+        help="Last provider batch the item was submitted in"
+    )
+
+    def init(self):
+        self.env.cr.execute(f"""
+            CREATE INDEX IF NOT EXISTS {self._table}_queue_idx
+                ON {self._table} (next_attempt_at, id) WHERE state = 'pending'
+        """)
+
+    @api.model
+    def _bulk_insert(self, job, items):
+        """Insert the items of a job with a single multi-row INSERT"""
+        rows = [
+            (job.id, item.get('res_id') or None, item.get('chunk_index', 0), item['input'], self.env.uid)
+            for item in items
+        ]
+        if not rows:
+            return
+        execute_values(self.env.cr._obj, f"""
+            INSERT INTO {self._table} (job_id, res_id, chunk_index, input, state, attempts,
+                                       create_uid, create_date, write_uid, write_date)
+            VALUES %s
+        """, rows, template="(%s, %s, %s, %s, 'pending', 0, %s, now() at time zone 'UTC', "
+                           "NULL, now() at time zone 'UTC')", page_size=1000)
+
+    @api.model
+    def _release_expired_leases(self):
+        """
+        Queue again the items whose runner died while processing them, or
+        fail them when they used up their attempts: an item that kills its
+        runner every time must not be claimed forever
+        """
+        # Items of submitted provider batches wait for the batch instead
+        self.env.cr.execute(f"""
+            UPDATE {self._table} item
+               SET state = CASE WHEN item.attempts >= job.max_attempts THEN 'failed' ELSE 'pending' END,
+                   error = CASE WHEN item.attempts >= job.max_attempts THEN %s ELSE item.error END,
+                   write_date = now() at time zone 'UTC'
+              FROM vs_ai_job job
+             WHERE job.id = item.job_id AND item.state = 'running'
+               AND item.claimed_at < (now() at time zone 'UTC') - make_interval(secs => %s)
+               AND NOT EXISTS (SELECT 1 FROM vs_ai_job_batch batch
+                                WHERE batch.id = item.batch_id AND batch.state = 'submitted')
+         RETURNING item.state
+        """, [_("The runner stopped while processing the item"), LEASE_SECONDS])
+        states = [row[0] for row in self.env.cr.fetchall()]
+        if states:
+            _logger.info("Released %d AI job items with an expired lease, %d of them out of attempts",
+                         len(states), states.count('failed'))
+            self.invalidate_model(['state', 'error'])
+
+    @api.model
+    def _claim(self, limit, batch_api=False, job=None):
+        """
+        Atomically claim pending items of running jobs, of Batch API jobs or
+        of the others, optionally of a single job
+        """
+        self.flush_model()
+        job_filter = "AND i.job_id = %s" if job else ""
+        self.env.cr.execute(f"""
+            UPDATE {self._table} item
+               SET state = 'running', attempts = item.attempts + 1,
+                   claimed_at = now() at time zone 'UTC'
+             WHERE item.id IN (
+                SELECT i.id FROM {self._table} i
+                  JOIN vs_ai_job j ON j.id = i.job_id
+                 WHERE i.state = 'pending' AND j.state = 'running'
+                   AND COALESCE(j.use_batch_api, false) = %s {job_filter}
+                   AND (i.next_attempt_at IS NULL OR i.next_attempt_at <= now() at time zone 'UTC')
+              ORDER BY i.next_attempt_at NULLS FIRST, i.id
+                 LIMIT %s
+                   FOR UPDATE OF i SKIP LOCKED
+             )
+         RETURNING item.id
+        """, [batch_api] + ([job.id] if job else []) + [limit])
+        items = self.browse([row[0] for row in self.env.cr.fetchall()])
+        items.invalidate_recordset()
+        return items
+
+    def _grouped_by_job(self):
+        """Yield (job, items) pairs"""
+        for job in self.job_id:
+            yield job, self.filtered(lambda item: item.job_id == job)
+
+    @api.model
+    def _mark_done(self, results):
+        """Store the results of processed items with a single UPDATE"""
+        if not results:
+            return
+        execute_values(self.env.cr._obj, f"""
+            UPDATE {self._table} item
+               SET state = 'done', result = data.result, error = NULL,
+                   write_date = now() at time zone 'UTC'
+              FROM (VALUES %s) AS data(id, result)
+             WHERE item.id = data.id
+        """, [(item.id, result or None) for item, result in results], page_size=1000)
+        self.browse([item.id for item, _result in results]).invalidate_recordset()
+
+    def _mark_failed(self, failures, max_attempts):
+        """Schedule a retry with exponential backoff, or fail items out of attempts"""
+        if not failures:
+            return
+        rows = []
+        for item, error in failures:
+            delay = min(RETRY_BASE_DELAY * 2 ** max(item.attempts - 1, 0), RETRY_MAX_DELAY)
+            state = 'failed' if item.attempts >= max_attempts else 'pending'
+            rows.append((item.id, state, error, delay))
+        execute_values(self.env.cr._obj, f"""
+            UPDATE {self._table} item
+               SET state = data.state, error = data.error,
+                   next_attempt_at = (now() at time zone 'UTC') + make_interval(secs => data.delay),
+                   write_date = now() at time zone 'UTC'
+              FROM (VALUES %s) AS data(id, state, error, delay)
+             WHERE item.id = data.id
+        """, rows, template="(%s, %s, %s, %s::integer)", page_size=1000)
+        self.browse([row[0] for row in rows]).invalidate_recordset()
+
+
+class VSAIJobBatch(models.Model):
+    """
+    AI Job Batch
+
+    Items of a job submitted together to the provider Batch API. The batch
+    cron polls the submitted batches and, once the provider ended one,
+    streams its result files back onto the items and their records.
+    """
+    _name = "vs.ai.job.batch"
+    _description = "AI Job Batch"
+    _order = "id desc"
+
+    job_id = fields.Many2one(
+        'vs.ai.job',
+        string="Job",
+        required=True,
+        index=True,
+        ondelete='cascade',
+    )
+
+    provider_id = fields.Many2one(related="job_id.provider_id", string="Provider")
+
+    external_id = fields.Char(
+        string="Batch ID",
+        required=True,
+        readonly=True,
+        help="Identifier of the batch at the provider"
+    )
+
+    state = fields.Selection(
+        selection=[
+            ('submitted', 'Submitted'),
+            ('done', 'Done'),
+            ('failed', 'Failed'),
+        ],
+        string="Status",
+        default='submitted',
+        required=True,
+        index=True,
+        readonly=True,
+    )
+
+    provider_status = fields.Char(string="Provider Status", readonly=True)
+
+    item_count = fields.Integer(string="Items", readonly=True)
+
+    finished_at = fields.Datetime(string="Finished At", readonly=True)
+
+    error = fields.Text(string="Error", readonly=True)
+
+    def _cancel(self):
+        for batch in self:
+            try:
+                batch.provider_id.cancel_chat_batch(batch.external_id)
+            except provider_api.ProviderError as e:
+                _logger.warning("Could not cancel AI batch %s: %s", batch.external_id, e)
+
+    def _poll(self):
+        """Refresh the status of the batch, and collect its results once it ended"""
+        self.ensure_one()
+        try:
+            status = self.provider_id.get_chat_batch(self.external_id)
+        except provider_api.ProviderError as e:
+            # Polled again by the next run
+            _logger.warning("Could not poll AI batch %s: %s", self.external_id, e)
+            return
+        self.provider_status = status['provider_status']
+        if status['status'] == 'in_progress':
+            return
+        if status['status'] == 'ended':
+            self._collect(status)
+        self._fail_pending_items(status['error'] or _("No result returned by the provider"))
+        self.write({
+            'state': 'done' if status['status'] == 'ended' else 'failed',
+            'error': status['error'],
+            'finished_at': fields.Datetime.now(),
+        })
+
+    def _collect(self, status):
+        """Stream the result files of the ended batch onto its items"""
+        self.ensure_one()
+        job = self.job_id
+        done, failed = [], []
+
+        def flush():
+            # Results of items already collected by an interrupted run are skipped
+            items = self.env['vs.ai.job.item'].browse(
+                [item_id for item_id, _result in done + failed]).exists().filtered(
+                lambda item: item.batch_id == self and item.state == 'running')
+            pending = set(items.ids)
+            job._write_results([(items.browse(item_id), response)
+                                for item_id, response in done if item_id in pending])
+            items._mark_failed([(items.browse(item_id), error)
+                                for item_id, error in failed if item_id in pending], job.max_attempts)
+            # Result files can be large: keep the progress of the cron
+            self.env.cr.commit()
+            done.clear()
+            failed.clear()
+
+        for custom_id, response, error in self.provider_id.iter_chat_batch_results(status, job.model_id):
+            try:
+                item_id = int((custom_id or '').rpartition('-')[2])
+            except ValueError:
+                _logger.warning("Ignoring the result of unknown request %s of AI batch %s",
+                                custom_id, self.external_id)
+                continue
+            if error is None:
+                done.append((item_id, response))
+            else:
+                failed.append((item_id, error))
+            if len(done) + len(failed) >= BATCH_RESULT_CHUNK_SIZE:
+                flush()
+        flush()
+
+    def _fail_pending_items(self, error):
+        """Retry or fail the items of the batch that got no result"""
+        items = self.env['vs.ai.job.item'].search([('batch_id', '=', self.id), ('state', '=', 'running')])
+        items._mark_failed([(item, error) for item in items], self.job_id.max_attempts)
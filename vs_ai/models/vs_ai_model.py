@@ -1,5 +1,42 @@
-from odoo import api, fields, models, _
-from odoo.exceptions import UserError
+import logging
+import random
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import psycopg2
+
+from odoo import api, fields, models, tools, _
+from odoo.exceptions import UserError, ValidationError
+from odoo.tools import sql
+
+from ..tools.counter_buffer import counter_buffer
+from ..tools.metrics import metrics
+from ..tools.model_stats import model_stats
+
+_logger = logging.getLogger(__name__)
+
+SEMANTIC_CACHE_TTL = 86400
+
+# Partial unique index allowing one default model per provider and type
+DEFAULT_MODEL_INDEX = 'vs_ai_model_default_uniq'
+
+# Fields that influence which model the resolver and the router pick
+RESOLVER_FIELDS = {
+    'active', 'is_default', 'model_type', 'provider_id', 'sequence', 'name',
+    'supports_tools', 'supports_vision',
+}
+
+# Seconds between two merges of the worker's call statistics into the models
+STATS_FLUSH_INTERVAL = 60
+# Number of calls the stored statistics weigh when merging new activity
+STATS_FLUSH_INERTIA = 100
+# Share of routed requests sent to a random eligible model, so that the
+# statistics of the models that are not currently preferred stay fresh
+ROUTER_EXPLORATION = 0.05
+
+# Most provider calls a chat batch runs at once, whatever the concurrency
+# limits of its providers
+CHAT_BATCH_MAX_WORKERS = 64
 
 
 class VSAIModel(models.Model):
@@ -99,14 +136,82 @@ class VSAIModel(models.Model):
     
     max_tokens = fields.Integer(
         string="Max Tokens",
-        default=4096,
-        help="Maximum number of tokens this model can process in a single request"
+        default=0,
+        help="Maximum number of tokens this model can process in a single request. "
+             "Longer conversations are trimmed of their oldest messages; 0 if unknown, "
+             "in which case conversations are sent as they are"
+    )
+    
+    rpm_limit = fields.Integer(
+        string="Requests per Minute",
+        default=0,
+        help="Maximum requests per minute sent for this model by all workers (0 for no limit)"
+    )
+    
+    tpm_limit = fields.Integer(
+        string="Tokens per Minute",
+        default=0,
+        help="Maximum estimated tokens per minute sent for this model by all workers (0 for no limit)"
+    )
+    
+    # Pricing
+    input_cost = fields.Float(
+        string="Input Cost",
+        digits=(16, 4),
+        help="Price of one million prompt tokens"
+    )
+    
+    output_cost = fields.Float(
+        string="Output Cost",
+        digits=(16, 4),
+        help="Price of one million completion tokens"
+    )
+    
+    cached_input_cost = fields.Float(
+        string="Cached Input Cost",
+        digits=(16, 4),
+        help="Price of one million prompt tokens read from the provider's prompt cache; "
+             "0 to use the input cost"
+    )
+    
+    # Call statistics, merged periodically from the workers' in-memory statistics
+    avg_latency = fields.Float(
+        string="Average Latency (s)",
+        readonly=True,
+        copy=False,
+    )
+    
+    p95_latency = fields.Float(
+        string="p95 Latency (s)",
+        readonly=True,
+        copy=False,
+    )
+    
+    error_rate = fields.Float(
+        string="Error Rate (%)",
+        readonly=True,
+        copy=False,
+    )
+    
+    avg_cost = fields.Float(
+        string="Average Cost per Call",
+        digits=(16, 6),
+        readonly=True,
+        copy=False,
+    )
+    
+    stats_call_count = fields.Integer(
+        string="Calls",
+        readonly=True,
+        copy=False,
+        help="Number of provider calls the statistics are based on"
     )
     
     # Usage settings
     is_default = fields.Boolean(
         string="Default Model",
         default=False,
+        copy=False,
         tracking=True,
         help="Whether this is the default model for its type"
     )
@@ -123,15 +228,117 @@ class VSAIModel(models.Model):
         help="Internal ID used by the provider API"
     )
     
+    discovered = fields.Boolean(
+        string="Discovered",
+        readonly=True,
+        copy=False,
+        help="Listed in the provider catalog; archived when the provider stops listing it"
+    )
+    
     config = fields.Json(
         string="Configuration",
         default={},
-        help="Additional configuration for this model"
+        help="Additional configuration for this model. 'embedding_batch_size' and "
+             "'embedding_batch_wait_ms' merge the concurrent embedding requests of a "
+             "threaded server; prefork workers serve one request at a time, and do not "
+             "batch them"
+    )
+    
+    # Embedding cache statistics
+    embedding_cache_hits = fields.Integer(
+        string="Cache Hits",
+        readonly=True,
+        copy=False,
+        help="Number of texts whose embedding was served from the cache"
+    )
+    
+    embedding_cache_misses = fields.Integer(
+        string="Cache Misses",
+        readonly=True,
+        copy=False,
+        help="Number of texts whose embedding had to be requested from the provider"
+    )
+    
+    embedding_cache_hit_rate = fields.Float(
+        string="Cache Hit Rate (%)",
+        compute="_compute_embedding_cache_stats",
+        help="Share of embedded texts served from the cache"
+    )
+    
+    embedding_cache_size = fields.Integer(
+        string="Cached Embeddings",
+        compute="_compute_embedding_cache_stats",
+        help="Number of embeddings currently cached for this model"
+    )
+    
+    # Semantic cache statistics
+    semantic_cache_hits = fields.Integer(
+        string="Semantic Hits",
+        readonly=True,
+        copy=False,
+        help="Number of requests answered from the semantic cache"
+    )
+    
+    semantic_cache_misses = fields.Integer(
+        string="Semantic Misses",
+        readonly=True,
+        copy=False,
+        help="Number of requests looked up in the semantic cache without a match"
+    )
+    
+    semantic_cache_false_hits = fields.Integer(
+        string="Semantic False Hits",
+        readonly=True,
+        copy=False,
+        help="Number of semantic cache answers reported as not matching the question"
+    )
+    
+    semantic_cache_hit_rate = fields.Float(
+        string="Semantic Hit Rate (%)",
+        compute="_compute_semantic_cache_stats",
+        help="Share of looked up requests answered from the semantic cache"
+    )
+    
+    semantic_cache_precision = fields.Float(
+        string="Semantic Precision (%)",
+        compute="_compute_semantic_cache_stats",
+        help="Share of semantic cache answers not reported as false hits"
     )
     
     # UI helpers
     color = fields.Integer(string="Color Index", default=0)
     
+    @api.depends('embedding_cache_hits', 'embedding_cache_misses')
+    def _compute_embedding_cache_stats(self):
+        """Compute the embedding cache hit rate and size"""
+        counts = {}
+        if self.ids:
+            groups = self.env['vs.ai.embedding.cache'].sudo().read_group(
+                [('model_id', 'in', self.ids)], ['model_id'], ['model_id'])
+            counts = {group['model_id'][0]: group['model_id_count'] for group in groups}
+        for model in self:
+            total = model.embedding_cache_hits + model.embedding_cache_misses
+            model.embedding_cache_hit_rate = 100.0 * model.embedding_cache_hits / total if total else 0.0
+            model.embedding_cache_size = counts.get(model.id, 0)
+    
+    @api.depends('semantic_cache_hits', 'semantic_cache_misses', 'semantic_cache_false_hits')
+    def _compute_semantic_cache_stats(self):
+        """Compute the semantic cache hit rate and precision"""
+        for model in self:
+            hits = model.semantic_cache_hits
+            total = hits + model.semantic_cache_misses
+            model.semantic_cache_hit_rate = 100.0 * hits / total if total else 0.0
+            model.semantic_cache_precision = (
+                100.0 * (hits - model.semantic_cache_false_hits) / hits if hits else 0.0
+            )
+    
+    def _get_config_value(self, key, default=None):
+        """Return a value of the model's additional configuration"""
+        self.ensure_one()
+        config = self.config if isinstance(self.config, dict) else {}
+        value = config.get(key)
+        return default if value is None else value
+    
     @api.depends('name', 'provider_id.name')
     def _compute_display_name(self):
         """Compute a user-friendly display name for the model"""
@@ -141,20 +348,339 @@ class VSAIModel(models.Model):
             else:
                 model.display_name = model.name
     
-    @api.constrains('is_default')
-    def _check_default_model(self):
-        """Ensure only one default model per type per provider"""
-        for model in self.filtered(lambda m: m.is_default):
-            domain = [
-                ('id', '!=', model.id),
-                ('provider_id', '=', model.provider_id.id),
-                ('model_type', '=', model.model_type),
-                ('is_default', '=', True),
-            ]
-            if self.search_count(domain):
-                # If another default exists, unset it
-                other_defaults = self.search(domain)
-                other_defaults.write({'is_default': False})
+    def init(self):
+        if not sql.index_exists(self.env.cr, DEFAULT_MODEL_INDEX):
+            # Keep a single default per provider and type before enforcing it
+            self.env.cr.execute(f"""
+                UPDATE {self._table} SET is_default = false
+                 WHERE is_default AND id NOT IN (
+                    SELECT DISTINCT ON (provider_id, model_type) id FROM {self._table}
+                     WHERE is_default ORDER BY provider_id, model_type, sequence, id)
+            """)
+            self.env.cr.execute(f"""
+                CREATE UNIQUE INDEX {DEFAULT_MODEL_INDEX}
+                    ON {self._table} (provider_id, model_type) WHERE is_default
+            """)
+    
+    @api.model_create_multi
+    def create(self, vals_list):
+        keys, defaults = set(), None
+        # Within the batch, the last default of a provider and type wins
+        for index in reversed(range(len(vals_list))):
+            vals = vals_list[index]
+            if not vals.get('is_default'):
+                continue
+            if defaults is None:
+                defaults = self.default_get(['provider_id', 'model_type'])
+            vals = dict(defaults, **vals)
+            key = (vals.get('provider_id'), vals.get('model_type'))
+            if key in keys:
+                vals_list[index] = dict(vals_list[index], is_default=False)
+            keys.add(key)
+        self._clear_defaults(keys)
+        records = super().create(vals_list)
+        self.clear_caches()
+        return records
+    
+    def write(self, vals):
+        if vals.get('is_default'):
+            defaults = self
+        elif 'is_default' not in vals and {'provider_id', 'model_type'} & set(vals):
+            # Defaults moved to another provider or type replace its default
+            defaults = self.filtered('is_default')
+        else:
+            defaults = self.browse()
+        if defaults:
+            keys = {
+                (vals.get('provider_id', model.provider_id.id), vals.get('model_type', model.model_type))
+                for model in defaults
+            }
+            if len(keys) < len(defaults):
+                raise ValidationError(_(
+                    "A provider can only have one default model of each type"))
+            self._clear_defaults(keys, exclude=defaults)
+        res = super().write(vals)
+        if RESOLVER_FIELDS & set(vals):
+            self.clear_caches()
+        return res
+    
+    @api.model
+    def _clear_defaults(self, keys, exclude=None):
+        """
+        Unset the default models of the given providers and types
+        
+        Runs as a single statement whatever the number of keys, before the new
+        defaults are written (see the partial unique index created by init).
+        
+        Args:
+            keys (set): (provider id, model type) pairs
+            exclude (vs.ai.model): Models to leave untouched
+        """
+        keys = {key for key in keys if all(key)}
+        if not keys:
+            return
+        self.flush_model(['is_default', 'provider_id', 'model_type'])
+        self.env.cr.execute(f"""
+            UPDATE {self._table} SET is_default = false
+             WHERE is_default AND (provider_id, model_type) IN %s AND NOT id = ANY(%s)
+         RETURNING id
+        """, [tuple(keys), list(exclude.ids if exclude else [])])
+        cleared = self.browse([row[0] for row in self.env.cr.fetchall()])
+        cleared.invalidate_recordset(['is_default'])
+    
+    def unlink(self):
+        res = super().unlink()
+        self.clear_caches()
+        return res
+    
+    @api.model
+    def resolve_model(self, provider_id=None, model_type='chat'):
+        """
+        Find the model to use when a request does not name one
+        
+        Looks for the default model of the given type of the provider, then any
+        model of that type of the provider, then the default model of that type
+        of any provider. The result is cached per company until models or
+        providers change.
+        
+        Args:
+            provider_id (int): Provider to take the model from, if any
+            model_type (str): Model type, e.g. 'chat' or 'embedding'
+            
+        Returns:
+            vs.ai.model: The resolved model, or an empty recordset
+        """
+        model_id = self._resolve_model_id(self.env.company.id, provider_id or False, model_type)
+        return self.browse(model_id)
+    
+    @tools.ormcache('company_id', 'provider_id', 'model_type')
+    def _resolve_model_id(self, company_id, provider_id, model_type):
+        Model = self.sudo().with_context(active_test=True)
+        domain = [
+            ('model_type', '=', model_type),
+            ('company_id', 'in', [company_id, False]),
+        ]
+        model = Model
+        if provider_id:
+            provider_domain = domain + [('provider_id', '=', provider_id)]
+            model = (Model.search(provider_domain + [('is_default', '=', True)], limit=1)
+                     or Model.search(provider_domain, limit=1))
+        if not model:
+            model = Model.search(domain + [('is_default', '=', True)], limit=1)
+        return model.id or False
+    
+    @api.model
+    def route_model(self, supports_tools=False, supports_vision=False, min_tokens=0,
+                    max_latency=None, max_cost=None):
+        """
+        Pick the chat model best fitting the caller's requirements
+        
+        Among the models with the required capabilities, within the latency
+        (p95, seconds) and cost (per call) budgets when they are known, the
+        model with the lowest expected latency (accounting for its error
+        rate) is chosen, so traffic follows whichever model is fastest at
+        the moment. Models without statistics come after the measured ones,
+        default model first; a small share of requests explores them.
+        
+        Returns:
+            vs.ai.model: The chosen model, or an empty recordset
+        """
+        self._flush_model_stats()
+        candidates = self.browse(self._get_route_candidate_ids(
+            self.env.company.id, bool(supports_tools), bool(supports_vision)))
+        candidates = candidates.filtered(
+            # A max_tokens of 0 means the context size is unknown
+            lambda model: (not model.max_tokens or model.max_tokens >= (min_tokens or 0))
+            and model.provider_id.status != 'error')
+        
+        measured, unmeasured = [], []
+        for model in candidates:
+            stats = model._get_call_stats()
+            if stats is None:
+                unmeasured.append(model)
+                continue
+            if max_latency and stats['p95_latency'] > max_latency:
+                continue
+            if max_cost and stats['cost'] is not None and stats['cost'] > max_cost:
+                continue
+            expected = stats['latency'] / max(1.0 - stats['error_rate'], 0.05)
+            measured.append((expected, model))
+        
+        eligible = [model for _expected, model in sorted(measured, key=lambda item: item[0])] + unmeasured
+        if not eligible:
+            return self.browse()
+        if len(eligible) > 1 and random.random() < ROUTER_EXPLORATION:
+            return random.choice(eligible[1:])
+        return eligible[0]
+    
+    @tools.ormcache('company_id', 'supports_tools', 'supports_vision')
+    def _get_route_candidate_ids(self, company_id, supports_tools, supports_vision):
+        domain = [
+            ('model_type', 'in', ['chat', 'multimodal']),
+            ('company_id', 'in', [company_id, False]),
+            ('provider_id.active', '=', True),
+        ]
+        if supports_tools:
+            domain.append(('supports_tools', '=', True))
+        if supports_vision:
+            domain.append(('supports_vision', '=', True))
+        models_ = self.sudo().with_context(active_test=True).search(domain)
+        defaults = models_.filtered('is_default')
+        return tuple((defaults + (models_ - defaults)).ids)
+    
+    def _get_call_stats(self):
+        """
+        Return the call statistics of the model: this worker's when it has
+        enough recent calls, otherwise the stored ones
+        
+        Returns:
+            dict: 'latency', 'p95_latency', 'error_rate' (0-1) and 'cost',
+            or None when the model was never measured
+        """
+        self.ensure_one()
+        stats = model_stats.get(self.env.cr.dbname, self.id)
+        if stats is not None:
+            if stats['cost'] is None and self.stats_call_count:
+                stats['cost'] = self.avg_cost
+            return stats
+        if not self.stats_call_count or not self.avg_latency:
+            return None
+        return {
+            'latency': self.avg_latency,
+            'p95_latency': self.p95_latency or self.avg_latency,
+            'error_rate': self.error_rate / 100.0,
+            'cost': self.avg_cost if self.input_cost or self.output_cost else None,
+        }
+    
+    @api.model
+    def _flush_model_stats(self, force=False):
+        """
+        Merge this worker's recent call statistics into the stored ones
+        
+        The update runs in its own short transaction, so that workers
+        flushing concurrently never make the current request fail on a
+        serialization error; a flush that conflicts is simply dropped.
+        """
+        dbname = self.env.cr.dbname
+        if not force and not model_stats.flush_due(dbname, STATS_FLUSH_INTERVAL):
+            return
+        pending = model_stats.take_pending(dbname)
+        if not pending:
+            return
+        try:
+            with self.pool.cursor() as cr:
+                self._write_model_stats(cr, pending)
+        except psycopg2.Error:
+            _logger.debug("Could not store the AI model statistics", exc_info=True)
+            return
+        self.browse(list(pending)).invalidate_recordset([
+            'stats_call_count', 'error_rate', 'avg_latency', 'p95_latency', 'avg_cost',
+        ])
+    
+    @api.model
+    def _write_model_stats(self, cr, pending):
+        # A fixed order keeps concurrent flushes from deadlocking
+        for model_id, stats in sorted(pending.items()):
+            weight = stats['calls'] / (stats['calls'] + STATS_FLUSH_INERTIA)
+            cr.execute("""
+                UPDATE vs_ai_model
+                   SET stats_call_count = COALESCE(stats_call_count, 0) + %(calls)s,
+                       error_rate = CASE WHEN COALESCE(stats_call_count, 0) = 0 THEN %(error_rate)s
+                                    ELSE error_rate * (1 - %(weight)s) + %(error_rate)s * %(weight)s END,
+                       avg_latency = COALESCE(avg_latency * (1 - %(weight)s) + %(latency)s * %(weight)s,
+                                              %(latency)s, avg_latency),
+                       p95_latency = COALESCE(p95_latency * (1 - %(weight)s) + %(p95_latency)s * %(weight)s,
+                                              %(p95_latency)s, p95_latency),
+                       avg_cost = COALESCE(avg_cost * (1 - %(weight)s) + %(cost)s * %(weight)s,
+                                           %(cost)s, avg_cost)
+                 WHERE id = %(id)s
+            """, {
+                'id': model_id,
+                'calls': stats['calls'],
+                'error_rate': 100.0 * stats['errors'] / stats['calls'] if stats['calls'] else 0.0,
+                'weight': weight,
+                'latency': stats['latency'],
+                'p95_latency': stats['p95_latency'],
+                'cost': stats['cost'],
+            })
+    
+    @api.model
+    def _get_chat_requirements(self, messages, kwargs):
+        """Derive the router requirements implied by a chat request"""
+        has_images = any(
+            isinstance(message.get('content'), list) and any(
+                isinstance(part, dict) and part.get('type') in ('image_url', 'image')
+                for part in message['content'])
+            for message in messages
+        )
+        return {
+            'supports_tools': bool(kwargs.get('tools')),
+            'supports_vision': has_images,
+            'min_tokens': int(kwargs.get('max_tokens') or 0),
+        }
+    
+    @api.model
+    def _apply_catalogs(self, catalogs, archive=True):
+        """
+        Apply provider model catalogs in one batch
+        
+        Models are matched on their API identifier. Listed models are created,
+        or updated with the details the provider reports and unarchived;
+        discovered models the provider no longer lists are archived. Models
+        created by hand are never archived.
+        
+        Args:
+            catalogs (dict): By provider id, the models returned by
+                tools.provider_api.list_models
+            archive (bool): Whether the catalogs are complete, so that the
+                models missing from them can be archived
+            
+        Returns:
+            dict: Numbers of 'created', 'updated' and 'archived' models
+        """
+        Model = self.with_context(active_test=False, tracking_disable=True)
+        existing = {}
+        for model in Model.search([('provider_id', 'in', list(catalogs))], order='id'):
+            existing.setdefault((model.provider_id.id, model.model_id or model.name), model)
+        
+        to_create, to_write, listed = [], defaultdict(list), set()
+        for provider_id, catalog in catalogs.items():
+            for entry in catalog:
+                key = (provider_id, entry['model_id'])
+                listed.add(key)
+                model = existing.get(key)
+                if model is None:
+                    # Catalogs that do not report the context size leave it unknown
+                    to_create.append(dict(
+                        {'max_tokens': 0}, **entry,
+                        name=entry['model_id'], provider_id=provider_id, discovered=True))
+                    continue
+                # The type of known models may have been corrected by hand
+                vals = {
+                    field: value for field, value in dict(entry, active=True, discovered=True).items()
+                    if field != 'model_type' and model[field] != value
+                }
+                if vals:
+                    to_write[tuple(sorted(vals.items()))].append(model.id)
+        
+        to_archive = [
+            model.id for key, model in existing.items()
+            if archive and key not in listed and model.discovered and model.active
+        ]
+        
+        if to_create:
+            Model.create(to_create)
+        # Models with the same changes (e.g. newly reported capabilities) are
+        # written together
+        for vals, model_ids in to_write.items():
+            Model.browse(model_ids).write(dict(vals))
+        if to_archive:
+            Model.browse(to_archive).write({'active': False})
+        return {
+            'created': len(to_create),
+            'updated': sum(len(model_ids) for model_ids in to_write.values()),
+            'archived': len(to_archive),
+        }
     
     def action_make_default(self):
         """Set this model as the default for its type"""
@@ -224,15 +750,267 @@ class VSAIModel(models.Model):
         return self.provider_id.generate_completion(prompt, model=self, **kwargs)
     
     def generate_chat_completion(self, messages, stream=False, **kwargs):
-        """Generate a chat completion using this model"""
+        """
+        Generate a chat completion using this model
+        
+        Deterministic calls (temperature 0) are served from the response cache
+        when the model has a positive 'response_cache_ttl' (seconds) in its
+        configuration. When 'semantic_cache_threshold' is configured, answers
+        to semantically equivalent prompts are reused as well (see
+        vs.ai.semantic.cache). Pass ``cache_bypass=True`` to always call the
+        provider.
+        """
         if self.model_type not in ['chat', 'multimodal']:
             raise UserError(_("This model does not support chat completion"))
         
-        return self.provider_id.generate_chat_completion(messages, model=self, stream=stream, **kwargs)
+        cache_bypass = kwargs.pop('cache_bypass', False)
+        if stream or cache_bypass:
+            return self.provider_id.generate_chat_completion(messages, model=self, stream=stream, **kwargs)
+        
+        response, cache_state = self._lookup_chat_caches(messages, kwargs)
+        if response is None:
+            response = self.provider_id.generate_chat_completion(messages, model=self, **kwargs)
+            self._store_chat_caches(cache_state, response)
+            self._flush_model_stats()
+        return response
+    
+    def _prepare_chat_completion(self, messages, kwargs):
+        """
+        Look up the caches and prepare the provider call of a chat completion
+        
+        Everything is read from the database here. The returned function
+        starts the call on the worker's AI event loop, waits for it and fills
+        the caches in a new transaction: it does not use the current cursor,
+        so the caller may end its transaction before calling it.
+        
+        Returns:
+            tuple: (cached response, None) on a cache hit, otherwise
+            (None, function returning the provider response)
+        """
+        self.ensure_one()
+        if self.model_type not in ['chat', 'multimodal']:
+            raise UserError(_("This model does not support chat completion"))
+        
+        kwargs = dict(kwargs)
+        if kwargs.pop('cache_bypass', False):
+            response, cache_state = None, {}
+        else:
+            response, cache_state = self._lookup_chat_caches(messages, kwargs)
+        if response is not None:
+            return response, None
+        
+        start = self.provider_id._prepare_chat_call_async(messages, model=self, **kwargs)
+        registry, uid, context = self.pool, self.env.uid, dict(self.env.context)
+        
+        def run():
+            response = start().result()
+            with registry.cursor() as cr:
+                model = api.Environment(cr, uid, context)[self._name].browse(self.id)
+                model._store_chat_caches(cache_state, response)
+                model._flush_model_stats()
+            return response
+        
+        return None, run
+    
+    @api.model
+    def generate_chat_completion_batch(self, requests, max_workers=None):
+        """
+        Generate the chat completions of many requests concurrently
+        
+        Caches are looked up and the provider calls prepared in the current
+        transaction. The returned iterator runs the
+        calls in a thread pool, where each call waits for the rate limits and
+        a concurrency slot of its provider, and the caches are filled in a
+        new transaction at the end. It does not use the current cursor, so it
+        can be consumed after the request transaction ended.
+        
+        Args:
+            requests (list): (vs.ai.model, messages, params) tuples
+            max_workers (int): Calls run at once, by default the sum of the
+                concurrency limits of the providers
+        
+        Returns:
+            iterator: (index of the request, response or None, error message
+            or None) tuples, as the results complete
+        """
+        results, calls, cache_states = [], [], {}
+        for index, (model, messages, params) in enumerate(requests):
+            params = dict(params or {})
+            try:
+                if model.model_type not in ['chat', 'multimodal']:
+                    raise UserError(_("This model does not support chat completion"))
+                if params.pop('cache_bypass', False):
+                    response, cache_state = None, {}
+                else:
+                    response, cache_state = model._lookup_chat_caches(messages, params)
+                if response is not None:
+                    results.append((index, response, None))
+                    continue
+                calls.append((index, model.provider_id._prepare_chat_call(messages, model=model, **params)))
+            except UserError as e:
+                results.append((index, None, str(e)))
+                continue
+            if cache_state:
+                cache_states[index] = (model.id, cache_state)
+        
+        if max_workers is None:
+            providers = self.env['vs.ai.provider'].union(*(model.provider_id for model, _m, _p in requests))
+            max_workers = sum(max(provider.max_concurrency, 1) for provider in providers)
+        workers = max(min(max_workers, CHAT_BATCH_MAX_WORKERS, len(calls)), 1)
+        return self._run_chat_batch(results, calls, cache_states, workers)
+    
+    def _run_chat_batch(self, results, calls, cache_states, workers):
+        yield from results
+        if not calls:
+            return
+        registry, uid, context = self.pool, self.env.uid, dict(self.env.context)
+        done = []
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='vs_ai.chat_batch') as executor:
+            futures = {executor.submit(call): index for index, call in calls}
+            try:
+                for future in as_completed(futures):
+                    error = future.exception()
+                    if error is None:
+                        done.append((futures[future], future.result()))
+                        yield futures[future], future.result(), None
+                    else:
+                        yield futures[future], None, str(error)
+            finally:
+                # When the consumer gives up, calls that did not start are dropped
+                for future in futures:
+                    future.cancel()
+        
+        with registry.cursor() as cr:
+            env = api.Environment(cr, uid, context)
+            for index, response in done:
+                if index in cache_states:
+                    model_id, cache_state = cache_states[index]
+                    env['vs.ai.model'].browse(model_id)._store_chat_caches(cache_state, response)
+            env['vs.ai.model']._flush_model_stats()
+    
+    def _lookup_chat_caches(self, messages, kwargs):
+        """
+        Look for a cached answer in the response and semantic caches
+        
+        Returns:
+            tuple: (cached response or None, state to pass to ``_store_chat_caches``)
+        """
+        self.ensure_one()
+        state = {}
+        ttl = int(self._get_config_value('response_cache_ttl', 0))
+        if ttl > 0 and kwargs.get('temperature') == 0:
+            Cache = self.env['vs.ai.response.cache'].sudo()
+            key = Cache._make_key(self, messages, kwargs)
+            response = Cache._get(key)
+            self._record_cache_metric('response', response is not None)
+            if response is not None:
+                response['cached'] = True
+                return response, state
+            state['response_cache'] = (key, ttl)
+        
+        threshold = float(self._get_config_value('semantic_cache_threshold', 0))
+        if threshold > 0:
+            SemanticCache = self.env['vs.ai.semantic.cache'].sudo()
+            response, semantic_state = SemanticCache._lookup(self, messages, kwargs, threshold)
+            self._increment_counters({
+                'semantic_cache_hits' if response is not None else 'semantic_cache_misses': 1,
+            })
+            self._record_cache_metric('semantic', response is not None)
+            if response is not None:
+                response['cached'] = True
+                return response, state
+            state['semantic_cache'] = semantic_state
+        return None, state
+    
+    def _store_chat_caches(self, state, response):
+        """Store a fresh answer in the caches that missed"""
+        self.ensure_one()
+        if state.get('response_cache'):
+            key, ttl = state['response_cache']
+            self.env['vs.ai.response.cache'].sudo()._set(key, self, response, ttl)
+        if state.get('semantic_cache') and not response.get('tool_calls'):
+            semantic_ttl = int(self._get_config_value('semantic_cache_ttl', SEMANTIC_CACHE_TTL))
+            self.env['vs.ai.semantic.cache'].sudo()._store(self, state['semantic_cache'], response, semantic_ttl)
+    
+    def report_semantic_cache_false_hit(self, cache_entry_id):
+        """
+        Report a semantic cache answer that did not match the question
+        
+        The entry is removed so it is not served again, and the false hit is
+        counted to help tuning 'semantic_cache_threshold'.
+        """
+        self.ensure_one()
+        entry = self.env['vs.ai.semantic.cache'].sudo().browse(int(cache_entry_id))
+        if entry.exists() and entry.model_id == self:
+            entry.unlink()
+            self._increment_counters({'semantic_cache_false_hits': 1})
+        return True
+    
+    def stream_chat_completion(self, messages, **kwargs):
+        """
+        Generate a chat completion as an iterator of stream events
+
+        Models that do not support streaming are called synchronously and their
+        answer is returned as a single delta event. The returned iterator does
+        not use the ORM, so it can be consumed after the request cursor is closed.
+        """
+        self.ensure_one()
+        if self.supports_streaming:
+            return self.generate_chat_completion(messages, stream=True, **kwargs)
+        response = self.generate_chat_completion(messages, **kwargs)
+        return iter([
+            {'delta': response.get('content') or ""},
+            {'finish_reason': response.get('finish_reason'), 'usage': response.get('usage')},
+        ])
     
     def generate_embeddings(self, texts, **kwargs):
-        """Generate embeddings for the given texts"""
+        """
+        Generate embeddings for the given texts
+        
+        Embeddings are looked up in the embedding cache first, unless disabled
+        with the 'embedding_cache' configuration key or when extra parameters
+        (e.g. 'dimensions') change the output; only the missing texts are sent
+        to the provider, as a single batch.
+        """
         if self.model_type != 'embedding':
             raise UserError(_("This model does not support embedding generation"))
         
-        return self.provider_id.generate_embeddings(texts, model=self, **kwargs)
+        if kwargs or not self._get_config_value('embedding_cache', True):
+            return self.provider_id.generate_embeddings(texts, model=self, **kwargs)
+        
+        Cache = self.env['vs.ai.embedding.cache'].sudo()
+        vectors = Cache._lookup(self, texts)
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+        if missing:
+            fetched = dict(zip(missing, self.provider_id.generate_embeddings(missing, model=self)))
+            Cache._store(self, missing, [fetched[text] for text in missing])
+            vectors = [fetched[text] if vector is None else vector for text, vector in zip(texts, vectors)]
+        self._increment_counters({
+            'embedding_cache_hits': len(texts) - len(missing),
+            'embedding_cache_misses': len(missing),
+        })
+        self._record_cache_metric('embedding', True, len(texts) - len(missing))
+        self._record_cache_metric('embedding', False, len(missing))
+        return vectors
+    
+    def _record_cache_metric(self, cache, hit, count=1):
+        if count:
+            metrics.inc('vs_ai_cache_requests_total', count, cache=cache,
+                        result='hit' if hit else 'miss', model=self.model_id or self.name)
+    
+    def _increment_counters(self, counters):
+        """
+        Increment statistics counters without going through mail tracking
+        
+        The increments are buffered and written within seconds in a separate
+        transaction, so requests never lock the model row.
+        """
+        self.ensure_one()
+        counter_buffer.add(self.env.cr.dbname, self._table, self.id, counters)
+    
+    def action_clear_embedding_cache(self):
+        """Remove the cached embeddings of this model"""
+        self.ensure_one()
+        self.env['vs.ai.embedding.cache'].sudo().search([('model_id', '=', self.id)]).unlink()
+        self.write({'embedding_cache_hits': 0, 'embedding_cache_misses': 0})
+        return True
@@ -1,6 +1,52 @@
-from odoo import api, fields, models, _
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
+
+import psycopg2.errors
+
+from odoo import api, fields, models, tools, _
 from odoo.exceptions import UserError, ValidationError
 
+from ..tools import provider_api
+from ..tools.async_loop import event_loop
+from ..tools.concurrency import concurrency_registry
+from ..tools.embedding_batcher import embedding_batcher
+from ..tools.http_client import client_registry
+from ..tools.prompt_cache import prefix_tracker
+from ..tools.rate_limiter import create_bucket_table, rate_limiter
+from ..tools.tokenizer import get_prompt_budget, token_counter
+from ..tools.usage_log import CallTracker
+
+_logger = logging.getLogger(__name__)
+
+# Defaults of the embedding micro-batcher, overridable per model through the
+# 'embedding_batch_size' and 'embedding_batch_wait_ms' configuration keys
+EMBEDDING_BATCH_SIZE = 256
+EMBEDDING_BATCH_WAIT_MS = 10
+
+# Seconds a call may queue for rate limits when the caller does not set the
+# 'vs_ai_rate_limit_wait' context key
+DEFAULT_RATE_LIMIT_WAIT = 30
+
+# Health checks: seconds allowed to each provider probe, and probes run at once
+HEALTH_CHECK_TIMEOUT = 10
+HEALTH_CHECK_WORKERS = 8
+# Model catalog synchronization: seconds allowed to each catalog request, and
+# catalogs fetched at once
+MODEL_SYNC_TIMEOUT = 30
+MODEL_SYNC_WORKERS = 8
+
+# Shortest prompt prefix Anthropic caches (2048 for its smallest models, which
+# then ignore the breakpoint)
+PROMPT_CACHE_MIN_TOKENS = 1024
+
+# Unique index on the case-insensitive name of the providers of each company
+PROVIDER_NAME_INDEX = 'vs_ai_provider_name_uniq'
+
+# Share of the synchronous price charged for Batch API calls
+BATCH_PRICE_FACTOR = 0.5
+
 
 class VSAIProvider(models.Model):
     """
@@ -95,52 +141,124 @@ class VSAIProvider(models.Model):
         help="When the connection was last tested"
     )
     
+    rpm_limit = fields.Integer(
+        string="Requests per Minute",
+        default=0,
+        help="Maximum requests per minute sent to this provider by all workers (0 for no limit)"
+    )
+    
+    tpm_limit = fields.Integer(
+        string="Tokens per Minute",
+        default=0,
+        help="Maximum estimated tokens per minute sent to this provider by all workers (0 for no limit)"
+    )
+    
+    max_concurrency = fields.Integer(
+        string="Max Concurrent Requests",
+        default=16,
+        help="Upper bound of the adaptive limit of requests in flight to this provider, per worker. "
+             "The limit grows while the provider keeps up and is cut on throttling or rising latency."
+    )
+    
+    concurrency_limit = fields.Integer(
+        string="Current Concurrency Limit",
+        compute="_compute_concurrency_stats",
+        help="Current adaptive limit of requests in flight in this worker"
+    )
+    
+    concurrency_in_flight = fields.Integer(
+        string="Requests in Flight",
+        compute="_compute_concurrency_stats",
+    )
+    
+    concurrency_queue = fields.Integer(
+        string="Queued Requests",
+        compute="_compute_concurrency_stats",
+        help="Requests of this worker waiting for a free slot"
+    )
+    
+    job_concurrency = fields.Integer(
+        string="Parallel Job Requests",
+        default=4,
+        help="Number of concurrent requests sent to this provider by each AI job runner"
+    )
+    
     # UI helpers
     color = fields.Integer(string="Color Index", default=0)
     
+    def init(self):
+        create_bucket_table(self.env.cr)
+        try:
+            with self.env.cr.savepoint(flush=False):
+                self.env.cr.execute(f"""
+                    CREATE UNIQUE INDEX IF NOT EXISTS {PROVIDER_NAME_INDEX}
+                        ON {self._table} (lower(name), COALESCE(company_id, 0))
+                """)
+        except psycopg2.errors.UniqueViolation:
+            _logger.warning(
+                "Provider names are not unique within their company; rename the "
+                "duplicate providers and update the module to enforce it.")
+    
     @api.depends('model_ids')
     def _compute_model_count(self):
         """Compute the number of models for this provider"""
         for provider in self:
             provider.model_count = len(provider.model_ids)
     
-    @api.constrains('name')
+    def _compute_concurrency_stats(self):
+        for provider in self:
+            limit = concurrency_registry.peek((self.env.cr.dbname, provider.id))
+            stats = limit.stats() if limit else {}
+            provider.concurrency_limit = stats.get('limit', max(provider.max_concurrency // 4, 1))
+            provider.concurrency_in_flight = stats.get('in_flight', 0)
+            provider.concurrency_queue = stats.get('waiting', 0)
+    
+    @contextmanager
     def _check_name_unique(self):
-        """Ensure provider names are unique (case-insensitive)"""
-        for record in self:
-            domain = [
-                ('id', '!=', record.id),
-                ('name', '=ilike', record.name)
-            ]
-            if self.search_count(domain):
-                raise ValidationError(_("Provider name must be unique"))
+        """Turn violations of the provider name index into a validation error"""
+        try:
+            with self.env.cr.savepoint(flush=False):
+                yield
+                self.flush_model(['name', 'company_id'])
+        except psycopg2.errors.UniqueViolation as e:
+            if e.diag.constraint_name != PROVIDER_NAME_INDEX:
+                raise
+            raise ValidationError(_("Provider name must be unique within a company")) from None
+    
+    @api.model_create_multi
+    def create(self, vals_list):
+        with self._check_name_unique():
+            return super().create(vals_list)
+    
+    def write(self, vals):
+        if {'name', 'company_id'} & set(vals):
+            with self._check_name_unique():
+                res = super().write(vals)
+        else:
+            res = super().write(vals)
+        if {'api_key', 'api_endpoint', 'provider_type'} & set(vals):
+            # Pooled clients carry the old credentials/endpoint
+            for provider in self:
+                client_registry.invalidate((self.env.cr.dbname, provider.id))
+        if {'active', 'company_id'} & set(vals):
+            # Model resolution depends on the provider company
+            self.env['vs.ai.model'].clear_caches()
+        return res
+    
+    def unlink(self):
+        provider_ids = self.ids
+        res = super().unlink()
+        for provider_id in provider_ids:
+            client_registry.invalidate((self.env.cr.dbname, provider_id))
+            concurrency_registry.discard((self.env.cr.dbname, provider_id))
+        self.env['vs.ai.model'].clear_caches()
+        return res
     
     def action_test_connection(self):
         """Test the connection to the AI provider"""
         self.ensure_one()
-        
-        try:
-            # Implementation will depend on the provider type
-            if self.provider_type == 'openai':
-                self._test_openai_connection()
-            elif self.provider_type == 'anthropic':
-                self._test_anthropic_connection()
-            elif self.provider_type == 'mistral':
-                self._test_mistral_connection()
-            elif self.provider_type == 'ollama':
-                self._test_ollama_connection()
-            elif self.provider_type == 'custom':
-                self._test_custom_connection()
-            else:
-                raise UserError(_("Unknown provider type"))
-            
-            # Update status if successful
-            self.write({
-                'status': 'working',
-                'status_message': _("Connection successful"),
-                'last_checked': fields.Datetime.now(),
-            })
-            
+        status, message = self._check_health()[self.id]
+        if status == 'working':
             return {
                 'type': 'ir.actions.client',
                 'tag': 'display_notification',
@@ -151,25 +269,139 @@ class VSAIProvider(models.Model):
                     'type': 'success',
                 }
             }
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _("Connection Test"),
+                'message': _("Failed to connect: %s", message),
+                'sticky': True,
+                'type': 'danger',
+            }
+        }
+    
+    def action_check_health(self):
+        """Check the connection of the selected providers at once"""
+        results = self._check_health()
+        failed = [status for status, _message in results.values() if status != 'working']
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _("Health Check"),
+                'message': _("%(ok)s provider(s) working, %(failed)s in error",
+                             ok=len(results) - len(failed), failed=len(failed)),
+                'sticky': False,
+                'type': 'warning' if failed else 'success',
+            }
+        }
+    
+    @api.model
+    def _cron_check_health(self):
+        self.search([('active', '=', True)])._check_health()
+    
+    def _check_health(self):
+        """
+        Probe the providers in parallel and store their status
+        
+        Each probe is a cheap authenticated call bounded by a strict timeout.
+        The status fields are written without mail tracking; only status
+        changes are posted in the chatter.
+        
+        Returns:
+            dict: (status, message) by provider id
+        """
+        timeout = float(self.env['ir.config_parameter'].sudo().get_param(
+            'vs_ai.health_check_timeout', HEALTH_CHECK_TIMEOUT))
+        results, contexts = {}, {}
+        for provider in self:
+            try:
+                provider._check_configuration()
+                contexts[provider.id] = provider._get_api_context()
+            except UserError as e:
+                results[provider.id] = ('error', str(e))
+        
+        calls = self._call_in_parallel(provider_api.check_connection, contexts, timeout, HEALTH_CHECK_WORKERS)
+        for provider_id, (_result, error) in calls.items():
+            if error is not None:
+                results[provider_id] = ('error', str(error))
+            else:
+                results[provider_id] = ('working', _("Connection successful"))
+        
+        self._store_health(results)
+        return results
+    
+    def _call_in_parallel(self, function, contexts, timeout, workers):
+        """
+        Call a provider API function for several providers at once
+        
+        Args:
+            function (callable): Function of tools.provider_api, called with
+                the provider context and the timeout
+            contexts (dict): Provider contexts by provider id
+            timeout (float): Timeout of each call, in seconds
+            workers (int): Maximum number of simultaneous calls
             
-        except Exception as e:
-            # Update status if failed
-            self.write({
-                'status': 'error',
-                'status_message': str(e),
-                'last_checked': fields.Datetime.now(),
+        Returns:
+            dict: (result, error) by provider id
+        """
+        results = {}
+        if not contexts:
+            return results
+        executor = ThreadPoolExecutor(
+            max_workers=min(len(contexts), workers),
+            thread_name_prefix='vs_ai.%s' % function.__name__)
+        futures = {
+            executor.submit(function, ctx, timeout): provider_id
+            for provider_id, ctx in contexts.items()
+        }
+        # Queued calls wait for a free thread: bound the whole batch
+        rounds = -(-len(contexts) // workers)
+        wait(futures, timeout=timeout * rounds + 5)
+        executor.shutdown(wait=False, cancel_futures=True)
+        for future, provider_id in futures.items():
+            if future.cancelled() or not future.done():
+                error = provider_api.ProviderError(_("No answer within %s seconds", timeout))
+                results[provider_id] = (None, error)
+            elif future.exception():
+                results[provider_id] = (None, future.exception())
+            else:
+                results[provider_id] = (future.result(), None)
+        return results
+    
+    def _store_health(self, results):
+        now = fields.Datetime.now()
+        for provider in self:
+            status, message = results[provider.id]
+            previous = provider.status
+            provider.with_context(tracking_disable=True).write({
+                'status': status,
+                'status_message': message,
+                'last_checked': now,
             })
-            
-            return {
-                'type': 'ir.actions.client',
-                'tag': 'display_notification',
-                'params': {
-                    'title': _("Connection Test"),
-                    'message': _("Failed to connect: %s", str(e)),
-                    'sticky': True,
-                    'type': 'danger',
-                }
-            }
+            if status != previous:
+                provider.message_post(body=_(
+                    "Status changed from %(previous)s to %(status)s: %(message)s",
+                    previous=dict(self._fields['status'].selection).get(previous),
+                    status=dict(self._fields['status'].selection).get(status),
+                    message=message,
+                ))
+    
+    def _check_configuration(self):
+        """Raise a UserError when the provider is missing connection settings"""
+        self.ensure_one()
+        if self.provider_type == 'openai':
+            self._test_openai_connection()
+        elif self.provider_type == 'anthropic':
+            self._test_anthropic_connection()
+        elif self.provider_type == 'mistral':
+            self._test_mistral_connection()
+        elif self.provider_type == 'ollama':
+            self._test_ollama_connection()
+        elif self.provider_type == 'custom':
+            self._test_custom_connection()
+        elif self.provider_type not in ('azure', 'deepseek', 'openrouter'):
+            raise UserError(_("Unknown provider type"))
     
     def action_fetch_models(self):
         """Open wizard to fetch available models from the provider"""
@@ -187,6 +419,57 @@ class VSAIProvider(models.Model):
             }
         }
     
+    @api.model
+    def _cron_sync_models(self):
+        self.search([('active', '=', True)])._sync_models()
+    
+    def _sync_models(self, name_filter=None):
+        """
+        Synchronize the models of the providers with their catalogs
+        
+        The catalogs are fetched in parallel, then applied to the models in
+        one batch (see vs.ai.model._apply_catalogs). The models of providers
+        whose catalog cannot be fetched are left alone.
+        
+        Args:
+            name_filter (str): Only synchronize the models whose API
+                identifier contains this text; nothing gets archived
+            
+        Returns:
+            dict: Numbers of 'fetched', 'created', 'updated' and 'archived'
+            models, and the 'errors' by provider name
+        """
+        timeout = float(self.env['ir.config_parameter'].sudo().get_param(
+            'vs_ai.model_sync_timeout', MODEL_SYNC_TIMEOUT))
+        errors, contexts = {}, {}
+        for provider in self:
+            try:
+                provider._check_configuration()
+                contexts[provider.id] = provider._get_api_context()
+            except UserError as e:
+                errors[provider.name] = str(e)
+        
+        catalogs = {}
+        calls = self._call_in_parallel(provider_api.list_models, contexts, timeout, MODEL_SYNC_WORKERS)
+        for provider_id, (catalog, error) in calls.items():
+            if error is not None:
+                errors[self.browse(provider_id).name] = str(error)
+                continue
+            if name_filter:
+                catalog = [entry for entry in catalog
+                           if name_filter.lower() in entry['model_id'].lower()]
+            catalogs[provider_id] = catalog
+        
+        result = self.env['vs.ai.model']._apply_catalogs(catalogs, archive=not name_filter)
+        result.update(
+            fetched=sum(len(catalog) for catalog in catalogs.values()),
+            errors=errors,
+        )
+        if errors:
+            _logger.warning("Could not fetch the model catalog of %s", ", ".join(
+                "%s (%s)" % item for item in errors.items()))
+        return result
+    
     def action_view_models(self):
         """Open the list of models for this provider"""
         self.ensure_one()
@@ -202,52 +485,218 @@ class VSAIProvider(models.Model):
             }
         }
     
-    # Provider-specific connection test methods
+    # Provider-specific configuration checks, run before the connection probe
     def _test_openai_connection(self):
         """Test connection to OpenAI API"""
         if not self.api_key:
             raise UserError(_("API key is required for OpenAI"))
-        
-        # This would be implemented with actual API calls
-        # For now, we'll just simulate success
         return True
     
     def _test_anthropic_connection(self):
         """Test connection to Anthropic API"""
         if not self.api_key:
             raise UserError(_("API key is required for Anthropic"))
-        
-        # This would be implemented with actual API calls
-        # For now, we'll just simulate success
         return True
     
     def _test_mistral_connection(self):
         """Test connection to Mistral AI API"""
         if not self.api_key:
             raise UserError(_("API key is required for Mistral AI"))
-        
-        # This would be implemented with actual API calls
-        # For now, we'll just simulate success
         return True
     
     def _test_ollama_connection(self):
         """Test connection to local Ollama server"""
         if not self.api_endpoint:
             raise UserError(_("API endpoint is required for Ollama"))
-        
-        # This would be implemented with actual API calls
-        # For now, we'll just simulate success
         return True
     
     def _test_custom_connection(self):
         """Test connection to custom provider"""
         if not self.api_key or not self.api_endpoint:
             raise UserError(_("Both API key and endpoint are required for custom providers"))
-        
-        # This would be implemented with actual API calls
-        # For now, we'll just simulate success
         return True
     
+    # API dispatch helpers
+    def _get_base_url(self):
+        """Return the base URL of the provider API"""
+        self.ensure_one()
+        if self.api_endpoint:
+            base_url = self.api_endpoint.rstrip('/')
+            if self.provider_type == 'ollama' and not base_url.endswith('/v1'):
+                # Use the OpenAI-compatible API of Ollama
+                base_url += '/v1'
+            return base_url
+        if self.provider_type not in provider_api.DEFAULT_ENDPOINTS:
+            raise UserError(_("An API endpoint is required for %s", self.name))
+        return provider_api.DEFAULT_ENDPOINTS[self.provider_type]
+    
+    def _get_api_context(self):
+        """Return an ORM-free snapshot of the connection used for API calls"""
+        self.ensure_one()
+        return provider_api.ProviderContext(
+            dbname=self.env.cr.dbname,
+            provider_id=self.id,
+            provider_type=self.provider_type,
+            base_url=self._get_base_url(),
+            api_key=self.api_key,
+        )
+    
+    def _get_default_model(self, model_type):
+        """Return the default model of the given type for this provider"""
+        self.ensure_one()
+        model = self.env['vs.ai.model'].resolve_model(self.id, model_type)
+        # The resolver falls back to other providers' defaults
+        return model if model.provider_id == self else model.browse()
+    
+    def _get_model_name(self, model, model_type):
+        """Return the API identifier of the model to use"""
+        self.ensure_one()
+        model = model or self._get_default_model(model_type)
+        if not model:
+            raise UserError(_("No %s model configured for %s", model_type, self.name))
+        return model.model_id or model.name
+    
+    def _get_rate_limits(self, model):
+        """
+        Return the rate limits that apply to calls of a model of this provider
+        
+        Returns:
+            list: (bucket key, unit, per-minute limit) tuples
+        """
+        self.ensure_one()
+        limits = [
+            (f"provider:{self.id}:rpm", 'requests', self.rpm_limit),
+            (f"provider:{self.id}:tpm", 'tokens', self.tpm_limit),
+        ]
+        if model:
+            limits += [
+                (f"model:{model.id}:rpm", 'requests', model.rpm_limit),
+                (f"model:{model.id}:tpm", 'tokens', model.tpm_limit),
+            ]
+        return [limit for limit in limits if limit[2] > 0]
+    
+    def _get_rate_limit_wait(self):
+        """Seconds the current caller accepts to queue for rate limits"""
+        return float(self.env.context.get('vs_ai_rate_limit_wait', DEFAULT_RATE_LIMIT_WAIT))
+    
+    def _acquire_rate_limit(self, model, requests=1, tokens=0):
+        """Wait for the provider and model rate limits, or raise RateLimitExceeded"""
+        limits = self._get_rate_limits(model)
+        if limits:
+            rate_limiter.acquire(self.pool, limits, requests, tokens, self._get_rate_limit_wait())
+    
+    def _get_concurrency_limit(self):
+        """Return this worker's adaptive concurrency limit of the provider"""
+        self.ensure_one()
+        return concurrency_registry.get((self.env.cr.dbname, self.id), max(self.max_concurrency, 1))
+    
+    def _acquire_call_slot(self, model, tokens, tracker=None):
+        """
+        Wait for the rate limits and for a concurrency slot of the provider
+        
+        Returns:
+            Permit: To release when the provider call ends
+        """
+        self._acquire_rate_limit(model, tokens=tokens)
+        return self._get_concurrency_limit().acquire(self._get_rate_limit_wait(), observer=tracker)
+    
+    def _get_call_tracker_factory(self, model, operation):
+        """
+        Return an ORM-free factory of CallTracker for calls of a model, which
+        record the call statistics and usage log entries
+        """
+        self.ensure_one()
+        return functools.partial(
+            CallTracker, self.env.cr.dbname, operation, model.id, self.id,
+            self.env.uid, self.env.company.id, model.input_cost, model.output_cost,
+            self.name, model.model_id or model.name, cached_input_cost=model.cached_input_cost,
+        )
+    
+    def _get_call_tracker(self, model, operation, stream=False):
+        return self._get_call_tracker_factory(model, operation)(stream=stream)
+    
+    @staticmethod
+    def _limited_stream(concurrency, max_wait, tracker, events):
+        """
+        Hold a concurrency slot while the stream is consumed
+        
+        The slot is only taken when the stream starts, so that an iterator
+        that is never consumed cannot leak it.
+        """
+        with concurrency.acquire(max_wait, measure=False, observer=tracker):
+            for event in events:
+                if event.get('delta'):
+                    tracker.first_token()
+                if event.get('usage'):
+                    tracker.set_usage(event['usage'])
+                yield event
+    
+    @staticmethod
+    def _estimate_tokens(texts, provider_type=None, model_name=None):
+        """Token count of texts (see tools.tokenizer)"""
+        return token_counter.count_texts(texts, provider_type, model_name)
+    
+    def _estimate_chat_tokens(self, messages, kwargs, model_name=None):
+        """Prompt tokens plus requested completion tokens of a chat call"""
+        prompt_tokens = token_counter.count_messages(messages, self.provider_type, model_name)
+        return prompt_tokens + int(kwargs.get('max_tokens') or 0)
+    
+    def _fit_context(self, model, model_name, messages, kwargs):
+        """
+        Fit the messages of a chat call into the context window of the model
+        
+        The oldest turns of the conversation are dropped when the prompt and
+        the requested completion tokens exceed the context size of the model.
+        Models without a known context size, or whose 'fit_context'
+        configuration key is false, get the messages unchanged.
+        
+        Returns:
+            tuple: The messages to send and their number of prompt tokens
+        
+        Raises:
+            ContextWindowExceeded: When the last message alone does not fit
+        """
+        self.ensure_one()
+        reserved = kwargs.get('max_tokens')
+        if not reserved and self.provider_type == 'anthropic':
+            reserved = provider_api.ANTHROPIC_DEFAULT_MAX_TOKENS
+        budget = None
+        if model and model._get_config_value('fit_context', True):
+            budget = get_prompt_budget(model.max_tokens, int(reserved or 0))
+        if budget is None:
+            return messages, token_counter.count_messages(messages, self.provider_type, model_name)
+        fitted, prompt_tokens = token_counter.fit_messages(messages, budget, self.provider_type, model_name)
+        if len(fitted) < len(messages):
+            _logger.debug("Dropped %d messages to fit the context of %s",
+                          len(messages) - len(fitted), model_name)
+        return fitted, prompt_tokens
+    
+    def _get_prompt_cache_params(self, model, model_name, messages):
+        """
+        Return the chat parameters that let the provider cache the prompt prefix
+        
+        Anthropic gets a cache breakpoint after the longest prefix already
+        sent to the model within the cache lifetime, when it is long enough
+        to be cached; OpenAI gets a key identifying the shared prefix. Models
+        whose 'prompt_cache' configuration key is false get none.
+        """
+        self.ensure_one()
+        if self.provider_type not in ('anthropic', 'openai') or not model \
+                or not model._get_config_value('prompt_cache', True):
+            return {}
+        stable, digest = prefix_tracker.observe((self.env.cr.dbname, self.id, model_name), messages)
+        if self.provider_type == 'openai':
+            return {'cache_key': digest} if digest else {}
+        if stable and token_counter.count_messages(
+                messages[:stable], self.provider_type, model_name) >= PROMPT_CACHE_MIN_TOKENS:
+            return {'cache_prefix': stable}
+        return {}
+    
+    @api.model
+    def get_client_pool_stats(self):
+        """Return the hit/miss counters of this worker's HTTP client pool"""
+        return client_registry.stats()
+    
     # Core AI functionality methods
     def generate_completion(self, prompt, model=None, **kwargs):
         """
@@ -261,9 +710,18 @@ class VSAIProvider(models.Model):
         Returns:
             str: The generated completion text
         """
-        # Implementation would dispatch to the appropriate provider
-        # For now, return a placeholder
-        return "This is a placeholder completion response."
+        self.ensure_one()
+        # Legacy completion endpoints are deprecated: use the chat API
+        model = model or self._get_default_model('completion') or self._get_default_model('chat')
+        messages = [{"role": "user", "content": prompt}]
+        ctx, model_name = self._get_api_context(), self._get_model_name(model, 'chat')
+        messages, prompt_tokens = self._fit_context(model, model_name, messages, kwargs)
+        tracker = self._get_call_tracker(model, 'completion')
+        tracker.set_estimate(prompt_tokens)
+        with self._acquire_call_slot(model, prompt_tokens + int(kwargs.get('max_tokens') or 0), tracker):
+            response = provider_api.chat_completion(ctx, model_name, messages, **kwargs)
+            tracker.set_usage(response.get('usage'))
+        return response['content']
     
     def generate_chat_completion(self, messages, model=None, stream=False, **kwargs):
         """
@@ -276,14 +734,123 @@ class VSAIProvider(models.Model):
             **kwargs: Additional parameters for the completion
             
         Returns:
-            dict: The chat completion response
+            dict: The chat completion response, or an iterator of stream events
+            (see ``provider_api.stream_chat_completion``) when ``stream`` is set
         """
-        # Implementation would dispatch to the appropriate provider
-        # For now, return a placeholder
-        return {
-            "role": "assistant",
-            "content": "This is a placeholder chat response."
-        }
+        self.ensure_one()
+        model = model or self._get_default_model('chat')
+        ctx, model_name = self._get_api_context(), self._get_model_name(model, 'chat')
+        messages, prompt_tokens = self._fit_context(model, model_name, messages, kwargs)
+        tokens = prompt_tokens + int(kwargs.get('max_tokens') or 0)
+        params = dict(kwargs, **self._get_prompt_cache_params(model, model_name, messages))
+        tracker = self._get_call_tracker(model, 'stream' if stream else 'chat', stream=stream)
+        tracker.set_estimate(prompt_tokens)
+        if stream:
+            self._acquire_rate_limit(model, tokens=tokens)
+            return self._limited_stream(
+                self._get_concurrency_limit(), self._get_rate_limit_wait(), tracker,
+                provider_api.stream_chat_completion(ctx, model_name, messages, **params))
+        with self._acquire_call_slot(model, tokens, tracker):
+            response = provider_api.chat_completion(ctx, model_name, messages, **params)
+            tracker.set_usage(response.get('usage'))
+        return response
+    
+    def generate_chat_completion_async(self, messages, model=None, **kwargs):
+        """
+        Start a chat completion on the worker's AI event loop
+        
+        Everything needed from the database is read before returning, so the
+        caller may end its transaction while the provider call is in flight.
+        
+        Args:
+            messages (list): List of message dictionaries with 'role' and 'content'
+            model (vs.ai.model): Specific model to use, or None for default
+            **kwargs: Additional parameters for the completion
+            
+        Returns:
+            concurrent.futures.Future: Resolved with the chat completion response
+        """
+        return self._prepare_chat_call_async(messages, model=model, **kwargs)()
+    
+    def _prepare_chat_call_async(self, messages, model=None, **kwargs):
+        """
+        Prepare a chat completion to run on the worker's AI event loop
+        
+        Everything needed from the database is read here: the returned
+        function does not use the ORM, and may be called after the
+        transaction ended.
+        
+        Returns:
+            callable: Waits for the rate limits and a concurrency slot of the
+            provider, starts the call and returns a concurrent.futures.Future
+            resolved with the chat completion response
+        """
+        self.ensure_one()
+        model = model or self._get_default_model('chat')
+        ctx, model_name = self._get_api_context(), self._get_model_name(model, 'chat')
+        messages, prompt_tokens = self._fit_context(model, model_name, messages, kwargs)
+        tokens = prompt_tokens + int(kwargs.get('max_tokens') or 0)
+        params = dict(kwargs, **self._get_prompt_cache_params(model, model_name, messages))
+        registry, limits, max_wait = self.pool, self._get_rate_limits(model), self._get_rate_limit_wait()
+        concurrency = self._get_concurrency_limit()
+        tracker = self._get_call_tracker(model, 'chat')
+        tracker.set_estimate(prompt_tokens)
+        
+        def start():
+            if limits:
+                rate_limiter.acquire(registry, limits, 1, tokens, max_wait)
+            permit = concurrency.acquire(max_wait, observer=tracker)
+            try:
+                future = event_loop.submit(provider_api.achat_completion(ctx, model_name, messages, **params))
+            except Exception as e:
+                permit.release(e)
+                raise
+            
+            def done_callback(done):
+                if done.cancelled():
+                    permit.cancel()
+                    return
+                if done.exception() is None:
+                    tracker.set_usage(done.result().get('usage'))
+                permit.release(done.exception())
+            
+            future.add_done_callback(done_callback)
+            return future
+        
+        return start
+    
+    def _prepare_chat_call(self, messages, model=None, **kwargs):
+        """
+        Prepare a chat completion to run in another thread
+        
+        Everything needed from the database is read here: the returned
+        function does not use the ORM, and may run after the transaction
+        ended.
+        
+        Returns:
+            callable: Waits for the rate limits and a concurrency slot of the
+            provider, and returns the chat completion response
+        """
+        self.ensure_one()
+        model = model or self._get_default_model('chat')
+        ctx, model_name = self._get_api_context(), self._get_model_name(model, 'chat')
+        messages, prompt_tokens = self._fit_context(model, model_name, messages, kwargs)
+        tokens = prompt_tokens + int(kwargs.get('max_tokens') or 0)
+        params = dict(kwargs, **self._get_prompt_cache_params(model, model_name, messages))
+        registry, limits, max_wait = self.pool, self._get_rate_limits(model), self._get_rate_limit_wait()
+        concurrency = self._get_concurrency_limit()
+        tracker = self._get_call_tracker(model, 'chat')
+        tracker.set_estimate(prompt_tokens)
+        
+        def call():
+            if limits:
+                rate_limiter.acquire(registry, limits, 1, tokens, max_wait)
+            with concurrency.acquire(max_wait, observer=tracker):
+                response = provider_api.chat_completion(ctx, model_name, messages, **params)
+                tracker.set_usage(response.get('usage'))
+            return response
+        
+        return call
     
     def generate_embeddings(self, texts, model=None, **kwargs):
         """
@@ -297,6 +864,100 @@ class VSAIProvider(models.Model):
         Returns:
             list: List of embedding vectors
         """
-        # Implementation would dispatch to the appropriate provider
-        # For now, return a placeholder
-        return [[0.1, 0.2, 0.3] for _ in texts]
+        self.ensure_one()
+        model = model or self._get_default_model('embedding')
+        ctx = self._get_api_context()
+        model_name = self._get_model_name(model, 'embedding')
+        batch_size, batch_wait = self._get_embedding_batch_settings(model)
+        key = client_registry.make_key((ctx.dbname, ctx.provider_id), ctx.base_url, ctx.api_key) + (
+            model_name, repr(sorted(kwargs.items())))
+        registry, limits, max_wait = self.pool, self._get_rate_limits(model), self._get_rate_limit_wait()
+        concurrency = self._get_concurrency_limit()
+        new_tracker = self._get_call_tracker_factory(model, 'embedding')
+        
+        def fetch(batch):
+            # Runs in the batch leader's thread: no ORM access
+            tokens = self._estimate_tokens(batch, ctx.provider_type, model_name)
+            if limits:
+                rate_limiter.acquire(registry, limits, 1, tokens, max_wait)
+            tracker = new_tracker()
+            # Embedding APIs do not all report usage: log the estimate
+            tracker.set_estimate(tokens)
+            with concurrency.acquire(max_wait, observer=tracker):
+                return provider_api.embeddings(ctx, model_name, batch, **kwargs)
+        
+        return embedding_batcher.embed(key, texts, fetch, batch_size, batch_wait)
+    
+    # Batch API
+    def submit_chat_batch(self, requests, model=None):
+        """
+        Submit chat completions to the provider Batch API
+        
+        The provider processes the batch within 24 hours, at a reduced price;
+        poll it with ``get_chat_batch``.
+        
+        Args:
+            requests (iterable): (custom_id, messages, params) tuples
+            model (vs.ai.model): Specific model to use, or None for default
+            
+        Returns:
+            str: The identifier of the batch at the provider
+        """
+        self.ensure_one()
+        if self.provider_type not in provider_api.BATCH_PROVIDERS:
+            raise UserError(_("%s does not support the Batch API", self.name))
+        model = model or self._get_default_model('chat')
+        ctx, model_name = self._get_api_context(), self._get_model_name(model, 'chat')
+        return provider_api.submit_batch(ctx, (
+            (custom_id, model_name, messages, params or {})
+            for custom_id, messages, params in requests
+        ))
+    
+    def get_chat_batch(self, batch_id):
+        """Return the status of a batch (see ``provider_api.get_batch``)"""
+        self.ensure_one()
+        return provider_api.get_batch(self._get_api_context(), batch_id)
+    
+    def iter_chat_batch_results(self, status, model=None):
+        """
+        Stream the results of an ended batch, and log their usage
+        
+        Args:
+            status (dict): Status of the ended batch, from ``get_chat_batch``
+            model (vs.ai.model): Model of the batch, or None for default
+            
+        Yields:
+            tuple: (custom_id, response, error)
+        """
+        self.ensure_one()
+        model = model or self._get_default_model('chat')
+        new_tracker = self._get_call_tracker_factory(model, 'batch')
+        for custom_id, response, error in provider_api.iter_batch_results(
+                self._get_api_context(), status['results']):
+            tracker = new_tracker(price_factor=BATCH_PRICE_FACTOR)
+            # The call held no concurrency slot: balance the in-flight gauge
+            tracker.start()
+            if response:
+                tracker.set_usage(response.get('usage'))
+            tracker(None, provider_api.ProviderError(error) if error else None)
+            yield custom_id, response, error
+    
+    def cancel_chat_batch(self, batch_id):
+        """Ask the provider to stop processing a batch"""
+        self.ensure_one()
+        provider_api.cancel_batch(self._get_api_context(), batch_id)
+    
+    def _get_embedding_batch_settings(self, model):
+        """
+        Return the (max batch size, batch window in seconds) used to merge
+        concurrent embedding requests of a model
+
+        Requests are only merged within a process. Prefork workers serve one
+        request at a time, so batching is off there by default, and each
+        /vs_ai/embed call stays one upstream request.
+        """
+        # Prefork workers serve one request at a time: nothing to merge with
+        default_wait = 0 if tools.config.get('workers') else EMBEDDING_BATCH_WAIT_MS
+        batch_size = int(model._get_config_value('embedding_batch_size', EMBEDDING_BATCH_SIZE))
+        batch_wait = float(model._get_config_value('embedding_batch_wait_ms', default_wait))
+        return max(batch_size, 1), batch_wait / 1000.0
@@ -0,0 +1,112 @@
+import hashlib
+import json
+import time
+
+from psycopg2.extras import Json
+
+from odoo import api, fields, models
+from odoo.tools.lru import LRU
+
+from ..tools.counter_buffer import counter_buffer
+
+# Sampling parameters that change the answer of a model
+CACHE_KEY_PARAMS = (
+    'temperature', 'top_p', 'top_k', 'max_tokens', 'stop', 'seed',
+    'presence_penalty', 'frequency_penalty', 'response_format', 'tool_choice',
+)
+
+# In-process layer in front of the shared tables of every database served by
+# the worker: (database, key) -> (expires_at, response)
+_local_cache = LRU(1024)
+
+
+class VSAIResponseCache(models.Model):
+    """
+    Chat Response Cache
+
+    Exact-match cache of deterministic (temperature 0) chat completions, keyed
+    by a canonical hash of the model, messages, tools and sampling parameters.
+    A per-worker LRU serves repeated requests without a database round-trip.
+    """
+    _name = "vs.ai.response.cache"
+    _description = "AI Response Cache"
+    _order = "expires_at desc"
+    _log_access = False
+
+    key = fields.Char(string="Key", required=True, readonly=True)
+
+    model_id = fields.Many2one(
+        'vs.ai.model',
+        string="Model",
+        required=True,
+        readonly=True,
+        index=True,
+        ondelete='cascade',
+    )
+
+    response = fields.Json(string="Response", readonly=True)
+
+    hit_count = fields.Integer(string="Hits", readonly=True, default=0)
+
+    expires_at = fields.Datetime(string="Expires At", required=True, readonly=True, index=True)
+
+    _sql_constraints = [
+        ('key_uniq', 'unique(key)', "A response is already cached for this request."),
+    ]
+
+    @api.model
+    def _make_key(self, model, messages, params):
+        """Canonical hash of everything that determines the answer"""
+        payload = {
+            'model': model.id,
+            'messages': messages,
+            'tools': params.get('tools'),
+            'params': {name: params.get(name) for name in CACHE_KEY_PARAMS},
+        }
+        canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    @api.model
+    def _get(self, key):
+        """Return the cached response for the key, or None"""
+        local_key = (self.env.cr.dbname, key)
+        entry = _local_cache.get(local_key)
+        if entry:
+            expires_at, response = entry
+            if expires_at > time.time():
+                self._count_hit(key)
+                return dict(response)
+            _local_cache.pop(local_key)
+
+        self.env.cr.execute(f"""
+            SELECT response, extract(epoch from expires_at) FROM {self._table}
+             WHERE key = %s AND expires_at > now() at time zone 'UTC'
+        """, [key])
+        row = self.env.cr.fetchone()
+        if not row:
+            return None
+        response, expires_at = row
+        _local_cache[local_key] = (float(expires_at), response)
+        self._count_hit(key)
+        return dict(response)
+
+    @api.model
+    def _count_hit(self, key):
+        # Out of the request transaction, to keep hot entries unlocked
+        counter_buffer.add(self.env.cr.dbname, self._table, key, {'hit_count': 1}, key_column='key')
+
+    @api.model
+    def _set(self, key, model, response, ttl):
+        """Cache a response for ttl seconds"""
+        _local_cache[(self.env.cr.dbname, key)] = (time.time() + ttl, dict(response))
+        self.env.cr.execute(f"""
+            INSERT INTO {self._table} (key, model_id, response, hit_count, expires_at)
+            VALUES (%s, %s, %s, 0, (now() at time zone 'UTC') + make_interval(secs => %s))
+            ON CONFLICT (key) DO UPDATE
+               SET response = EXCLUDED.response, expires_at = EXCLUDED.expires_at
+        """, [key, model.id, Json(response), ttl])
+
+    @api.model
+    def _cron_purge_expired(self):
+        """Remove expired responses"""
+        self.env.cr.execute(f"DELETE FROM {self._table} WHERE expires_at <= now() at time zone 'UTC'")
@@ -0,0 +1,233 @@
+import logging
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from odoo import api, fields, models, _
+from odoo.exceptions import UserError
+
+from ..tools.model_stats import model_stats
+from ..tools.provider_api import ProviderError
+from ..tools.rate_limiter import RateLimitExceeded
+
+_logger = logging.getLogger(__name__)
+
+
+class VSAIRoutingGroup(models.Model):
+    """
+    AI Routing Group
+
+    An ordered list of equivalent chat models, usually from different
+    providers. Requests go to the first available model; when it is slower
+    than its usual p95 latency, a hedge request is sent to the next model and
+    the first complete answer wins, the other request being cancelled. Models
+    whose provider is in error are skipped and connection errors fail over to
+    the next model immediately.
+    """
+    _name = "vs.ai.routing.group"
+    _description = "AI Routing Group"
+    _order = "name"
+
+    name = fields.Char(
+        string="Name",
+        required=True,
+    )
+
+    active = fields.Boolean(
+        default=True,
+    )
+
+    company_id = fields.Many2one(
+        'res.company',
+        string="Company",
+        default=lambda self: self.env.company,
+    )
+
+    line_ids = fields.One2many(
+        'vs.ai.routing.group.line',
+        'group_id',
+        string="Models",
+        copy=True,
+        help="Equivalent models, in order of preference"
+    )
+
+    hedge = fields.Boolean(
+        string="Hedge Slow Requests",
+        default=True,
+        help="Send the request to the next model as well when the current one is slow"
+    )
+
+    hedge_percentile = fields.Integer(
+        string="Hedge Percentile",
+        default=95,
+        help="A request is hedged once it has been running longer than this "
+             "percentile of the recent latencies of its model"
+    )
+
+    hedge_min_delay = fields.Float(
+        string="Minimum Hedge Delay (s)",
+        default=1.0,
+        help="Never hedge a request earlier than this, nor without latency statistics"
+    )
+
+    max_hedges = fields.Integer(
+        string="Maximum Hedges",
+        default=1,
+        help="Maximum number of hedge requests sent for one request"
+    )
+
+    def _get_candidates(self):
+        """
+        Return the usable models of the group, in order
+
+        Models whose provider is in error go last, as a last resort.
+        """
+        self.ensure_one()
+        models_ = self.line_ids.model_id.filtered(
+            lambda model: model.active and model.provider_id.active
+            and model.model_type in ('chat', 'multimodal'))
+        healthy = models_.filtered(lambda model: model.provider_id.status != 'error')
+        return healthy + (models_ - healthy)
+
+    def _get_hedge_delay(self, model):
+        """Seconds after which a request to the model gets hedged"""
+        self.ensure_one()
+        latency = model_stats.percentile(self.env.cr.dbname, model.id, self.hedge_percentile)
+        if latency is None:
+            # Without statistics, only hedge requests that are clearly stuck
+            latency = self.hedge_min_delay * 10
+        return max(latency, self.hedge_min_delay)
+
+    @staticmethod
+    def _should_fail_over(error):
+        """Whether another model may succeed where this error occurred"""
+        if isinstance(error, ProviderError):
+            return error.is_connection_error or error.status_code in (408, 409, 429) \
+                or error.status_code >= 500
+        return isinstance(error, RateLimitExceeded)
+
+    def generate_chat_completion(self, messages, **kwargs):
+        """
+        Generate a chat completion with the models of the group
+
+        The caches of the first model are used.
+
+        Returns:
+            dict: The chat completion response, with the 'model_id' that
+            answered and whether the request was 'hedged'
+        """
+        self.ensure_one()
+        candidates = self._get_candidates()
+        if not candidates:
+            raise UserError(_("No available model in routing group %s", self.name))
+
+        primary = candidates[0]
+        if kwargs.pop('cache_bypass', False):
+            response, cache_state = None, {}
+        else:
+            response, cache_state = primary._lookup_chat_caches(messages, kwargs)
+        if response is None:
+            response = self._dispatch(list(candidates), messages, kwargs)
+            primary._store_chat_caches(cache_state, response)
+        return response
+
+    def _dispatch(self, remaining, messages, kwargs):
+        """Run the request on the candidates with hedging and failover"""
+        pending = {}
+        errors = []
+        hedges = 0
+
+        def launch(hedge=False):
+            while remaining:
+                model = remaining.pop(0)
+                provider = model.provider_id
+                if hedge:
+                    # A hedge is only worth it if it can start right away
+                    provider = provider.with_context(vs_ai_rate_limit_wait=0)
+                try:
+                    future = provider.generate_chat_completion_async(messages, model=model, **kwargs)
+                except Exception as e:
+                    if not self._should_fail_over(e):
+                        raise
+                    errors.append(e)
+                    if hedge:
+                        return
+                    continue
+                pending[future] = model
+                return
+
+        launch()
+        latest = next(iter(pending.values()), None)
+        while pending:
+            timeout = None
+            if self.hedge and remaining and hedges < self.max_hedges:
+                timeout = self._get_hedge_delay(latest)
+            done, _not_done = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                hedges += 1
+                _logger.debug("Hedging slow request to model %s", latest.display_name)
+                launch(hedge=True)
+                latest = list(pending.values())[-1]
+                continue
+            for future in done:
+                model = pending.pop(future)
+                error = future.exception()
+                if error is None:
+                    for other in pending:
+                        # Cancels the losing task on the event loop
+                        other.cancel()
+                    return dict(future.result(), model_id=model.id, hedged=bool(hedges))
+                if not self._should_fail_over(error):
+                    for other in pending:
+                        other.cancel()
+                    raise error
+                errors.append(error)
+                _logger.info("Model %s failed, failing over: %s", model.display_name, error)
+            if not pending:
+                launch()
+                if pending:
+                    latest = list(pending.values())[-1]
+
+        if errors:
+            raise errors[-1]
+        raise UserError(_("No available model in routing group %s", self.name))
+
+
+class VSAIRoutingGroupLine(models.Model):
+    _name = "vs.ai.routing.group.line"
+    _description = "AI Routing Group Model"
+    _order = "group_id, sequence, id"
+
+    group_id = fields.Many2one(
+        'vs.ai.routing.group',
+        string="Routing Group",
+        required=True,
+        ondelete='cascade',
+        index=True,
+    )
+
+    sequence = fields.Integer(
+        default=10,
+    )
+
+    model_id = fields.Many2one(
+        'vs.ai.model',
+        string="Model",
+        required=True,
+        ondelete='cascade',
+        domain=[('model_type', 'in', ('chat', 'multimodal'))],
+    )
+
+    provider_id = fields.Many2one(
+        related="model_id.provider_id",
+        string="Provider",
+    )
+
+    p95_latency = fields.Float(
+        string="p95 Latency (s)",
+        compute="_compute_p95_latency",
+        help="95th percentile of the recent latencies of the model in this worker"
+    )
+
+    @api.depends('model_id')
+    def _compute_p95_latency(self):
+        for line in self:
+            line.p95_latency = model_stats.percentile(self.env.cr.dbname, line.model_id.id, 95) or 0.0
@@ -0,0 +1,152 @@
+import hashlib
+import json
+
+import numpy as np
+
+from odoo import api, fields, models
+
+from ..tools.counter_buffer import counter_buffer
+from .vs_ai_embedding_cache import pack_vector
+from .vs_ai_response_cache import CACHE_KEY_PARAMS
+
+DEFAULT_MAX_CANDIDATES = 2000
+
+
+class VSAISemanticCache(models.Model):
+    """
+    Semantic Response Cache
+
+    Caches chat answers by the meaning of the final user message: a request
+    reuses an answer when its final user message embedding is close enough
+    (cosine similarity) to a cached one sent in the exact same conversation
+    context (system prompt, earlier messages, tools) with the same sampling
+    and output parameters.
+    """
+    _name = "vs.ai.semantic.cache"
+    _description = "AI Semantic Cache"
+    _order = "create_date desc"
+    _log_access = False
+
+    model_id = fields.Many2one(
+        'vs.ai.model',
+        string="Model",
+        required=True,
+        readonly=True,
+        index=True,
+        ondelete='cascade',
+    )
+
+    context_key = fields.Char(
+        string="Context Key",
+        required=True,
+        readonly=True,
+        index=True,
+        help="sha256 of the model, every message before the final user message, "
+             "the tools and the parameters that change the answer"
+    )
+
+    prompt = fields.Text(string="Prompt", readonly=True)
+
+    response = fields.Json(string="Response", readonly=True)
+
+    hit_count = fields.Integer(string="Hits", readonly=True, default=0)
+
+    create_date = fields.Datetime(string="Created On", readonly=True)
+
+    expires_at = fields.Datetime(string="Expires At", required=True, readonly=True, index=True)
+
+    def init(self):
+        self.env.cr.execute(f"ALTER TABLE {self._table} ADD COLUMN IF NOT EXISTS vector bytea")
+
+    @staticmethod
+    def _split_prompt(messages):
+        """Return (context messages, final user message text) or None"""
+        if not messages or messages[-1].get('role') != 'user':
+            return None
+        content = messages[-1].get('content')
+        if not isinstance(content, str) or not content.strip():
+            return None
+        return messages[:-1], content
+
+    @api.model
+    def _make_context_key(self, model, context_messages, params):
+        # Answers are only shared by requests expecting the same kind of output
+        # (e.g. JSON mode, a tool call, a token limit)
+        payload = {
+            'model': model.id,
+            'messages': context_messages,
+            'tools': params.get('tools'),
+            'params': {name: params.get(name) for name in CACHE_KEY_PARAMS},
+        }
+        canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    @api.model
+    def _embed(self, model, text):
+        """Embed the prompt with the default embedding model, normalized to unit length"""
+        embedding_model = self.env['vs.ai.model'].resolve_model(model.provider_id.id, 'embedding')
+        if not embedding_model:
+            return None
+        vector = np.asarray(embedding_model.generate_embeddings([text])[0], dtype='<f4')
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    @api.model
+    def _lookup(self, model, messages, params, threshold):
+        """
+        Look for a cached answer to a semantically equivalent prompt
+
+        Returns:
+            tuple: (cached response or None, lookup state to pass to ``_store``)
+        """
+        split = self._split_prompt(messages)
+        if not split:
+            return None, None
+        context_messages, prompt = split
+        vector = self._embed(model, prompt)
+        if vector is None:
+            return None, None
+        context_key = self._make_context_key(model, context_messages, params)
+        state = (context_key, prompt, vector)
+
+        max_candidates = int(model._get_config_value('semantic_cache_max_candidates', DEFAULT_MAX_CANDIDATES))
+        self.env.cr.execute(f"""
+            SELECT id, vector FROM {self._table}
+             WHERE model_id = %s AND context_key = %s
+               AND expires_at > now() at time zone 'UTC'
+               AND octet_length(vector) = %s
+          ORDER BY id DESC
+             LIMIT %s
+        """, [model.id, context_key, vector.nbytes, max_candidates])
+        rows = self.env.cr.fetchall()
+        if not rows:
+            return None, state
+        matrix = np.frombuffer(b"".join(bytes(row[1]) for row in rows), dtype='<f4').reshape(len(rows), -1)
+        scores = matrix @ vector
+        best = int(np.argmax(scores))
+        if scores[best] < threshold:
+            return None, state
+
+        entry_id = rows[best][0]
+        self.env.cr.execute(f"SELECT response FROM {self._table} WHERE id = %s", [entry_id])
+        response = dict(self.env.cr.fetchone()[0])
+        # Out of the request transaction, to keep hot entries unlocked
+        counter_buffer.add(self.env.cr.dbname, self._table, entry_id, {'hit_count': 1})
+        response.update(semantic_cache_id=entry_id, semantic_cache_score=float(scores[best]))
+        return response, state
+
+    @api.model
+    def _store(self, model, state, response, ttl):
+        """Cache the answer of a prompt that missed the cache"""
+        context_key, prompt, vector = state
+        self.env.cr.execute(f"""
+            INSERT INTO {self._table} (model_id, context_key, prompt, response, vector,
+                                       hit_count, create_date, expires_at)
+            VALUES (%s, %s, %s, %s, %s, 0, now() at time zone 'UTC',
+                    (now() at time zone 'UTC') + make_interval(secs => %s))
+        """, [model.id, context_key, prompt, json.dumps(response), pack_vector(vector), ttl])
+
+    @api.model
+    def _cron_purge_expired(self):
+        """Remove expired answers"""
+        self.env.cr.execute(f"DELETE FROM {self._table} WHERE expires_at <= now() at time zone 'UTC'")
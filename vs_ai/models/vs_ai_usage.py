@@ -0,0 +1,302 @@
+import logging
+from datetime import timedelta
+
+from odoo import api, fields, models
+
+_logger = logging.getLogger(__name__)
+
+# Calls are logged at most a few seconds after they end (see
+# tools.usage_log): rows older than this are final and can be rolled up
+ROLLUP_DELAY = timedelta(hours=1)
+ROLLUP_WATERMARK_PARAM = 'vs_ai.usage_rollup_until'
+PURGE_BATCH_SIZE = 50000
+
+OPERATIONS = [
+    ('chat', 'Chat'),
+    ('stream', 'Streamed Chat'),
+    ('completion', 'Completion'),
+    ('embedding', 'Embedding'),
+    ('job', 'Background Job'),
+    ('batch', 'Batch API'),
+]
+
+OUTCOMES = [
+    ('success', 'Success'),
+    ('throttled', 'Throttled'),
+    ('error', 'Error'),
+]
+
+
+class VSAIUsage(models.Model):
+    """
+    AI Usage Log
+
+    One row per provider call: tokens, time to first token, latency and
+    outcome. Rows are written in bulk by each worker's usage buffer, never
+    through the ORM. Old rows are rolled up into vs.ai.usage.monthly and
+    purged after 'vs_ai.usage_retention_days' days.
+    """
+    _name = "vs.ai.usage"
+    _description = "AI Usage"
+    _order = "date desc, id desc"
+    _log_access = False
+
+    date = fields.Datetime(
+        string="Date",
+        required=True,
+        index=True,
+        readonly=True,
+    )
+
+    model_id = fields.Many2one(
+        'vs.ai.model',
+        string="Model",
+        ondelete='set null',
+        readonly=True,
+    )
+
+    provider_id = fields.Many2one(
+        'vs.ai.provider',
+        string="Provider",
+        ondelete='set null',
+        readonly=True,
+    )
+
+    user_id = fields.Many2one(
+        'res.users',
+        string="User",
+        ondelete='set null',
+        readonly=True,
+    )
+
+    company_id = fields.Many2one(
+        'res.company',
+        string="Company",
+        readonly=True,
+    )
+
+    operation = fields.Selection(
+        selection=OPERATIONS,
+        string="Operation",
+        readonly=True,
+    )
+
+    prompt_tokens = fields.Integer(
+        string="Prompt Tokens",
+        readonly=True,
+    )
+
+    completion_tokens = fields.Integer(
+        string="Completion Tokens",
+        readonly=True,
+    )
+
+    cached_tokens = fields.Integer(
+        string="Cached Tokens",
+        readonly=True,
+        help="Prompt tokens read from the provider's prompt cache"
+    )
+
+    cost = fields.Float(
+        string="Cost",
+        digits=(16, 6),
+        readonly=True,
+    )
+
+    ttft = fields.Integer(
+        string="Time to First Token (ms)",
+        group_operator='avg',
+        readonly=True,
+    )
+
+    latency = fields.Integer(
+        string="Latency (ms)",
+        group_operator='avg',
+        readonly=True,
+    )
+
+    outcome = fields.Selection(
+        selection=OUTCOMES,
+        string="Outcome",
+        readonly=True,
+    )
+
+    error = fields.Char(
+        string="Error",
+        readonly=True,
+    )
+
+    @api.model
+    def _cron_rollup(self):
+        """Roll final usage rows up into the monthly table, then purge old rows"""
+        ICP = self.env['ir.config_parameter'].sudo()
+        since = ICP.get_param(ROLLUP_WATERMARK_PARAM)
+        until = fields.Datetime.now() - ROLLUP_DELAY
+        self.env['vs.ai.usage.monthly']._add_usage(since and fields.Datetime.to_datetime(since), until)
+        ICP.set_param(ROLLUP_WATERMARK_PARAM, fields.Datetime.to_string(until))
+        self.env.cr.commit()
+
+        retention_days = int(ICP.get_param('vs_ai.usage_retention_days', 90))
+        # Only purge rows that were rolled up
+        limit = min(fields.Datetime.now() - timedelta(days=retention_days), until)
+        while True:
+            self.env.cr.execute(f"""
+                DELETE FROM {self._table}
+                 WHERE id IN (SELECT id FROM {self._table} WHERE date < %s LIMIT %s)
+            """, [limit, PURGE_BATCH_SIZE])
+            deleted = self.env.cr.rowcount
+            self.env.cr.commit()
+            if deleted < PURGE_BATCH_SIZE:
+                break
+        self.invalidate_model()
+
+
+class VSAIUsageMonthly(models.Model):
+    """
+    AI Monthly Usage
+
+    Usage log rolled up per month, model, provider, user, company, operation
+    and outcome; the source of long-term usage and cost dashboards.
+    """
+    _name = "vs.ai.usage.monthly"
+    _description = "AI Monthly Usage"
+    _order = "month desc"
+    _log_access = False
+
+    month = fields.Date(
+        string="Month",
+        required=True,
+        index=True,
+        readonly=True,
+    )
+
+    model_id = fields.Many2one(
+        'vs.ai.model',
+        string="Model",
+        ondelete='set null',
+        readonly=True,
+    )
+
+    provider_id = fields.Many2one(
+        'vs.ai.provider',
+        string="Provider",
+        ondelete='set null',
+        readonly=True,
+    )
+
+    user_id = fields.Many2one(
+        'res.users',
+        string="User",
+        ondelete='set null',
+        readonly=True,
+    )
+
+    company_id = fields.Many2one(
+        'res.company',
+        string="Company",
+        readonly=True,
+    )
+
+    operation = fields.Selection(
+        selection=OPERATIONS,
+        string="Operation",
+        readonly=True,
+    )
+
+    outcome = fields.Selection(
+        selection=OUTCOMES,
+        string="Outcome",
+        readonly=True,
+    )
+
+    request_count = fields.Integer(
+        string="Requests",
+        readonly=True,
+    )
+
+    prompt_tokens = fields.Integer(
+        string="Prompt Tokens",
+        readonly=True,
+    )
+
+    completion_tokens = fields.Integer(
+        string="Completion Tokens",
+        readonly=True,
+    )
+
+    cached_tokens = fields.Integer(
+        string="Cached Tokens",
+        readonly=True,
+        help="Prompt tokens read from the provider's prompt cache"
+    )
+
+    cost = fields.Float(
+        string="Cost",
+        digits=(16, 6),
+        readonly=True,
+    )
+
+    latency_total = fields.Float(
+        string="Total Latency (ms)",
+        readonly=True,
+        help="Sum of the latencies, to compute averages over any grouping"
+    )
+
+    def init(self):
+        self.env.cr.execute(f"""
+            CREATE UNIQUE INDEX IF NOT EXISTS {self._table}_key_idx ON {self._table} (
+                month, COALESCE(model_id, 0), COALESCE(provider_id, 0), COALESCE(user_id, 0),
+                COALESCE(company_id, 0), COALESCE(operation, ''), COALESCE(outcome, '')
+            )
+        """)
+
+    @api.model
+    def _add_usage(self, since, until):
+        """Add the usage rows logged between two dates to the monthly totals"""
+        self.env['vs.ai.usage'].flush_model()
+        self.env.cr.execute(f"""
+            INSERT INTO {self._table} AS monthly (
+                month, model_id, provider_id, user_id, company_id, operation, outcome,
+                request_count, prompt_tokens, completion_tokens, cached_tokens, cost, latency_total)
+            SELECT date_trunc('month', date)::date, model_id, provider_id, user_id, company_id,
+                   operation, outcome, count(*), sum(prompt_tokens), sum(completion_tokens),
+                   COALESCE(sum(cached_tokens), 0), COALESCE(sum(cost), 0), COALESCE(sum(latency), 0)
+              FROM vs_ai_usage
+             WHERE date < %(until)s AND (%(since)s IS NULL OR date >= %(since)s)
+          GROUP BY 1, 2, 3, 4, 5, 6, 7
+            ON CONFLICT (month, COALESCE(model_id, 0), COALESCE(provider_id, 0), COALESCE(user_id, 0),
+                         COALESCE(company_id, 0), COALESCE(operation, ''), COALESCE(outcome, ''))
+            DO UPDATE SET request_count = monthly.request_count + EXCLUDED.request_count,
+                          prompt_tokens = monthly.prompt_tokens + EXCLUDED.prompt_tokens,
+                          completion_tokens = monthly.completion_tokens + EXCLUDED.completion_tokens,
+                          cached_tokens = COALESCE(monthly.cached_tokens, 0) + EXCLUDED.cached_tokens,
+                          cost = monthly.cost + EXCLUDED.cost,
+                          latency_total = monthly.latency_total + EXCLUDED.latency_total
+        """, {'since': since or None, 'until': until})
+        _logger.info("Rolled up AI usage into %d monthly rows", self.env.cr.rowcount)
+        self.invalidate_model()
+
+    @api.model
+    def get_usage_summary(self, groupby=('month:month', 'model_id'), domain=None):
+        """
+        Aggregate the monthly usage
+
+        Args:
+            groupby (tuple): read_group groupby specification
+            domain (list): Domain on vs.ai.usage.monthly
+
+        Returns:
+            list: read_group result with requests, tokens, cost and the
+            average latency of each group
+        """
+        groups = self.read_group(
+            domain or [],
+            ['request_count:sum', 'prompt_tokens:sum', 'completion_tokens:sum',
+             'cached_tokens:sum', 'cost:sum', 'latency_total:sum'],
+            list(groupby),
+            lazy=False,
+        )
+        for group in groups:
+            group['avg_latency'] = (group['latency_total'] / group['request_count']
+                                    if group['request_count'] else 0.0)
+        return groups
@@ -0,0 +1,68 @@
+import asyncio
+import logging
+import os
+import threading
+
+_logger = logging.getLogger(__name__)
+
+
+class EventLoopThread:
+    """
+    Dedicated asyncio event loop running in a daemon thread of the worker
+
+    Provider I/O submitted here runs concurrently on a single thread, so a
+    request can keep several LLM calls in flight at once (e.g. the hedged
+    calls of a routing group) and wait on them with timeouts, without a
+    thread per call. ``/vs_ai/chat`` ends its transaction before waiting on
+    the loop, so its calls hold no snapshot or lock: with the threaded
+    server, the request threads of a worker can have tens of calls in
+    flight. Odoo still serves one HTTP request at a time per prefork worker
+    process, which only the batch and stream routes work around. The loop
+    is started lazily and restarted after a fork, since threads do not
+    survive it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+        self._pid = None
+
+    @property
+    def loop(self):
+        with self._lock:
+            if self._loop is None or self._pid != os.getpid() or not self._thread.is_alive():
+                self._start()
+            return self._loop
+
+    def _start(self):
+        loop = asyncio.new_event_loop()
+        ready = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(loop)
+            loop.call_soon(ready.set)
+            loop.run_forever()
+
+        self._thread = threading.Thread(target=run, name='vs_ai.event_loop', daemon=True)
+        self._thread.start()
+        ready.wait()
+        self._loop = loop
+        self._pid = os.getpid()
+        _logger.debug("Started AI event loop thread in process %s", self._pid)
+
+    def submit(self, coroutine):
+        """
+        Schedule a coroutine on the loop
+
+        Returns:
+            concurrent.futures.Future: Resolved with the coroutine result; it
+            can be waited on from any thread, and cancelling it cancels the task
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def in_loop_thread(self):
+        return self._thread is not None and threading.current_thread() is self._thread
+
+
+event_loop = EventLoopThread()
@@ -0,0 +1,203 @@
+"""
+Adaptive (AIMD) concurrency limits of provider calls
+
+Each worker keeps, per provider, a limit on the number of calls in flight.
+The limit grows additively while calls succeed at a steady latency and is
+halved when the provider answers 429/503/529 or its latency rises well above
+its usual level; a ``Retry-After`` pauses every call to the provider. Like
+TCP flows sharing a link, the limits of independent workers converge to a
+fair share of what the provider accepts.
+"""
+import threading
+import time
+
+from .provider_api import ProviderError
+from .rate_limiter import RateLimitExceeded
+
+# HTTP statuses meaning the provider is overloaded (529: Anthropic overloaded)
+OVERLOAD_STATUSES = (429, 503, 529)
+
+DECREASE_FACTOR = 0.5
+# A call is "slow" when the recent latency exceeds the usual one by this factor
+LATENCY_TOLERANCE = 2.0
+# Smoothing factors of the recent and usual latency averages
+RECENT_LATENCY_ALPHA = 0.2
+USUAL_LATENCY_ALPHA = 0.02
+# Minimum seconds between two decreases, so that a burst of failures of calls
+# started together only counts once
+DECREASE_COOLDOWN = 1.0
+
+
+class Permit:
+    """One call slot of an AdaptiveLimit, released when the call ends"""
+
+    def __init__(self, limit, measure=True, observer=None):
+        self._limit = limit
+        self._measure = measure
+        self._observer = observer
+        self._start = time.monotonic()
+        self._released = False
+        if observer is not None:
+            observer.start()
+
+    def release(self, error=None):
+        if self._released:
+            return
+        self._released = True
+        elapsed = time.monotonic() - self._start
+        self._limit._release(elapsed if self._measure else None, error)
+        if self._observer is not None:
+            self._observer(latency=elapsed, error=error)
+
+    def cancel(self):
+        """Release the slot of a call that was cancelled, without judging it"""
+        if self._released:
+            return
+        self._released = True
+        self._limit._release(None, None)
+        if self._observer is not None:
+            self._observer.cancel()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.release(exc)
+
+
+class AdaptiveLimit:
+    """AIMD concurrency limit of one provider in this worker"""
+
+    def __init__(self, initial, maximum, minimum=1):
+        self.maximum = max(maximum, minimum)
+        self.minimum = minimum
+        self.limit = float(min(max(initial, minimum), self.maximum))
+        self.in_flight = 0
+        self.waiting = 0
+        self.blocked_until = 0.0
+        self.recent_latency = None
+        self.usual_latency = None
+        self.last_decrease = 0.0
+        self.throttled = 0
+        self._condition = threading.Condition()
+
+    def set_maximum(self, maximum):
+        with self._condition:
+            self.maximum = max(maximum, self.minimum)
+            self.limit = min(self.limit, self.maximum)
+            self._condition.notify_all()
+
+    def acquire(self, timeout, measure=True, observer=None):
+        """
+        Wait for a call slot
+
+        Args:
+            timeout (float): Seconds the caller accepts to queue; 0 fails fast
+            measure (bool): Whether the call duration is a latency sample
+                (not for streams, whose duration depends on the answer length)
+            observer (CallTracker): Told when the call starts, is cancelled,
+                and called with its duration and error when it ends
+
+        Returns:
+            Permit: To release (or use as context manager) when the call ends
+
+        Raises:
+            RateLimitExceeded: When no slot frees up within the timeout
+        """
+        deadline = time.monotonic() + max(timeout, 0.0)
+        with self._condition:
+            self.waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    if now >= self.blocked_until and self.in_flight < int(self.limit):
+                        self.in_flight += 1
+                        return Permit(self, measure, observer)
+                    if now >= deadline:
+                        retry_after = max(self.blocked_until - now, 0.0) or None
+                        raise RateLimitExceeded(
+                            f"Too many concurrent requests to the provider "
+                            f"({self.in_flight}/{int(self.limit)} in flight)",
+                            retry_after=retry_after)
+                    wake = deadline
+                    if self.blocked_until > now:
+                        wake = min(wake, self.blocked_until)
+                    self._condition.wait(wake - now)
+            finally:
+                self.waiting -= 1
+
+    def _release(self, latency, error):
+        with self._condition:
+            saturated = self.in_flight >= int(self.limit)
+            self.in_flight -= 1
+            now = time.monotonic()
+            if isinstance(error, ProviderError) and error.status_code in OVERLOAD_STATUSES:
+                self.throttled += 1
+                if error.retry_after:
+                    self.blocked_until = max(self.blocked_until, now + error.retry_after)
+                self._decrease(now)
+            elif error is None and latency is not None:
+                self._observe(latency)
+                if self.recent_latency > LATENCY_TOLERANCE * self.usual_latency:
+                    self._decrease(now)
+                elif saturated:
+                    # Only grow a limit that is actually reached
+                    self.limit = min(self.limit + 1.0 / self.limit, float(self.maximum))
+            self._condition.notify_all()
+
+    def _observe(self, latency):
+        if self.usual_latency is None:
+            self.recent_latency = self.usual_latency = latency
+            return
+        self.recent_latency += RECENT_LATENCY_ALPHA * (latency - self.recent_latency)
+        self.usual_latency += USUAL_LATENCY_ALPHA * (latency - self.usual_latency)
+
+    def _decrease(self, now):
+        if now - self.last_decrease < DECREASE_COOLDOWN:
+            return
+        self.last_decrease = now
+        self.limit = max(self.limit * DECREASE_FACTOR, float(self.minimum))
+
+    def stats(self):
+        with self._condition:
+            return {
+                'limit': int(self.limit),
+                'in_flight': self.in_flight,
+                'waiting': self.waiting,
+                'throttled': self.throttled,
+                'blocked_for': max(self.blocked_until - time.monotonic(), 0.0),
+            }
+
+
+class ConcurrencyRegistry:
+    """
+    Per-worker adaptive limits, by provider
+
+    A worker can serve several databases: providers are identified by
+    (database name, provider id).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._limits = {}
+
+    def get(self, provider, maximum):
+        with self._lock:
+            limit = self._limits.get(provider)
+            if limit is None:
+                # Start low and let the limit discover the provider's capacity
+                limit = self._limits[provider] = AdaptiveLimit(max(maximum // 4, 1), maximum)
+            elif limit.maximum != maximum:
+                limit.set_maximum(maximum)
+            return limit
+
+    def peek(self, provider):
+        with self._lock:
+            return self._limits.get(provider)
+
+    def discard(self, provider):
+        with self._lock:
+            self._limits.pop(provider, None)
+
+
+concurrency_registry = ConcurrencyRegistry()
@@ -0,0 +1,103 @@
+"""
+Buffered statistics counters
+
+Cache hits and misses are counted on shared rows (the model counters, the
+hit count of a cache entry). Incrementing them in the request transaction
+would lock these hot rows until the end of the request, LLM round-trip
+included, and serialize every request using them. The counters are instead
+summed in memory, per worker, and added to their rows by a background thread
+every ``max_age`` seconds, in short transactions of their own.
+"""
+import atexit
+import logging
+import os
+import threading
+from collections import Counter, defaultdict
+
+from psycopg2.extras import execute_values
+
+_logger = logging.getLogger(__name__)
+
+
+class CounterBuffer:
+    """Per-worker buffer of counter increments, by database and table"""
+
+    def __init__(self, max_age=10.0):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._pending = defaultdict(Counter)
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+        self.dropped = 0
+
+    def add(self, dbname, table, key, counters, key_column='id', touch=None):
+        """
+        Buffer counter increments of a row
+
+        Args:
+            dbname (str): Database of the row
+            table (str): Table of the row
+            key: Value of ``key_column`` identifying the row
+            counters (dict): Increment of each counter column
+            key_column (str): Column identifying the row
+            touch (str): Datetime column set to the flush time, e.g. a last
+                use date
+        """
+        counters = {name: amount for name, amount in counters.items() if amount}
+        if not counters:
+            return
+        group = (dbname, table, key_column, tuple(sorted(counters)), touch)
+        with self._lock:
+            pending = self._pending[group]
+            for name, amount in counters.items():
+                pending[(key, name)] += amount
+            self._ensure_thread()
+
+    def _ensure_thread(self):
+        # Threads do not survive the fork of prefork workers
+        if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='vs_ai.counters', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.max_age)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """Add every buffered increment to its row"""
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(Counter)
+        for group, increments in pending.items():
+            try:
+                self._update(group, increments)
+            except Exception:
+                # Statistics must never break requests: the increments are lost
+                self.dropped += len(increments)
+                _logger.warning("Could not write %d AI counter increments", len(increments), exc_info=True)
+
+    @staticmethod
+    def _update(group, increments):
+        from odoo.modules.registry import Registry
+        dbname, table, key_column, names, touch = group
+        rows = defaultdict(dict)
+        for (key, name), amount in increments.items():
+            rows[key][name] = amount
+        # A fixed order keeps concurrent flushes from deadlocking
+        values = [(key,) + tuple(row.get(name, 0) for name in names) for key, row in sorted(rows.items())]
+        assignments = [f"{name} = COALESCE(t.{name}, 0) + data.{name}" for name in names]
+        if touch:
+            assignments.append(f"{touch} = now() at time zone 'UTC'")
+        with Registry(dbname).cursor() as cr:
+            execute_values(cr._obj, f"""
+                UPDATE {table} t SET {", ".join(assignments)}
+                  FROM (VALUES %s) AS data(key, {", ".join(names)})
+                 WHERE t.{key_column} = data.key
+            """, values, page_size=1000)
+
+
+counter_buffer = CounterBuffer()
+atexit.register(counter_buffer.flush)
@@ -0,0 +1,92 @@
+import threading
+
+
+class _Batch:
+    __slots__ = ('texts', 'full', 'done', 'closed', 'result', 'error')
+
+    def __init__(self):
+        self.texts = []
+        self.full = threading.Event()
+        self.done = threading.Event()
+        self.closed = False
+        self.result = None
+        self.error = None
+
+
+class EmbeddingBatcher:
+    """
+    Merge concurrent embedding requests for the same model
+
+    The first caller of a batch becomes its leader: it waits for the batch
+    window (or until the batch is full), sends a single upstream request for
+    every text collected meanwhile, and hands each caller its slice of the
+    result. Callers in other threads of the same worker simply wait for the
+    leader. ``fetch`` callables must not use the ORM, since they run in the
+    leader's thread. Only the threads of one process are merged: a prefork
+    worker serves one request at a time, and has nothing to merge with.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+
+    def embed(self, key, texts, fetch, max_batch_size, max_wait):
+        """
+        Embed texts, possibly together with texts of concurrent callers
+
+        Args:
+            key (tuple): Hashable identity of the upstream model and parameters
+            texts (list): Texts to embed
+            fetch (callable): Sends one upstream request for a list of texts
+                and returns the vectors in input order
+            max_batch_size (int): Maximum number of texts per upstream request
+            max_wait (float): Batch window in seconds
+
+        Returns:
+            list: One vector per input text
+        """
+        texts = list(texts)
+        if max_wait <= 0 or len(texts) >= max_batch_size:
+            return self._fetch_chunked(texts, fetch, max_batch_size)
+
+        with self._lock:
+            batch = self._pending.get(key)
+            leader = batch is None or batch.closed or len(batch.texts) + len(texts) > max_batch_size
+            if leader:
+                if batch is not None:
+                    # Nobody can join the superseded batch: send it right away
+                    batch.full.set()
+                batch = self._pending[key] = _Batch()
+            start = len(batch.texts)
+            batch.texts.extend(texts)
+            if len(batch.texts) >= max_batch_size:
+                batch.full.set()
+
+        if leader:
+            batch.full.wait(max_wait)
+            with self._lock:
+                batch.closed = True
+                if self._pending.get(key) is batch:
+                    del self._pending[key]
+            try:
+                batch.result = fetch(batch.texts)
+            except Exception as e:
+                batch.error = e
+            finally:
+                batch.done.set()
+        else:
+            batch.done.wait()
+
+        if batch.error is not None:
+            raise batch.error
+        return batch.result[start:start + len(texts)]
+
+    @staticmethod
+    def _fetch_chunked(texts, fetch, max_batch_size):
+        vectors = []
+        for index in range(0, len(texts), max(max_batch_size, 1)):
+            vectors.extend(fetch(texts[index:index + max_batch_size]))
+        return vectors
+
+
+embedding_batcher = EmbeddingBatcher()
@@ -0,0 +1,174 @@
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+
+import httpx
+
+from .async_loop import event_loop
+
+try:
+    import h2  # noqa: F401
+except ImportError:
+    h2 = None
+
+_logger = logging.getLogger(__name__)
+
+
+class ClientRegistry:
+    """
+    Per-worker registry of long-lived HTTP clients
+
+    Creating an SDK or HTTP client per call means a fresh TCP connection and TLS
+    handshake for every provider request. The registry keeps one pooled,
+    keep-alive client per (provider, endpoint, API key hash) so that all
+    requests of an Odoo worker process share warm connections. A worker can
+    serve several databases: providers are identified by (database name,
+    provider id). HTTP/2 is enabled when the optional ``h2`` package is
+    installed.
+
+    Clients of an outdated connection are retired rather than closed: other
+    threads or coroutines may still be using them, so they are only closed
+    ``retire_delay`` seconds later.
+    """
+
+    def __init__(self, max_connections=20, max_keepalive_connections=10,
+                 keepalive_expiry=60.0, timeout=60.0, connect_timeout=10.0, retire_delay=600.0):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self._clients = {}
+        self._async_clients = {}
+        # (close deadline, client) of the clients of outdated connections
+        self._retired = []
+        self.retire_delay = retire_delay
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(provider, base_url, api_key):
+        """Build the registry key, never keeping the raw API key in memory twice"""
+        key_hash = hashlib.sha256((api_key or '').encode()).hexdigest()[:16]
+        return (provider, base_url or '', key_hash)
+
+    def get(self, provider, base_url, api_key, headers=None):
+        """
+        Return the pooled client for the given provider connection
+
+        Args:
+            provider (tuple): Database name and ID of the vs.ai.provider record
+            base_url (str): Base URL of the provider API
+            api_key (str): API key used to authenticate, only hashed in the key
+            headers (dict): Default headers (authentication, versioning, ...)
+
+        Returns:
+            httpx.Client: A thread-safe client with a bounded connection pool
+        """
+        key = self.make_key(provider, base_url, api_key)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None and not client.is_closed:
+                self.hits += 1
+                return client
+            self.misses += 1
+            # Credentials or endpoint changed in another worker: retire stale clients
+            self._retire_provider(provider, keep=key)
+            client = httpx.Client(
+                base_url=base_url,
+                headers=headers or {},
+                limits=self.limits,
+                timeout=self.timeout,
+                http2=bool(h2),
+            )
+            self._clients[key] = client
+            return client
+
+    def get_async(self, provider, base_url, api_key, headers=None):
+        """
+        Return the pooled asynchronous client for the given provider connection
+
+        Async clients are bound to the worker's AI event loop and must only be
+        used from coroutines running on it (see ``async_loop.event_loop``).
+
+        Returns:
+            httpx.AsyncClient: A client with a bounded connection pool
+        """
+        key = self.make_key(provider, base_url, api_key)
+        with self._lock:
+            client = self._async_clients.get(key)
+            if client is not None and not client.is_closed:
+                self.hits += 1
+                return client
+            self.misses += 1
+            self._retire_provider(provider, keep=key)
+            client = httpx.AsyncClient(
+                base_url=base_url,
+                headers=headers or {},
+                limits=self.limits,
+                timeout=self.timeout,
+                http2=bool(h2),
+            )
+            self._async_clients[key] = client
+            return client
+
+    def invalidate(self, provider):
+        """Forget every client of the given (database name, provider id)"""
+        with self._lock:
+            if self._retire_provider(provider):
+                self.invalidations += 1
+
+    def _retire_provider(self, provider, keep=None):
+        """Forget the clients of a provider, and close them after the retire delay"""
+        self._close_retired()
+        deadline = time.monotonic() + self.retire_delay
+        stale = [key for key in self._clients if key[0] == provider and key != keep]
+        stale_async = [key for key in self._async_clients if key[0] == provider and key != keep]
+        self._retired.extend((deadline, self._clients.pop(key)) for key in stale)
+        self._retired.extend((deadline, self._async_clients.pop(key)) for key in stale_async)
+        return bool(stale or stale_async)
+
+    def _close_retired(self, force=False):
+        """Close the retired clients whose requests had time to end"""
+        now = time.monotonic()
+        expired = [client for deadline, client in self._retired if force or deadline <= now]
+        self._retired = [(deadline, client) for deadline, client in self._retired
+                         if not (force or deadline <= now)]
+        for client in expired:
+            if isinstance(client, httpx.AsyncClient):
+                # Async clients can only be closed from their event loop
+                asyncio.run_coroutine_threadsafe(client.aclose(), event_loop.loop)
+                continue
+            try:
+                client.close()
+            except Exception:
+                _logger.debug("Error while closing HTTP client", exc_info=True)
+
+    def clear(self):
+        """Close every pooled client"""
+        with self._lock:
+            for provider in {key[0] for key in list(self._clients) + list(self._async_clients)}:
+                self._retire_provider(provider)
+            self._close_retired(force=True)
+
+    def stats(self):
+        """Return hit/miss counters of the registry"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'clients': len(self._clients) + len(self._async_clients),
+                'retired': len(self._retired),
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'hit_rate': (self.hits / total) if total else 0.0,
+                'http2': bool(h2),
+            }
+
+
+client_registry = ClientRegistry()
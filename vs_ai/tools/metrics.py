@@ -0,0 +1,258 @@
+"""
+Prometheus metrics shared by all the workers of the server
+
+Each process writes its samples to its own memory-mapped file (one float per
+sample, updated in place, so recording costs no system call). The metrics
+route reads the files of every process and sums them. Files of processes
+that exited are folded into an archive file, so counters survive worker
+recycling; gauges of dead processes are dropped.
+"""
+import fcntl
+import glob
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+from collections import defaultdict
+
+_logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+# name: (type, help)
+METRICS = {
+    'vs_ai_requests_total': ('counter', "Provider calls, by outcome"),
+    'vs_ai_request_duration_seconds': ('histogram', "Duration of provider calls"),
+    'vs_ai_time_to_first_token_seconds': ('histogram', "Time to the first token of streamed calls"),
+    'vs_ai_tokens_total': ('counter', "Tokens sent to and generated by providers, and prompt tokens read "
+                                      "from their cache"),
+    'vs_ai_in_flight': ('gauge', "Provider calls in flight"),
+    'vs_ai_cache_requests_total': ('counter', "Cache lookups, by cache and result"),
+    'vs_ai_rate_limit_waits_total': ('counter', "Calls that queued for a rate limit"),
+    'vs_ai_rate_limit_wait_seconds_total': ('counter', "Time spent queuing for rate limits"),
+    'vs_ai_rate_limit_rejections_total': ('counter', "Calls rejected by a rate limit"),
+}
+
+INITIAL_FILE_SIZE = 1 << 16
+ARCHIVE_NAME = 'archive.db'
+
+
+def _padded(encoded):
+    # Keep the values 8-byte aligned
+    return encoded + b' ' * ((8 - (len(encoded) + 4) % 8) % 8)
+
+
+def _read_values(data):
+    """Yield (key, value, value offset) of a metrics file content"""
+    used = struct.unpack_from('i', data, 0)[0] or 8
+    position = 8
+    while position < used:
+        length = struct.unpack_from('i', data, position)[0]
+        key = data[position + 4:position + 4 + length].decode()
+        position += 4 + len(_padded(b' ' * length))
+        value = struct.unpack_from('d', data, position)[0]
+        yield key, value, position
+        position += 8
+
+
+class _ValueFile:
+    """Memory-mapped file of named float values, written by a single process"""
+
+    def __init__(self, path):
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        size = os.fstat(self._fd).st_size
+        if size < INITIAL_FILE_SIZE:
+            os.ftruncate(self._fd, INITIAL_FILE_SIZE)
+            size = INITIAL_FILE_SIZE
+        self._size = size
+        self._map = mmap.mmap(self._fd, size)
+        self._used = struct.unpack_from('i', self._map, 0)[0] or 8
+        self._positions = {key: position for key, _value, position in _read_values(self._map)}
+
+    def _position(self, key):
+        position = self._positions.get(key)
+        if position is None:
+            encoded = key.encode()
+            entry = struct.pack('i', len(encoded)) + _padded(encoded) + struct.pack('d', 0.0)
+            while self._used + len(entry) > self._size:
+                self._size *= 2
+                os.ftruncate(self._fd, self._size)
+                self._map.close()
+                self._map = mmap.mmap(self._fd, self._size)
+            self._map[self._used:self._used + len(entry)] = entry
+            self._used += len(entry)
+            struct.pack_into('i', self._map, 0, self._used)
+            position = self._positions[key] = self._used - 8
+        return position
+
+    def add(self, key, amount):
+        position = self._position(key)
+        value = struct.unpack_from('d', self._map, position)[0]
+        struct.pack_into('d', self._map, position, value + amount)
+
+    def items(self):
+        return [(key, value) for key, value, _position in _read_values(self._map)]
+
+    def close(self):
+        self._map.close()
+        os.close(self._fd)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _key(name, sample, labels):
+    return json.dumps([name, sample, labels], sort_keys=True)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class MetricsStore:
+    """Per-process writer and cross-process reader of the metrics files"""
+
+    def __init__(self, directory=None):
+        self._directory = directory
+        self._lock = threading.Lock()
+        self._file = None
+        self._pid = None
+
+    @property
+    def directory(self):
+        if self._directory is None:
+            directory = os.environ.get('VS_AI_METRICS_DIR')
+            if not directory:
+                try:
+                    from odoo.tools import config
+                    directory = os.path.join(config['data_dir'], 'vs_ai_metrics')
+                except Exception:
+                    directory = os.path.join(tempfile.gettempdir(), 'vs_ai_metrics')
+            os.makedirs(directory, exist_ok=True)
+            self._directory = directory
+        return self._directory
+
+    def _values(self):
+        # A forked worker must not write into its parent's file
+        if self._file is None or self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._file = _ValueFile(os.path.join(self.directory, f'{self._pid}.db'))
+        return self._file
+
+    def _add(self, name, sample, labels, amount):
+        try:
+            with self._lock:
+                self._values().add(_key(name, sample, labels), amount)
+        except OSError:
+            # Metrics must never break calls
+            _logger.debug("Could not record metric %s", name, exc_info=True)
+
+    def inc(self, name, amount=1.0, **labels):
+        """Increment a counter, or move a gauge by ``amount``"""
+        self._add(name, name, labels, amount)
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        """Record an observation in a histogram"""
+        bucket = next((bound for bound in buckets if value <= bound), '+Inf')
+        self._add(name, f'{name}_bucket', dict(labels, le=str(bucket)), 1.0)
+        self._add(name, f'{name}_sum', labels, value)
+        self._add(name, f'{name}_count', labels, 1.0)
+
+    def _archive_dead_files(self):
+        """Fold the counters of exited processes into the archive file"""
+        lock_path = os.path.join(self.directory, 'archive.lock')
+        with open(lock_path, 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            archive = None
+            try:
+                for path in glob.glob(os.path.join(self.directory, '*.db')):
+                    name = os.path.basename(path)
+                    if name == ARCHIVE_NAME or _pid_alive(int(name[:-3])):
+                        continue
+                    archive = archive or _ValueFile(os.path.join(self.directory, ARCHIVE_NAME))
+                    dead = _ValueFile(path)
+                    for key, value in dead.items():
+                        if METRICS.get(json.loads(key)[0], ('gauge',))[0] != 'gauge':
+                            archive.add(key, value)
+                    dead.close()
+                    os.unlink(path)
+            finally:
+                if archive:
+                    archive.close()
+
+    def collect(self):
+        """
+        Sum the samples of every process
+
+        Returns:
+            dict: By metric name, a dict of (sample name, labels json) to value
+        """
+        try:
+            self._archive_dead_files()
+        except (OSError, ValueError):
+            _logger.warning("Could not archive the metrics of exited workers", exc_info=True)
+        samples = defaultdict(lambda: defaultdict(float))
+        for path in glob.glob(os.path.join(self.directory, '*.db')):
+            try:
+                with open(path, 'rb') as file:
+                    data = file.read()
+            except OSError:
+                continue
+            if len(data) < 8:
+                continue
+            for key, value, _position in _read_values(data):
+                name, sample, labels = json.loads(key)
+                samples[name][(sample, json.dumps(labels, sort_keys=True))] += value
+        return samples
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format"""
+        lines = []
+        collected = self.collect()
+        for name in sorted(collected):
+            kind, help_text = METRICS.get(name, ('untyped', ''))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            samples = collected[name]
+            if kind == 'histogram':
+                lines.extend(self._render_histogram(name, samples))
+                continue
+            for (sample, labels), value in sorted(samples.items()):
+                lines.append(f"{sample}{self._format_labels(json.loads(labels))} {value!r}")
+        return "\n".join(lines) + "\n"
+
+    def _render_histogram(self, name, samples):
+        series = defaultdict(dict)
+        for (sample, labels), value in samples.items():
+            labels = json.loads(labels)
+            bound = labels.pop('le', None)
+            series[json.dumps(labels, sort_keys=True)][(sample, bound)] = value
+        for labels, values in sorted(series.items()):
+            labels = json.loads(labels)
+            cumulative = 0.0
+            for bound in [str(bound) for bound in LATENCY_BUCKETS] + ['+Inf']:
+                cumulative += values.get((f'{name}_bucket', bound), 0.0)
+                yield f"{name}_bucket{self._format_labels(dict(labels, le=bound))} {cumulative!r}"
+            yield f"{name}_sum{self._format_labels(labels)} {values.get((f'{name}_sum', None), 0.0)!r}"
+            yield f"{name}_count{self._format_labels(labels)} {values.get((f'{name}_count', None), 0.0)!r}"
+
+    @staticmethod
+    def _format_labels(labels):
+        if not labels:
+            return ""
+        return "{" + ",".join(
+            f'{key}="{_escape(value)}"' for key, value in sorted(labels.items())
+        ) + "}"
+
+
+metrics = MetricsStore()
@@ -0,0 +1,153 @@
+"""
+Rolling per-model call statistics of the worker
+
+Latency, error rate and cost of the calls made to each model are tracked in
+memory, so routing decisions cost no query. The activity accumulated since the
+last flush is periodically merged into the statistics stored on the models
+(see ``vs.ai.model._flush_model_stats``), which is what other workers and
+freshly started ones rely on. A worker can serve several databases: models
+are identified by database name and record id.
+"""
+import threading
+import time
+from collections import deque
+
+# Number of recent successful calls kept per model
+LATENCY_WINDOW = 200
+# Smoothing factor of the error rate and cost averages
+STATS_ALPHA = 0.05
+
+
+class _ModelEntry:
+    __slots__ = ('latencies', 'error_rate', 'cost', 'calls', 'errors', 'latency_sum',
+                 'latency_count', 'cost_sum', 'cost_count')
+
+    def __init__(self, window):
+        self.latencies = deque(maxlen=window)
+        self.error_rate = 0.0
+        self.cost = None
+        self._reset_pending()
+
+    def _reset_pending(self):
+        self.calls = self.errors = self.latency_count = self.cost_count = 0
+        self.latency_sum = self.cost_sum = 0.0
+
+
+class ModelStats:
+    """Recent latencies, error rates and costs of the calls made to each model"""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._started_at = time.monotonic()
+        self._last_flush = {}
+
+    def _entry(self, dbname, model_id):
+        entry = self._entries.get((dbname, model_id))
+        if entry is None:
+            entry = self._entries[(dbname, model_id)] = _ModelEntry(self.window)
+        return entry
+
+    def record(self, dbname, model_id, latency=None, error=None):
+        """
+        Record the outcome of a call
+
+        Args:
+            dbname (str): Database of the model
+            model_id (int): ID of the vs.ai.model record
+            latency (float): Duration of the call in seconds, if measured
+            error (Exception): The error of a failed call
+        """
+        if not model_id:
+            return
+        with self._lock:
+            entry = self._entry(dbname, model_id)
+            entry.calls += 1
+            failed = error is not None
+            entry.error_rate += STATS_ALPHA * (float(failed) - entry.error_rate)
+            if failed:
+                entry.errors += 1
+            elif latency is not None:
+                entry.latencies.append(latency)
+                entry.latency_sum += latency
+                entry.latency_count += 1
+
+    def record_cost(self, dbname, model_id, cost):
+        """Record the cost of a successful call"""
+        if not model_id:
+            return
+        with self._lock:
+            entry = self._entry(dbname, model_id)
+            entry.cost = cost if entry.cost is None else entry.cost + STATS_ALPHA * (cost - entry.cost)
+            entry.cost_sum += cost
+            entry.cost_count += 1
+
+    def percentile(self, dbname, model_id, percent, min_samples=20):
+        """
+        Return a latency percentile of the model
+
+        Returns:
+            float: The latency in seconds, or None without enough samples
+        """
+        with self._lock:
+            entry = self._entries.get((dbname, model_id))
+            latencies = sorted(entry.latencies) if entry else []
+        if len(latencies) < min_samples:
+            return None
+        index = min(int(len(latencies) * percent / 100.0), len(latencies) - 1)
+        return latencies[index]
+
+    def get(self, dbname, model_id, min_samples=20):
+        """
+        Return the current statistics of the model
+
+        Returns:
+            dict: 'latency' (mean, seconds), 'p95_latency', 'error_rate'
+            (0-1) and 'cost' (average per call), or None without enough samples
+        """
+        with self._lock:
+            entry = self._entries.get((dbname, model_id))
+            if entry is None or len(entry.latencies) < min_samples:
+                return None
+            latencies = sorted(entry.latencies)
+            error_rate, cost = entry.error_rate, entry.cost
+        return {
+            'latency': sum(latencies) / len(latencies),
+            'p95_latency': latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)],
+            'error_rate': error_rate,
+            'cost': cost,
+        }
+
+    def flush_due(self, dbname, interval):
+        return time.monotonic() - self._last_flush.get(dbname, self._started_at) >= interval
+
+    def take_pending(self, dbname):
+        """
+        Return and reset the activity of a database's models recorded since
+        the previous call
+
+        Returns:
+            dict: By model id, a dict with 'calls', 'errors', the mean
+            'latency' and 'p95_latency' and the mean 'cost' (None if unknown)
+        """
+        pending = {}
+        with self._lock:
+            self._last_flush[dbname] = time.monotonic()
+            for (entry_dbname, model_id), entry in self._entries.items():
+                if entry_dbname != dbname or (not entry.calls and not entry.cost_count):
+                    continue
+                latencies = sorted(entry.latencies)
+                pending[model_id] = {
+                    'calls': entry.calls,
+                    'errors': entry.errors,
+                    'latency': entry.latency_sum / entry.latency_count if entry.latency_count else None,
+                    'p95_latency': latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)]
+                    if entry.latency_count else None,
+                    'cost': entry.cost_sum / entry.cost_count if entry.cost_count else None,
+                }
+                entry._reset_pending()
+        return pending
+
+
+model_stats = ModelStats()
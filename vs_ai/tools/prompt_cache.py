@@ -0,0 +1,75 @@
+"""
+Detection of the stable prompt prefixes worth caching by providers
+
+Anthropic caches the prompt up to explicit ``cache_control`` breakpoints,
+and charges extra for cache writes; OpenAI caches long prompts by itself and
+routes requests sharing a ``prompt_cache_key`` to the same cache. Both only
+pay off for prefixes that are sent again within minutes.
+
+Each request records the digests of its message prefixes. A prefix already
+sent to the same model within the cache lifetime is considered stable: the
+longest such prefix is where the request places its cache breakpoint.
+"""
+import hashlib
+import json
+import threading
+import time
+
+from odoo.tools.lru import LRU
+
+# Seconds providers keep cached prefixes (Anthropic: 5 minutes, refreshed on use)
+PREFIX_TTL = 300
+
+
+class PrefixTracker:
+    """Per-worker record of the message prefixes recently sent to each model"""
+
+    def __init__(self, size=8192, ttl=PREFIX_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._seen = LRU(size)
+
+    @staticmethod
+    def _digests(scope, messages):
+        """Return the cumulative digest of each prefix of the messages"""
+        digest = hashlib.blake2b(repr(scope).encode(), digest_size=16)
+        digests = []
+        for message in messages:
+            digest = digest.copy()
+            digest.update(json.dumps(message, sort_keys=True, default=str).encode())
+            digests.append(digest.hexdigest())
+        return digests
+
+    def observe(self, scope, messages):
+        """
+        Record the prefixes of a request and return its stable part
+
+        Args:
+            scope (tuple): Identifies the cache, e.g. the database, provider
+                and model: the tracker is shared by every database of the worker
+            messages (list): Chat messages of the request
+
+        Returns:
+            tuple: The number of leading messages already sent within the
+            cache lifetime (0 if none), and the digest identifying the
+            cacheable prefix: the stable prefix, or else the leading system
+            messages (None if there is neither)
+        """
+        digests = self._digests(scope, messages)
+        now = time.monotonic()
+        stable = 0
+        with self._lock:
+            for index, digest in enumerate(digests):
+                seen = self._seen.get(digest)
+                if seen is not None and now - seen <= self.ttl:
+                    stable = index + 1
+                self._seen[digest] = now
+        if stable:
+            return stable, digests[stable - 1]
+        system = 0
+        while system < len(messages) and messages[system].get('role') == 'system':
+            system += 1
+        return 0, digests[system - 1] if system else None
+
+
+prefix_tracker = PrefixTracker()
@@ -0,0 +1,686 @@
+"""
+Provider API helpers
+
+Plain functions that talk to the provider HTTP APIs. They never touch the ORM:
+everything they need is captured in a :class:`ProviderContext` snapshot taken
+from a ``vs.ai.provider`` record, so they can safely run outside of the request
+transaction (streaming responses, worker threads, ...).
+"""
+import json
+import logging
+import tempfile
+import uuid
+from collections import namedtuple
+
+import httpx
+
+from odoo.exceptions import UserError
+
+from .http_client import client_registry
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_ENDPOINTS = {
+    'openai': 'https://api.openai.com/v1',
+    'anthropic': 'https://api.anthropic.com/v1',
+    'mistral': 'https://api.mistral.ai/v1',
+    'deepseek': 'https://api.deepseek.com/v1',
+    'openrouter': 'https://openrouter.ai/api/v1',
+    'ollama': 'http://localhost:11434/v1',
+}
+
+ANTHROPIC_VERSION = '2023-06-01'
+ANTHROPIC_DEFAULT_MAX_TOKENS = 1024
+AZURE_API_VERSION = '2024-06-01'
+CACHE_CONTROL = {'type': 'ephemeral'}
+
+# Batch API: providers supporting it, seconds allowed to upload or download a
+# batch file, and size above which batch files are spooled to disk
+BATCH_PROVIDERS = ('openai', 'anthropic')
+BATCH_TIMEOUT = 300
+BATCH_SPOOL_SIZE = 16 * 1024 * 1024
+BATCH_CHUNK_SIZE = 1024 * 1024
+# Batch statuses of the OpenAI API that are final
+OPENAI_BATCH_ENDED = ('completed', 'expired', 'cancelled')
+
+# Models listed per page of the Anthropic catalog (the API maximum)
+MODEL_PAGE_SIZE = 1000
+# Substrings of the ids of models that are not served by the chat, completion
+# or embedding APIs
+UNSUPPORTED_MODEL_HINTS = ('whisper', 'tts', 'transcribe', 'moderation', 'realtime', 'audio')
+IMAGE_MODEL_HINTS = ('dall-e', 'gpt-image', 'stable-diffusion', 'flux')
+OPENAI_COMPLETION_MODELS = ('babbage-002', 'davinci-002', 'gpt-3.5-turbo-instruct')
+
+
+class ProviderError(UserError):
+    """Error returned by a provider API, keeping the HTTP details around"""
+
+    def __init__(self, message, status_code=None, retry_after=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+    @property
+    def is_connection_error(self):
+        return self.status_code is None
+
+
+class ProviderContext(namedtuple('ProviderContext', [
+        'dbname', 'provider_id', 'provider_type', 'base_url', 'api_key'])):
+    """Immutable, ORM-free snapshot of a vs.ai.provider connection"""
+    __slots__ = ()
+
+    @property
+    def family(self):
+        """API family of the provider: 'anthropic' or 'openai' (compatible)"""
+        return 'anthropic' if self.provider_type == 'anthropic' else 'openai'
+
+    @property
+    def headers(self):
+        headers = {'Content-Type': 'application/json'}
+        if self.provider_type == 'anthropic':
+            headers['anthropic-version'] = ANTHROPIC_VERSION
+            if self.api_key:
+                headers['x-api-key'] = self.api_key
+        elif self.provider_type == 'azure':
+            if self.api_key:
+                headers['api-key'] = self.api_key
+        elif self.api_key:
+            headers['Authorization'] = f"Bearer {self.api_key}"
+        return headers
+
+    @property
+    def params(self):
+        if self.provider_type == 'azure':
+            return {'api-version': AZURE_API_VERSION}
+        return None
+
+    def client(self):
+        """Return the pooled HTTP client for this connection"""
+        return client_registry.get((self.dbname, self.provider_id), self.base_url, self.api_key, self.headers)
+
+    def async_client(self):
+        """Return the pooled async HTTP client, from a coroutine on the AI event loop"""
+        return client_registry.get_async(
+            (self.dbname, self.provider_id), self.base_url, self.api_key, self.headers)
+
+
+def _retry_after(response):
+    value = response.headers.get('retry-after')
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def _check_response(response):
+    """Raise a ProviderError for non-successful responses"""
+    if response.is_success:
+        return
+    try:
+        detail = response.json()
+        if isinstance(detail, dict) and isinstance(detail.get('error'), dict):
+            detail = detail['error'].get('message') or detail['error']
+    except ValueError:
+        detail = response.text[:500]
+    raise ProviderError(
+        f"Provider API error {response.status_code}: {detail}",
+        status_code=response.status_code,
+        retry_after=_retry_after(response),
+    )
+
+
+def request(ctx, method, path, payload=None, **kwargs):
+    """
+    Send a request to the provider API and return the decoded JSON body
+
+    Args:
+        ctx (ProviderContext): Provider connection snapshot
+        method (str): HTTP method
+        path (str): Path relative to the provider base URL
+        payload (dict): JSON body of the request
+        **kwargs: Extra arguments for httpx (timeout, params, ...)
+
+    Returns:
+        dict: The JSON response
+    """
+    kwargs.setdefault('params', ctx.params)
+    try:
+        response = ctx.client().request(method, path, json=payload, **kwargs)
+    except httpx.TransportError as e:
+        raise ProviderError(f"Connection to provider failed: {e}") from e
+    _check_response(response)
+    return response.json()
+
+
+async def arequest(ctx, method, path, payload=None, **kwargs):
+    """Asynchronous version of :func:`request`, to run on the AI event loop"""
+    kwargs.setdefault('params', ctx.params)
+    try:
+        response = await ctx.async_client().request(method, path, json=payload, **kwargs)
+    except httpx.TransportError as e:
+        raise ProviderError(f"Connection to provider failed: {e}") from e
+    _check_response(response)
+    return response.json()
+
+
+# Chat completions
+def _tool_name(tool):
+    if not isinstance(tool, dict):
+        return ''
+    return (tool.get('function') or {}).get('name') or tool.get('name') or ''
+
+
+def _split_system(messages):
+    system = [m['content'] for m in messages if m.get('role') == 'system']
+    others = [m for m in messages if m.get('role') != 'system']
+    return "\n\n".join(c for c in system if isinstance(c, str)), others
+
+
+def _with_cache_control(message):
+    """Return a copy of the message whose last content block is a cache breakpoint"""
+    content = message.get('content')
+    if isinstance(content, str) and content:
+        content = [{'type': 'text', 'text': content}]
+    elif isinstance(content, list) and content:
+        content = list(content)
+    else:
+        return message
+    content[-1] = dict(content[-1], cache_control=CACHE_CONTROL)
+    return dict(message, content=content)
+
+
+def build_chat_payload(ctx, model_name, messages, stream=False, cache_prefix=0, cache_key=None,
+                       **params):
+    """
+    Build the chat request body for the provider API family
+
+    Args:
+        cache_prefix (int): Number of leading messages to mark as a cached
+            prefix (Anthropic)
+        cache_key (str): Identifier of the shared prompt prefix (OpenAI)
+    """
+    if ctx.family == 'anthropic':
+        system, others = _split_system(messages)
+        if cache_prefix:
+            # Breakpoints on the system prompt and the last stable message
+            cached = sum(1 for message in messages[:cache_prefix] if message.get('role') != 'system')
+            if cached:
+                others = others[:cached - 1] + [_with_cache_control(others[cached - 1])] + others[cached:]
+            if system and cached < cache_prefix:
+                system = [{'type': 'text', 'text': system, 'cache_control': CACHE_CONTROL}]
+        payload = {
+            'model': model_name,
+            'messages': others,
+            'max_tokens': params.pop('max_tokens', None) or ANTHROPIC_DEFAULT_MAX_TOKENS,
+        }
+        if system:
+            payload['system'] = system
+        if 'stop' in params:
+            stop = params.pop('stop')
+            payload['stop_sequences'] = [stop] if isinstance(stop, str) else stop
+    else:
+        payload = {'model': model_name, 'messages': messages}
+        if cache_key and ctx.provider_type == 'openai':
+            payload['prompt_cache_key'] = cache_key
+    if isinstance(params.get('tools'), list):
+        # Tools are part of the prompt prefix: the same tools given in another
+        # order would not hit the cache
+        params['tools'] = sorted(params['tools'], key=_tool_name)
+    payload.update(params)
+    if stream:
+        payload['stream'] = True
+        if ctx.provider_type == 'openai':
+            payload['stream_options'] = {'include_usage': True}
+    return payload
+
+
+def normalize_usage(ctx, usage):
+    """
+    Map provider usage data onto prompt/completion/total token counts
+
+    'cached_tokens' is the part of the prompt tokens read from the provider's
+    prompt cache.
+    """
+    usage = usage or {}
+    if ctx.family == 'anthropic':
+        # Anthropic input tokens exclude the cached part of the prompt
+        cached = usage.get('cache_read_input_tokens') or 0
+        prompt = (usage.get('input_tokens') or 0) + cached + (usage.get('cache_creation_input_tokens') or 0)
+        completion = usage.get('output_tokens') or 0
+    else:
+        prompt = usage.get('prompt_tokens') or 0
+        completion = usage.get('completion_tokens') or 0
+        cached = ((usage.get('prompt_tokens_details') or {}).get('cached_tokens')
+                  or usage.get('prompt_cache_hit_tokens') or 0)
+    return {
+        'prompt_tokens': prompt,
+        'completion_tokens': completion,
+        'total_tokens': prompt + completion,
+        'cached_tokens': cached,
+    }
+
+
+def parse_chat_response(ctx, data):
+    """Convert a provider chat response into the module's message format"""
+    if ctx.family == 'anthropic':
+        blocks = data.get('content') or []
+        content = "".join(b.get('text', '') for b in blocks if b.get('type') == 'text')
+        tool_calls = [b for b in blocks if b.get('type') == 'tool_use']
+        finish_reason = data.get('stop_reason')
+    else:
+        choice = (data.get('choices') or [{}])[0]
+        message = choice.get('message') or {}
+        content = message.get('content') or ""
+        tool_calls = message.get('tool_calls') or []
+        finish_reason = choice.get('finish_reason')
+    result = {
+        'role': 'assistant',
+        'content': content,
+        'finish_reason': finish_reason,
+        'usage': normalize_usage(ctx, data.get('usage')),
+    }
+    if tool_calls:
+        result['tool_calls'] = tool_calls
+    return result
+
+
+def chat_path(ctx):
+    return '/messages' if ctx.family == 'anthropic' else '/chat/completions'
+
+
+def chat_completion(ctx, model_name, messages, **params):
+    """
+    Generate a chat completion
+
+    Args:
+        ctx (ProviderContext): Provider connection snapshot
+        model_name (str): Model identifier in the provider API
+        messages (list): List of message dictionaries with 'role' and 'content'
+        **params: Sampling parameters passed to the provider
+
+    Returns:
+        dict: The assistant message with 'role', 'content' and 'usage'
+    """
+    payload = build_chat_payload(ctx, model_name, messages, **params)
+    return parse_chat_response(ctx, request(ctx, 'POST', chat_path(ctx), payload))
+
+
+def _iter_sse_data(response):
+    """Yield the decoded JSON payloads of a Server-Sent Events response"""
+    for line in response.iter_lines():
+        if not line.startswith('data:'):
+            continue
+        data = line[5:].strip()
+        if not data or data == '[DONE]':
+            continue
+        try:
+            yield json.loads(data)
+        except ValueError:
+            _logger.debug("Ignoring malformed stream event: %s", data)
+
+
+def stream_chat_completion(ctx, model_name, messages, **params):
+    """
+    Stream a chat completion from the provider
+
+    The upstream request is closed as soon as the generator is closed, e.g.
+    when the HTTP client consuming the relayed stream disconnects.
+
+    Yields:
+        dict: ``{'delta': str}`` for each content token, then a final
+        ``{'finish_reason': str, 'usage': dict}`` event
+    """
+    payload = build_chat_payload(ctx, model_name, messages, stream=True, **params)
+    usage = {}
+    finish_reason = None
+    try:
+        with ctx.client().stream('POST', chat_path(ctx), json=payload, params=ctx.params) as response:
+            if not response.is_success:
+                response.read()
+                _check_response(response)
+            for event in _iter_sse_data(response):
+                if ctx.family == 'anthropic':
+                    event_type = event.get('type')
+                    if event_type == 'content_block_delta':
+                        text = (event.get('delta') or {}).get('text')
+                        if text:
+                            yield {'delta': text}
+                    elif event_type == 'message_start':
+                        usage.update((event.get('message') or {}).get('usage') or {})
+                    elif event_type == 'message_delta':
+                        usage.update(event.get('usage') or {})
+                        finish_reason = (event.get('delta') or {}).get('stop_reason') or finish_reason
+                    elif event_type == 'error':
+                        raise ProviderError(f"Provider stream error: {event.get('error')}")
+                else:
+                    if event.get('usage'):
+                        usage.update(event['usage'])
+                    for choice in event.get('choices') or []:
+                        text = (choice.get('delta') or {}).get('content')
+                        if text:
+                            yield {'delta': text}
+                        finish_reason = choice.get('finish_reason') or finish_reason
+    except httpx.TransportError as e:
+        raise ProviderError(f"Connection to provider failed: {e}") from e
+    yield {'finish_reason': finish_reason, 'usage': normalize_usage(ctx, usage)}
+
+
+async def achat_completion(ctx, model_name, messages, **params):
+    """Asynchronous version of :func:`chat_completion`"""
+    payload = build_chat_payload(ctx, model_name, messages, **params)
+    return parse_chat_response(ctx, await arequest(ctx, 'POST', chat_path(ctx), payload))
+
+
+# Model catalogs
+def _timeout(timeout):
+    return httpx.Timeout(timeout, connect=min(timeout, 5.0))
+
+
+def check_connection(ctx, timeout):
+    """
+    Check that the provider answers and accepts the credentials
+
+    Lists a single model, the cheapest authenticated call of every API.
+
+    Raises:
+        ProviderError: When the provider cannot be reached or refuses the call
+    """
+    request(ctx, 'GET', '/models', params=dict(ctx.params or {}, limit=1), timeout=_timeout(timeout))
+
+
+def _guess_model_type(ctx, model_id, item):
+    """Return the vs.ai.model type of a catalog entry, None if it cannot be used"""
+    lowered = model_id.lower()
+    if any(hint in lowered for hint in UNSUPPORTED_MODEL_HINTS):
+        return None
+    if 'embed' in lowered:
+        return 'embedding'
+    output_modalities = (item.get('architecture') or {}).get('output_modalities')
+    if any(hint in lowered for hint in IMAGE_MODEL_HINTS) or output_modalities == ['image']:
+        return 'image'
+    if ctx.provider_type == 'openai' and lowered in OPENAI_COMPLETION_MODELS:
+        return 'completion'
+    return 'chat'
+
+
+def _parse_catalog_entry(ctx, item):
+    """Map a model listed by the provider onto vs.ai.model values"""
+    if not isinstance(item, dict) or not item.get('id'):
+        return None
+    model_id = item['id']
+    model_type = _guess_model_type(ctx, model_id, item)
+    if not model_type:
+        return None
+    values = {'model_id': model_id, 'model_type': model_type}
+
+    description = item.get('description') or item.get('display_name') or item.get('name')
+    if description and description != model_id:
+        values['description'] = description
+    context_length = item.get('context_length') or item.get('max_context_length')
+    if context_length:
+        values['max_tokens'] = int(context_length)
+
+    if ctx.family == 'anthropic':
+        values['supports_tools'] = values['supports_vision'] = True
+    capabilities = item.get('capabilities')
+    if isinstance(capabilities, dict):
+        # Mistral
+        values['supports_tools'] = bool(capabilities.get('function_calling'))
+        values['supports_vision'] = bool(capabilities.get('vision'))
+    if isinstance(item.get('supported_parameters'), list):
+        # OpenRouter
+        values['supports_tools'] = 'tools' in item['supported_parameters']
+    input_modalities = (item.get('architecture') or {}).get('input_modalities')
+    if isinstance(input_modalities, list):
+        values['supports_vision'] = 'image' in input_modalities
+
+    pricing = item.get('pricing')
+    if isinstance(pricing, dict):
+        # Prices per token; negative prices mean "depends on the routed model"
+        for key, field in (('prompt', 'input_cost'), ('completion', 'output_cost'),
+                           ('input_cache_read', 'cached_input_cost')):
+            try:
+                price = float(pricing.get(key) or 0.0)
+            except (TypeError, ValueError):
+                continue
+            if price >= 0:
+                values[field] = round(price * 1e6, 6)
+    return values
+
+
+def list_models(ctx, timeout):
+    """
+    Return the catalog of models of the provider
+
+    Follows the pagination of the Anthropic API; OpenAI-compatible APIs list
+    every model at once. Models that cannot be used through the chat,
+    completion or embedding APIs (speech, moderation, ...) are left out.
+
+    Args:
+        ctx (ProviderContext): Provider connection snapshot
+        timeout (float): Timeout of each request, in seconds
+
+    Returns:
+        list: One dict of vs.ai.model values per model, with at least the
+        'model_id' and the 'model_type', plus the description, context size,
+        capabilities and prices reported by the provider
+    """
+    if ctx.family == 'anthropic':
+        items, params = [], {'limit': MODEL_PAGE_SIZE}
+        while True:
+            data = request(ctx, 'GET', '/models', params=params, timeout=_timeout(timeout))
+            items.extend(data.get('data') or [])
+            if not data.get('has_more') or not data.get('last_id'):
+                break
+            params = dict(params, after_id=data['last_id'])
+    else:
+        data = request(ctx, 'GET', '/models', timeout=_timeout(timeout))
+        items = (data.get('data') or []) if isinstance(data, dict) else data
+
+    catalog = {}
+    for item in items or []:
+        values = _parse_catalog_entry(ctx, item)
+        if values:
+            catalog.setdefault(values['model_id'], values)
+    return list(catalog.values())
+
+
+# Embeddings
+def embeddings(ctx, model_name, texts, **params):
+    """
+    Generate embeddings for the given texts in a single request
+
+    Returns:
+        list: One embedding vector per input text, in input order
+    """
+    if ctx.family == 'anthropic':
+        raise ProviderError("Anthropic does not provide an embeddings API")
+    payload = dict(params, model=model_name, input=list(texts))
+    data = request(ctx, 'POST', '/embeddings', payload)
+    items = sorted(data.get('data') or [], key=lambda item: item.get('index', 0))
+    return [item['embedding'] for item in items]
+
+
+# Batch API
+def _iter_file(file):
+    file.seek(0)
+    while True:
+        chunk = file.read(BATCH_CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+
+def _multipart_upload(fields, file, size, filename):
+    """Return the streamed multipart body uploading a file, and its headers"""
+    boundary = uuid.uuid4().hex
+    head = b"".join(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+        for name, value in fields.items()
+    ) + (f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+         f'Content-Type: application/jsonl\r\n\r\n').encode()
+    tail = f'\r\n--{boundary}--\r\n'.encode()
+
+    def content():
+        yield head
+        yield from _iter_file(file)
+        yield tail
+
+    return content(), {
+        'Content-Type': f'multipart/form-data; boundary={boundary}',
+        'Content-Length': str(len(head) + size + len(tail)),
+    }
+
+
+def submit_batch(ctx, requests):
+    """
+    Submit chat requests to the Batch API of the provider
+
+    The requests are written to a JSONL file (OpenAI) or a JSON document
+    (Anthropic) spooled to disk, and streamed to the provider.
+
+    Args:
+        ctx (ProviderContext): Provider connection snapshot
+        requests (iterable): (custom_id, model_name, messages, params) tuples
+
+    Returns:
+        str: The identifier of the batch at the provider
+    """
+    if ctx.provider_type not in BATCH_PROVIDERS:
+        raise ProviderError(f"The {ctx.provider_type} provider has no supported Batch API")
+    timeout = _timeout(BATCH_TIMEOUT)
+    with tempfile.SpooledTemporaryFile(max_size=BATCH_SPOOL_SIZE) as file:
+        if ctx.family == 'anthropic':
+            file.write(b'{"requests": [')
+            for index, (custom_id, model_name, messages, params) in enumerate(requests):
+                if index:
+                    file.write(b',')
+                file.write(json.dumps({
+                    'custom_id': custom_id,
+                    'params': build_chat_payload(ctx, model_name, messages, **params),
+                }).encode())
+            file.write(b']}')
+            size = file.tell()
+            data = request(ctx, 'POST', '/messages/batches', content=_iter_file(file),
+                           headers={'Content-Length': str(size)}, timeout=timeout)
+            return data['id']
+
+        for custom_id, model_name, messages, params in requests:
+            file.write(json.dumps({
+                'custom_id': custom_id,
+                'method': 'POST',
+                'url': '/v1/chat/completions',
+                'body': build_chat_payload(ctx, model_name, messages, **params),
+            }).encode() + b'\n')
+        content, headers = _multipart_upload({'purpose': 'batch'}, file, file.tell(), 'batch.jsonl')
+        uploaded = request(ctx, 'POST', '/files', content=content, headers=headers, timeout=timeout)
+    data = request(ctx, 'POST', '/batches', {
+        'input_file_id': uploaded['id'],
+        'endpoint': '/v1/chat/completions',
+        'completion_window': '24h',
+    }, timeout=timeout)
+    return data['id']
+
+
+def get_batch(ctx, batch_id):
+    """
+    Return the status of a batch
+
+    Returns:
+        dict: 'status' ('in_progress', 'ended' or 'failed'), the
+        'provider_status', the 'error' of failed batches, and the 'results'
+        paths to download once the batch ended
+    """
+    if ctx.family == 'anthropic':
+        data = request(ctx, 'GET', f'/messages/batches/{batch_id}')
+        ended = data.get('processing_status') == 'ended'
+        return {
+            'status': 'ended' if ended else 'in_progress',
+            'provider_status': data.get('processing_status'),
+            'error': None,
+            # The results URL is relative to the configured endpoint, which
+            # may be a stand-in of the provider API
+            'results': [f'/messages/batches/{batch_id}/results'] if ended else [],
+        }
+    data = request(ctx, 'GET', f'/batches/{batch_id}')
+    provider_status = data.get('status')
+    if provider_status == 'failed':
+        errors = (data.get('errors') or {}).get('data') or [{}]
+        return {
+            'status': 'failed',
+            'provider_status': provider_status,
+            'error': errors[0].get('message') or "Batch validation failed",
+            'results': [],
+        }
+    ended = provider_status in OPENAI_BATCH_ENDED
+    return {
+        'status': 'ended' if ended else 'in_progress',
+        'provider_status': provider_status,
+        'error': None,
+        # Expired and cancelled batches keep the results of finished requests
+        'results': [
+            f'/files/{file_id}/content'
+            for file_id in (data.get('output_file_id'), data.get('error_file_id')) if file_id
+        ] if ended else [],
+    }
+
+
+def _error_message(error):
+    while isinstance(error, dict):
+        if error.get('message'):
+            return error['message']
+        error = error.get('error')
+    return error and str(error)
+
+
+def _parse_batch_result(ctx, entry):
+    if ctx.family == 'anthropic':
+        result = entry.get('result') or {}
+        if result.get('type') == 'succeeded':
+            return entry.get('custom_id'), parse_chat_response(ctx, result.get('message') or {}), None
+        return entry.get('custom_id'), None, _error_message(result.get('error')) or f"Request {result.get('type')}"
+    response = entry.get('response') or {}
+    if response.get('status_code') == 200:
+        return entry.get('custom_id'), parse_chat_response(ctx, response.get('body') or {}), None
+    error = _error_message(entry.get('error')) or _error_message(response.get('body'))
+    return entry.get('custom_id'), None, error or f"Request failed with status {response.get('status_code')}"
+
+
+def iter_batch_results(ctx, paths):
+    """
+    Stream the results of an ended batch, one line at a time
+
+    Args:
+        ctx (ProviderContext): Provider connection snapshot
+        paths (list): The 'results' of :func:`get_batch`
+
+    Yields:
+        tuple: (custom_id, response, error), with the chat response in the
+        format of :func:`parse_chat_response` or the error message
+    """
+    try:
+        for path in paths:
+            with ctx.client().stream('GET', path, params=ctx.params, timeout=_timeout(BATCH_TIMEOUT)) as response:
+                if not response.is_success:
+                    response.read()
+                    _check_response(response)
+                for line in response.iter_lines():
+                    if not line.strip():
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        _logger.warning("Ignoring malformed batch result line: %s", line[:200])
+                        continue
+                    yield _parse_batch_result(ctx, entry)
+    except httpx.TransportError as e:
+        raise ProviderError(f"Connection to provider failed: {e}") from e
+
+
+def cancel_batch(ctx, batch_id):
+    """Ask the provider to stop processing a batch"""
+    path = f'/messages/batches/{batch_id}/cancel' if ctx.family == 'anthropic' else f'/batches/{batch_id}/cancel'
+    request(ctx, 'POST', path)
@@ -0,0 +1,254 @@
+"""
+Cross-worker token-bucket rate limiting
+
+Buckets live in the UNLOGGED ``vs_ai_rate_bucket`` table, shared by every
+worker of every server using the database, and are refilled lazily by a single
+atomic upsert. To keep the database off the hot path, each worker leases a
+small share of a bucket at once and consumes it in memory for a short time;
+what it did not use is given back to the bucket.
+"""
+import logging
+import random
+import threading
+import time
+
+from psycopg2 import errorcodes, errors
+
+from odoo.exceptions import UserError
+
+from .metrics import metrics
+
+# Share of the per-minute limit leased by a worker at once
+LEASE_FRACTION = 0.05
+# Leased tokens left unused after this many seconds are given back
+LEASE_TTL = 1.0
+
+BUCKET_TABLE = 'vs_ai_rate_bucket'
+# Attempts of a bucket update that conflicts with other workers
+MAX_BUCKET_ATTEMPTS = 5
+# Errors of concurrent updates of a bucket, worth retrying
+RETRYABLE_ERRORS = (errors.SerializationFailure, errors.DeadlockDetected, errors.LockNotAvailable)
+
+_logger = logging.getLogger(__name__)
+
+
+class RateLimitExceeded(UserError):
+    """Raised when a rate limit would not allow the call within the allowed wait"""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def create_bucket_table(cr):
+    cr.execute(f"""
+        CREATE UNLOGGED TABLE IF NOT EXISTS {BUCKET_TABLE} (
+            key varchar PRIMARY KEY,
+            tokens double precision NOT NULL,
+            updated_at double precision NOT NULL
+        )
+    """)
+
+
+def _acquire_shared(registry, key, cost, capacity, rate):
+    """
+    Take tokens from a shared bucket
+
+    Returns:
+        float: 0 when granted, otherwise the seconds to wait for enough tokens
+    """
+    return _retry_conflicts(_update_bucket, registry, key, cost, capacity, rate)
+
+
+def _refund_shared(registry, key, amount, capacity, rate):
+    """Give back tokens taken from a shared bucket and left unused"""
+    _retry_conflicts(_refund_bucket, registry, key, amount, capacity, rate)
+
+
+def _retry_conflicts(function, registry, key, *args):
+    for attempt in range(1, MAX_BUCKET_ATTEMPTS + 1):
+        try:
+            return function(registry, key, *args)
+        except RETRYABLE_ERRORS as e:
+            if attempt == MAX_BUCKET_ATTEMPTS:
+                raise
+            _logger.debug("Retrying the update of rate bucket %s (%s)", key,
+                          errorcodes.lookup(e.pgcode))
+            time.sleep(random.uniform(0.0, 0.01 * 2 ** attempt))
+
+
+def _update_bucket(registry, key, cost, capacity, rate):
+    now = time.time()
+    with registry.cursor() as cr:
+        # Odoo cursors are REPEATABLE READ, where concurrent upserts of a
+        # bucket fail; in READ COMMITTED they wait for each other instead
+        cr.execute("SET TRANSACTION ISOLATION LEVEL READ COMMITTED")
+        cr.execute(f"""
+            INSERT INTO {BUCKET_TABLE} AS bucket (key, tokens, updated_at)
+            VALUES (%(key)s, %(capacity)s - %(cost)s, %(now)s)
+            ON CONFLICT (key) DO UPDATE
+               SET tokens = LEAST(%(capacity)s, bucket.tokens + (%(now)s - bucket.updated_at) * %(rate)s) - %(cost)s,
+                   updated_at = %(now)s
+             WHERE LEAST(%(capacity)s, bucket.tokens + (%(now)s - bucket.updated_at) * %(rate)s) >= %(cost)s
+         RETURNING tokens
+        """, {'key': key, 'cost': cost, 'capacity': capacity, 'rate': rate, 'now': now})
+        if cr.fetchone():
+            return 0.0
+        cr.execute(f"""
+            SELECT LEAST(%(capacity)s, tokens + (%(now)s - updated_at) * %(rate)s)
+              FROM {BUCKET_TABLE} WHERE key = %(key)s
+        """, {'key': key, 'capacity': capacity, 'rate': rate, 'now': now})
+        row = cr.fetchone()
+        available = row[0] if row else capacity
+        return max((cost - available) / rate, 0.01)
+
+
+def _refund_bucket(registry, key, amount, capacity, rate):
+    now = time.time()
+    with registry.cursor() as cr:
+        cr.execute("SET TRANSACTION ISOLATION LEVEL READ COMMITTED")
+        cr.execute(f"""
+            UPDATE {BUCKET_TABLE} bucket
+               SET tokens = LEAST(%(capacity)s, bucket.tokens + (%(now)s - bucket.updated_at) * %(rate)s
+                                                + %(amount)s),
+                   updated_at = %(now)s
+             WHERE key = %(key)s
+        """, {'key': key, 'amount': amount, 'capacity': capacity, 'rate': rate, 'now': now})
+
+
+class TokenBucketLimiter:
+    """Per-worker front of the shared token buckets"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._leases = {}
+        self.waits = 0
+        self.wait_time = 0.0
+        self.rejections = 0
+
+    def _take_leased(self, lease_key, cost):
+        """
+        Take tokens from the worker's lease of a bucket
+
+        Returns:
+            tuple: (whether the tokens were taken, expired lease to give back
+            or None)
+        """
+        with self._lock:
+            lease = self._leases.get(lease_key)
+            if not lease:
+                return False, None
+            if lease[1] > time.monotonic() and lease[0] >= cost:
+                lease[0] -= cost
+                return True, None
+            # Expired or too small for the call: give it back, lease anew
+            return False, self._leases.pop(lease_key)
+
+    def _give_back(self, registry, key, lease):
+        remaining, _expires_at, capacity, rate = lease
+        if remaining <= 0:
+            return
+        try:
+            _refund_shared(registry, key, remaining, capacity, rate)
+        except Exception:
+            # Only costs throughput until the bucket refills
+            _logger.debug("Could not give back %s leased tokens to rate bucket %s",
+                          remaining, key, exc_info=True)
+
+    def _give_back_expired(self, registry):
+        """Give back the expired leases of every bucket of the database"""
+        now = time.monotonic()
+        with self._lock:
+            expired = [lease_key for lease_key, lease in self._leases.items()
+                       if lease_key[0] == registry.db_name and lease[1] <= now]
+            expired = [(lease_key, self._leases.pop(lease_key)) for lease_key in expired]
+        for (_dbname, key), lease in expired:
+            self._give_back(registry, key, lease)
+
+    def _acquire_one(self, registry, key, cost, per_minute, deadline):
+        capacity = float(per_minute)
+        rate = capacity / 60.0
+        cost = min(float(cost), capacity)
+        # Buckets of different databases may have the same key
+        lease_key = (registry.db_name, key)
+        while True:
+            taken, expired = self._take_leased(lease_key, cost)
+            if taken:
+                return
+            if expired:
+                self._give_back(registry, key, expired)
+            lease = min(max(cost, capacity * LEASE_FRACTION), capacity)
+            wait = _acquire_shared(registry, key, lease, capacity, rate)
+            if not wait:
+                with self._lock:
+                    replaced = self._leases.get(lease_key)
+                    self._leases[lease_key] = [lease - cost, time.monotonic() + LEASE_TTL, capacity, rate]
+                if replaced:
+                    # Another thread of the worker leased the bucket meanwhile
+                    self._give_back(registry, key, replaced)
+                return
+            if lease > cost:
+                wait = _acquire_shared(registry, key, cost, capacity, rate)
+                if not wait:
+                    return
+            if time.monotonic() + wait > deadline:
+                self.rejections += 1
+                metrics.inc('vs_ai_rate_limit_rejections_total', bucket=key)
+                raise RateLimitExceeded(
+                    f"Rate limit reached ({key}), retry in {wait:.1f}s", retry_after=wait)
+            self.waits += 1
+            self.wait_time += wait
+            metrics.inc('vs_ai_rate_limit_waits_total', bucket=key)
+            metrics.inc('vs_ai_rate_limit_wait_seconds_total', wait, bucket=key)
+            time.sleep(wait)
+
+    def _release_one(self, registry, key, cost, per_minute):
+        """Give back the tokens of a call that was not made"""
+        capacity = float(per_minute)
+        cost = min(float(cost), capacity)
+        with self._lock:
+            lease = self._leases.get((registry.db_name, key))
+            if lease and lease[1] > time.monotonic():
+                lease[0] += cost
+                return
+        self._give_back(registry, key, [cost, None, capacity, capacity / 60.0])
+
+    def acquire(self, registry, limits, requests=1, tokens=0, max_wait=0.0):
+        """
+        Wait until every limit allows the call
+
+        Args:
+            registry: The Odoo registry, used to open short autocommit cursors
+            limits (list): (bucket key, unit, per-minute limit) tuples, where
+                unit is 'requests' or 'tokens'
+            requests (int): Number of requests of the call
+            tokens (int): Estimated number of tokens of the call
+            max_wait (float): Seconds the caller accepts to queue; 0 fails fast
+
+        Raises:
+            RateLimitExceeded: When a limit cannot be met within max_wait;
+            the tokens already taken from the other limits are given back
+        """
+        deadline = time.monotonic() + max(max_wait, 0.0)
+        self._give_back_expired(registry)
+        acquired = []
+        for key, unit, per_minute in limits:
+            cost = requests if unit == 'requests' else tokens
+            if per_minute > 0 and cost > 0:
+                try:
+                    self._acquire_one(registry, key, cost, per_minute, deadline)
+                except Exception:
+                    for acquired_key, acquired_cost, acquired_limit in acquired:
+                        self._release_one(registry, acquired_key, acquired_cost, acquired_limit)
+                    raise
+                acquired.append((key, cost, per_minute))
+
+    def stats(self):
+        return {
+            'waits': self.waits,
+            'wait_time': self.wait_time,
+            'rejections': self.rejections,
+        }
+
+
+rate_limiter = TokenBucketLimiter()
@@ -0,0 +1,203 @@
+"""
+Token counting and context-window packing
+
+Token counts are estimated before calls, for the rate limits, the cost of
+calls whose provider reports no usage, and to fit conversations into the
+context window of the model. OpenAI models are counted with ``tiktoken``
+when it is installed; other providers do not publish their tokenizers, so
+their counts are a conservative estimate from the text length.
+
+Tokenizers are loaded once per worker, and the counts of long texts are
+memoized: system prompts and conversation histories are sent again and
+again, and then cost a digest instead of a tokenizer pass.
+"""
+import hashlib
+import json
+import logging
+import threading
+
+from odoo.exceptions import UserError
+from odoo.tools.lru import LRU
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+_logger = logging.getLogger(__name__)
+
+# Provider types whose models use the OpenAI tokenizers
+TIKTOKEN_PROVIDERS = ('openai', 'azure')
+# Characters per token of the length-based estimate, by provider type
+CHARS_PER_TOKEN = {'anthropic': 3.5}
+DEFAULT_CHARS_PER_TOKEN = 4.0
+# Texts shorter than this are counted again rather than memoized
+MEMO_MIN_LENGTH = 256
+# Tokens added by the chat format to every message, and to prime the answer
+MESSAGE_OVERHEAD = 4
+REPLY_OVERHEAD = 3
+# Conservative cost of an image in a message
+IMAGE_TOKENS = 1600
+# Share of the context window kept free for the inaccuracy of the estimates
+SAFETY_MARGIN = 0.05
+
+
+class ContextWindowExceeded(UserError):
+    """The messages that must be sent do not fit in the context window"""
+
+    def __init__(self, tokens, budget):
+        super().__init__(f"The prompt needs about {tokens} tokens, "
+                         f"the model accepts {budget}")
+        self.tokens = tokens
+        self.budget = budget
+
+
+class TokenCounter:
+    """Per-worker token counter, with cached tokenizers and memoized counts"""
+
+    def __init__(self, memo_size=4096):
+        self._lock = threading.Lock()
+        self._encodings = {}
+        self._memo = LRU(memo_size)
+
+    def _get_encoding(self, provider_type, model_name):
+        """Return the tiktoken encoding of the model, or None"""
+        if tiktoken is None or provider_type not in TIKTOKEN_PROVIDERS:
+            return None
+        key = model_name or ''
+        try:
+            return self._encodings[key]
+        except KeyError:
+            pass
+        # The encoding files are downloaded on first use: load them without
+        # the lock, so a slow download does not block the other models
+        try:
+            try:
+                encoding = tiktoken.encoding_for_model(key)
+            except KeyError:
+                encoding = tiktoken.get_encoding('o200k_base')
+        except Exception:
+            _logger.warning("Could not load the tokenizer of %s, estimating token counts",
+                            key, exc_info=True)
+            encoding = None
+        with self._lock:
+            return self._encodings.setdefault(key, encoding)
+
+    @staticmethod
+    def _estimate(text, provider_type):
+        # Non-ASCII characters (accents, CJK, emojis) are often a token each
+        non_ascii = len(text) - len(text.encode('ascii', 'ignore'))
+        chars_per_token = CHARS_PER_TOKEN.get(provider_type, DEFAULT_CHARS_PER_TOKEN)
+        return int((len(text) - non_ascii) / chars_per_token) + non_ascii + 1
+
+    def count(self, text, provider_type=None, model_name=None):
+        """
+        Return the number of tokens of a text
+
+        Args:
+            text (str): Text to count
+            provider_type (str): vs.ai.provider type of the model
+            model_name (str): Identifier of the model in the provider API
+
+        Returns:
+            int: The exact count with tiktoken, an estimate otherwise
+        """
+        if not text:
+            return 0
+        memoize = len(text) >= MEMO_MIN_LENGTH
+        if memoize:
+            # A digest rather than hash(): two texts must never share a count
+            key = (provider_type, model_name, hashlib.blake2b(text.encode(), digest_size=16).digest())
+            count = self._memo.get(key)
+            if count is not None:
+                return count
+        encoding = self._get_encoding(provider_type, model_name)
+        if encoding is not None:
+            count = len(encoding.encode(text, disallowed_special=()))
+        else:
+            count = self._estimate(text, provider_type)
+        if memoize:
+            self._memo[key] = count
+        return count
+
+    def count_texts(self, texts, provider_type=None, model_name=None):
+        return sum(self.count(text, provider_type, model_name) for text in texts if isinstance(text, str))
+
+    def count_message(self, message, provider_type=None, model_name=None):
+        """Return the number of tokens of a chat message, format included"""
+        tokens = MESSAGE_OVERHEAD
+        content = message.get('content')
+        if isinstance(content, str):
+            tokens += self.count(content, provider_type, model_name)
+        elif isinstance(content, list):
+            for part in content:
+                if not isinstance(part, dict):
+                    continue
+                if part.get('type') in ('image_url', 'image'):
+                    tokens += IMAGE_TOKENS
+                else:
+                    tokens += self.count(part.get('text') or '', provider_type, model_name)
+        if message.get('tool_calls'):
+            tokens += self.count(json.dumps(message['tool_calls'], sort_keys=True),
+                                 provider_type, model_name)
+        return tokens
+
+    def count_messages(self, messages, provider_type=None, model_name=None):
+        """Return the number of prompt tokens of a chat request"""
+        return REPLY_OVERHEAD + sum(
+            self.count_message(message, provider_type, model_name) for message in messages)
+
+    def fit_messages(self, messages, budget, provider_type=None, model_name=None):
+        """
+        Drop the oldest turns of a conversation until it fits in a budget
+
+        System messages and the last message are always kept. Tool results
+        are dropped with the call they answer, and the kept history starts
+        with a user message, as every provider requires.
+
+        Args:
+            messages (list): Chat messages, oldest first
+            budget (int): Maximum number of prompt tokens
+
+        Returns:
+            tuple: The messages to send and their number of tokens
+
+        Raises:
+            ContextWindowExceeded: When the messages that must be kept do
+            not fit
+        """
+        counts = [self.count_message(message, provider_type, model_name) for message in messages]
+        total = REPLY_OVERHEAD + sum(counts)
+        if total <= budget:
+            return messages, total
+
+        history = [index for index, message in enumerate(messages[:-1])
+                   if message.get('role') != 'system']
+        dropped = set()
+        for index in history:
+            if total <= budget and messages[index].get('role') == 'user':
+                break
+            dropped.add(index)
+            total -= counts[index]
+        if total > budget:
+            raise ContextWindowExceeded(total, budget)
+        return [message for index, message in enumerate(messages) if index not in dropped], total
+
+
+def get_prompt_budget(context_window, max_completion_tokens):
+    """
+    Return the number of prompt tokens that may be sent to a model
+
+    Args:
+        context_window (int): Context size of the model, 0 when unknown
+        max_completion_tokens (int): Tokens reserved for the answer
+
+    Returns:
+        int: The budget, or None when the context size is unknown
+    """
+    if not context_window:
+        return None
+    return int(context_window * (1 - SAFETY_MARGIN)) - (max_completion_tokens or 0)
+
+
+token_counter = TokenCounter()
@@ -0,0 +1,194 @@
+"""
+Per-call usage telemetry
+
+Every provider call is observed by a ``CallTracker``, which feeds the
+in-memory model statistics and appends one row to the worker's usage buffer.
+The buffer is written to ``vs_ai_usage`` with multi-row INSERTs by a
+background thread, every ``max_size`` rows or ``max_age`` seconds, so calls
+never wait for the database and the log adds no transaction to requests.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+from psycopg2.extras import execute_values
+
+from .metrics import metrics
+from .model_stats import model_stats
+from .provider_api import ProviderError
+
+_logger = logging.getLogger(__name__)
+
+USAGE_TABLE = 'vs_ai_usage'
+USAGE_COLUMNS = (
+    'date', 'model_id', 'provider_id', 'user_id', 'company_id', 'operation',
+    'prompt_tokens', 'completion_tokens', 'cached_tokens', 'cost', 'ttft', 'latency', 'outcome', 'error',
+)
+
+# HTTP statuses reported by providers when they throttle requests
+THROTTLED_STATUSES = (429, 503, 529)
+
+
+class UsageBuffer:
+    """Per-worker buffer of usage rows, by database"""
+
+    def __init__(self, max_size=500, max_age=10.0):
+        self.max_size = max_size
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._rows = {}
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+        self.flushed = 0
+        self.dropped = 0
+
+    def add(self, dbname, row):
+        with self._lock:
+            rows = self._rows.setdefault(dbname, [])
+            rows.append(row)
+            full = len(rows) >= self.max_size
+            self._ensure_thread()
+        if full:
+            self._wakeup.set()
+
+    def _ensure_thread(self):
+        # Threads do not survive the fork of prefork workers
+        if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='vs_ai.usage_log', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.max_age)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """Write every buffered row"""
+        with self._lock:
+            pending, self._rows = self._rows, {}
+        for dbname, rows in pending.items():
+            try:
+                self._insert(dbname, rows)
+                self.flushed += len(rows)
+            except Exception:
+                # Telemetry must never break calls: the rows are lost
+                self.dropped += len(rows)
+                _logger.warning("Could not write %d AI usage rows", len(rows), exc_info=True)
+
+    @staticmethod
+    def _insert(dbname, rows):
+        from odoo.modules.registry import Registry
+        with Registry(dbname).cursor() as cr:
+            execute_values(cr._obj, f"""
+                INSERT INTO {USAGE_TABLE} ({", ".join(USAGE_COLUMNS)}) VALUES %s
+            """, rows, page_size=1000)
+
+
+usage_buffer = UsageBuffer()
+atexit.register(usage_buffer.flush)
+
+
+class CallTracker:
+    """
+    Observer of one provider call
+
+    Pass it as the observer of the call's concurrency permit; report the
+    first streamed token and the usage as they come, the rest is recorded
+    when the permit is released. Besides the usage log and the model
+    statistics, it feeds the Prometheus metrics.
+    """
+
+    def __init__(self, dbname, operation, model_id, provider_id, user_id, company_id,
+                 input_cost=0.0, output_cost=0.0, provider_name='', model_name='', stream=False,
+                 cached_input_cost=0.0, price_factor=1.0):
+        self.dbname = dbname
+        self.operation = operation
+        self.model_id = model_id
+        self.provider_id = provider_id
+        self.user_id = user_id
+        self.company_id = company_id
+        self.input_cost = input_cost
+        self.output_cost = output_cost
+        # Price of the prompt tokens read from the provider cache, if different
+        self.cached_input_cost = cached_input_cost or input_cost
+        # Discount of the call, e.g. for Batch API calls
+        self.price_factor = price_factor
+        self.stream = stream
+        self.labels = {'provider': provider_name, 'model': model_name}
+        self.started_at = time.monotonic()
+        self.ttft = None
+        self.usage = None
+        self.estimated_prompt_tokens = 0
+
+    def start(self):
+        """Called when the call gets its concurrency slot"""
+        self.started_at = time.monotonic()
+        metrics.inc('vs_ai_in_flight', 1, **self.labels)
+
+    def cancel(self):
+        metrics.inc('vs_ai_in_flight', -1, **self.labels)
+
+    def first_token(self):
+        if self.ttft is None:
+            self.ttft = time.monotonic() - self.started_at
+            metrics.observe('vs_ai_time_to_first_token_seconds', self.ttft, **self.labels)
+
+    def set_usage(self, usage):
+        self.usage = usage
+
+    def set_estimate(self, prompt_tokens):
+        """Prompt tokens counted before the call, for providers that report no usage"""
+        self.estimated_prompt_tokens = prompt_tokens
+
+    def get_usage(self):
+        usage = dict(self.usage or {})
+        if not usage.get('prompt_tokens') and self.estimated_prompt_tokens:
+            usage['prompt_tokens'] = self.estimated_prompt_tokens
+        return usage
+
+    def cost(self):
+        usage = self.get_usage()
+        if not usage or not (self.input_cost or self.output_cost):
+            return None
+        cached = usage.get('cached_tokens') or 0
+        return (((usage.get('prompt_tokens') or 0) - cached) * self.input_cost
+                + cached * self.cached_input_cost
+                + (usage.get('completion_tokens') or 0) * self.output_cost) * self.price_factor / 1e6
+
+    def __call__(self, latency, error):
+        # The duration of a stream depends on the answer length: it is not a
+        # latency sample for routing decisions
+        model_stats.record(self.dbname, self.model_id, None if self.stream else latency, error)
+        cost = self.cost()
+        if cost is not None and error is None:
+            model_stats.record_cost(self.dbname, self.model_id, cost)
+
+        if error is None:
+            outcome = 'success'
+        elif isinstance(error, ProviderError) and error.status_code in THROTTLED_STATUSES:
+            outcome = 'throttled'
+        else:
+            outcome = 'error'
+        usage = self.get_usage()
+        metrics.inc('vs_ai_in_flight', -1, **self.labels)
+        metrics.inc('vs_ai_requests_total', operation=self.operation, outcome=outcome, **self.labels)
+        if latency is not None:
+            metrics.observe('vs_ai_request_duration_seconds', latency, operation=self.operation, **self.labels)
+        for kind in ('prompt', 'completion', 'cached'):
+            if usage.get(f'{kind}_tokens'):
+                metrics.inc('vs_ai_tokens_total', usage[f'{kind}_tokens'], type=kind, **self.labels)
+        usage_buffer.add(self.dbname, (
+            datetime.utcnow(), self.model_id or None, self.provider_id, self.user_id,
+            self.company_id, self.operation,
+            usage.get('prompt_tokens') or 0, usage.get('completion_tokens') or 0,
+            usage.get('cached_tokens') or 0, cost,
+            int(self.ttft * 1000) if self.ttft is not None else None,
+            int(latency * 1000) if latency is not None else None,
+            outcome, str(error)[:500] if error is not None else None,
+        ))
@@ -161,6 +161,12 @@ class VSAISetupWizard(models.TransientModel):
         readonly=True,
     )
     
+    result_provider_ids = fields.Many2many(
+        'vs.ai.provider',
+        string="Created Providers",
+        readonly=True,
+    )
+    
     result_model_count = fields.Integer(
         string="Models Fetched",
         readonly=True,
@@ -256,16 +262,13 @@ class VSAISetupWizard(models.TransientModel):
                     'api_key': self.openrouter_api_key,
                 })
             
-            providers_created = []
-            for provider_vals in providers_to_create:
-                provider = self.env['vs.ai.provider'].create(provider_vals)
-                providers_created.append(provider)
-            
-            if not providers_created:
+            if not providers_to_create:
                 raise UserError(_("Please select at least one provider to set up"))
             
-            self.result_provider_id = providers_created[0]
-            self.result_message = _("%d providers created successfully", len(providers_created))
+            providers = self.env['vs.ai.provider'].create(providers_to_create)
+            self.result_provider_id = providers[0]
+            self.result_provider_ids = providers
+            self.result_message = _("%d providers created successfully", len(providers))
         
         # Move to fetching models state
         self.state = 'fetching'
@@ -279,226 +282,28 @@ class VSAISetupWizard(models.TransientModel):
         }
     
     def action_fetch_models(self):
-        """Fetch models from the provider"""
+        """Fetch the model catalogs of the providers"""
         self.ensure_one()
         
-        provider = self.provider_id or self.result_provider_id
-        if not provider:
+        providers = self.provider_id or self.result_provider_ids or self.result_provider_id
+        if not providers:
             raise UserError(_("No provider selected"))
         
-        # This would be implemented with actual API calls to fetch models
-        # For now, we'll create some example models
+        name_filter = not self.fetch_all_models and self.model_filter or None
+        result = providers._sync_models(name_filter=name_filter)
+        if result['errors'] and len(result['errors']) == len(providers):
+            raise UserError(_("Could not fetch the models: %s", "\n".join(
+                "%s: %s" % item for item in result['errors'].items())))
         
-        models_created = []
-        
-        if provider.provider_type == 'openai':
-            # Create example OpenAI models
-            models_created.extend([
-                {
-                    'name': 'gpt-4o',
-                    'model_type': 'chat',
-                    'description': 'GPT-4o is the latest multimodal model from OpenAI',
-                    'supports_tools': True,
-                    'supports_vision': True,
-                    'max_tokens': 128000,
-                    'is_default': True,
-                },
-                {
-                    'name': 'gpt-4-turbo',
-                    'model_type': 'chat',
-                    'description': 'GPT-4 Turbo with improved performance',
-                    'supports_tools': True,
-                    'supports_vision': False,
-                    'max_tokens': 128000,
-                },
-                {
-                    'name': 'gpt-3.5-turbo',
-                    'model_type': 'chat',
-                    'description': 'Most cost-effective GPT model',
-                    'supports_tools': True,
-                    'supports_vision': False,
-                    'max_tokens': 16385,
-                },
-                {
-                    'name': 'text-embedding-3-large',
-                    'model_type': 'embedding',
-                    'description': 'Large embedding model with 3072 dimensions',
-                    'is_default': True,
-                },
-                {
-                    'name': 'text-embedding-3-small',
-                    'model_type': 'embedding',
-                    'description': 'Small embedding model with 1536 dimensions',
-                },
-            ])
-        elif provider.provider_type == 'anthropic':
-            # Create example Anthropic models
-            models_created.extend([
-                {
-                    'name': 'claude-3-opus',
-                    'model_type': 'chat',
-                    'description': 'Most powerful Claude model',
-                    'supports_tools': True,
-                    'supports_vision': True,
-                    'max_tokens': 200000,
-                    'is_default': True,
-                },
-                {
-                    'name': 'claude-3-sonnet',
-                    'model_type': 'chat',
-                    'description': 'Balanced Claude model for most use cases',
-                    'supports_tools': True,
-                    'supports_vision': True,
-                    'max_tokens': 200000,
-                },
-                {
-                    'name': 'claude-3-haiku',
-                    'model_type': 'chat',
-                    'description': 'Fastest and most compact Claude model',
-                    'supports_tools': True,
-                    'supports_vision': True,
-                    'max_tokens': 200000,
-                },
-            ])
-        elif provider.provider_type == 'mistral':
-            # Create example Mistral models
-            models_created.extend([
-                {
-                    'name': 'mistral-large',
-                    'model_type': 'chat',
-                    'description': 'Mistral Large - most powerful model',
-                    'supports_tools': True,
-                    'supports_vision': False,
-                    'max_tokens': 32768,
-                    'is_default': True,
-                },
-                {
-                    'name': 'mistral-medium',
-                    'model_type': 'chat',
-                    'description': 'Mistral Medium - balanced performance',
-                    'supports_tools': True,
-                    'supports_vision': False,
-                    'max_tokens': 32768,
-                },
-                {
-                    'name': 'mistral-small',
-                    'model_type': 'chat',
-                    'description': 'Mistral Small - fast and efficient',
-                    'supports_tools': True,
-                    'supports_vision': False,
-                    'max_tokens': 32768,
-                },
-                {
-                    'name': 'mistral-embed',
-                    'model_type': 'embedding',
-                    'description': 'Mistral embedding model',
-                    'is_default': True,
-                },
-            ])
-        elif provider.provider_type == 'ollama':
-            # Create example Ollama models
-            models_created.extend([
-                {
-                    'name': 'llama3',
-                    'model_type': 'chat',
-                    'description': 'Meta Llama 3 model',
-                    'supports_tools': False,
-                    'supports_vision': False,
-                    'max_tokens': 8192,
-                    'is_default': True,
-                },
-                {
-                    'name': 'mistral',
-                    'model_type': 'chat',
-                    'description': 'Mistral 7B model',
-                    'supports_tools': False,
-                    'supports_vision': False,
-                    'max_tokens': 8192,
-                },
-                {
-                    'name': 'llava',
-                    'model_type': 'multimodal',
-                    'description': 'LLaVA multimodal model',
-                    'supports_tools': False,
-                    'supports_vision': True,
-                    'max_tokens': 4096,
-                },
-            ])
-        elif provider.provider_type == 'deepseek':
-            # Create DeepSeek models
-            models_created.extend([
-                {
-                    'name': 'deepseek-chat',
-                    'model_type': 'chat',
-                    'description': 'DeepSeek Chat - general purpose chat model',
-                    'supports_tools': True,
-                    'supports_vision': False,
-                    'max_tokens': 8192,
-                    'is_default': True,
-                },
-                {
-                    'name': 'deepseek-coder',
-                    'model_type': 'chat',
-                    'description': 'DeepSeek Coder - specialized for code generation',
-                    'supports_tools': True,
-                    'supports_vision': False,
-                    'max_tokens': 16384,
-                },
-                {
-                    'name': 'deepseek-embed',
-                    'model_type': 'embedding',
-                    'description': 'DeepSeek embedding model',
-                    'is_default': True,
-                },
-            ])
-        elif provider.provider_type == 'openrouter':
-            # Create OpenRouter models
-            models_created.extend([
-                {
-                    'name': 'openai/gpt-4-turbo',
-                    'model_type': 'chat',
-                    'description': 'GPT-4 Turbo via OpenRouter',
-                    'supports_tools': True,
-                    'supports_vision': True,
-                    'max_tokens': 4096,
-                    'is_default': True,
-                },
-                {
-                    'name': 'anthropic/claude-3-opus',
-                    'model_type': 'chat',
-                    'description': 'Claude 3 Opus via OpenRouter',
-                    'supports_tools': True,
-                    'supports_vision': True,
-                    'max_tokens': 8192,
-                },
-                {
-                    'name': 'qwen/qwen-turbo',
-                    'model_type': 'chat',
-                    'description': 'Qwen Turbo via OpenRouter',
-                    'supports_tools': True,
-                    'supports_vision': False,
-                    'max_tokens': 6144,
-                },
-            ])
-        
-        # Create the models in the database
-        for model_data in models_created:
-            self.env['vs.ai.model'].create({
-                'name': model_data['name'],
-                'provider_id': provider.id,
-                'model_type': model_data['model_type'],
-                'description': model_data.get('description', ''),
-                'supports_tools': model_data.get('supports_tools', False),
-                'supports_vision': model_data.get('supports_vision', False),
-                'supports_streaming': model_data.get('supports_streaming', True),
-                'max_tokens': model_data.get('max_tokens', 4096),
-                'is_default': model_data.get('is_default', False),
-                'active': True,
-            })
-        
-        self.result_model_count = len(models_created)
-        self.result_message = _("%d models fetched successfully from %s", 
-                               len(models_created), provider.name)
+        message = _("%(fetched)s models fetched: %(created)s added, %(updated)s updated, "
+                    "%(archived)s archived",
+                    fetched=result['fetched'], created=result['created'],
+                    updated=result['updated'], archived=result['archived'])
+        if result['errors']:
+            message += "\n" + _("Failed providers: %s", "\n".join(
+                "%s: %s" % item for item in result['errors'].items()))
+        self.result_model_count = result['fetched']
+        self.result_message = message
         
         # Move to complete state
         self.state = 'complete'
@@ -532,8 +337,8 @@ class VSAISetupWizard(models.TransientModel):
         """View the fetched models"""
         self.ensure_one()
         
-        provider = self.provider_id or self.result_provider_id
-        if not provider:
+        providers = self.provider_id or self.result_provider_ids or self.result_provider_id
+        if not providers:
             raise UserError(_("No provider available"))
         
         return {
@@ -541,9 +346,9 @@ class VSAISetupWizard(models.TransientModel):
             'type': 'ir.actions.act_window',
             'res_model': 'vs.ai.model',
             'view_mode': 'tree,form',
-            'domain': [('provider_id', '=', provider.id)],
+            'domain': [('provider_id', 'in', providers.ids)],
             'context': {
-                'default_provider_id': provider.id,
+                'default_provider_id': providers[0].id,
             },
             'target': 'current',
         }